@@ -0,0 +1,65 @@
+"""
+Benchmark: specialized closures vs eval(), the tree walker and the bytecode VM.
+
+The eval baseline is the former hot path of ``Calculator.calculate``: a cached
+code object evaluated against a freshly built ``safe_dict`` on every call.
+
+Run from the project root:
+    python benchmarks/bench_codegen.py
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.calculator import Calculator
+from src.lexer import to_source
+
+EXPRESSIONS = [
+    "x^2 + 3x - 7",
+    "sqrt(x^2 + 1) / (1 + exp(-x))",
+    "sin(x) * cos(x) + tan(x / 2)",
+    "1000 * (1 + x/12)^(12*10)",
+]
+
+NUMBER = 50000
+
+
+def per_call(seconds: float) -> str:
+    """Format the time of one call in microseconds."""
+    return f"{seconds / NUMBER * 1e6:7.2f} us"
+
+
+def main():
+    """Run the benchmark and print one row per expression."""
+    calc = Calculator()
+    x = 0.75
+    env = {'x': x}
+
+    print(f"{'expression':32s} {'eval':>10s} {'tree':>10s} {'bytecode':>10s} "
+          f"{'closure':>10s} {'speedup':>8s}")
+    for expr in EXPRESSIONS:
+        code = compile(to_source(calc.tokenize(expr)), '<string>', 'eval')
+
+        def eval_path():
+            safe_dict = {'__builtins__': {}, **Calculator.FUNCTIONS, **Calculator.CONSTANTS}
+            safe_dict['x'] = x
+            return eval(code, safe_dict)
+
+        tree = calc.parse(expr)
+        program = calc.lower(expr)
+        function = calc.specialize(expr)
+        assert abs(function(x) - eval_path()) < 1e-9
+
+        eval_time = timeit.timeit(eval_path, number=NUMBER)
+        tree_time = timeit.timeit(lambda: tree.evaluate(env), number=NUMBER)
+        vm_time = timeit.timeit(lambda: program.execute((x,)), number=NUMBER)
+        closure_time = timeit.timeit(lambda: function(x), number=NUMBER)
+        print(f"{expr:32s} {per_call(eval_time)} {per_call(tree_time)} {per_call(vm_time)} "
+              f"{per_call(closure_time)} {eval_time / closure_time:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
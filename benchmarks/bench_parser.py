@@ -0,0 +1,65 @@
+"""
+Benchmark: native parser and tree-walking evaluator vs compile() + eval().
+
+Run from the project root:
+    python benchmarks/bench_parser.py
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.calculator import Calculator
+from src.lexer import to_source
+from src.parser import parse
+
+EXPRESSIONS = [
+    "2 + 3 * 4",
+    "sin(pi/4) * 2^3 + sqrt(2)",
+    "(1 + 0.05/12)^(12*10) * 1000",
+    "x^2 + 3x - 7",
+    "sqrt(x^2 + 1) / (1 + exp(-x))",
+]
+
+NUMBER = 20000
+
+
+def per_call(seconds: float) -> str:
+    """Format the time of one call in microseconds."""
+    return f"{seconds / NUMBER * 1e6:8.2f} us"
+
+
+def main():
+    """Run the benchmark and print one row per expression."""
+    calc = Calculator(cache_size=0)
+    env = {'x': 1.5}
+    namespace = {'__builtins__': {}, **Calculator.FUNCTIONS, **Calculator.CONSTANTS, **env}
+
+    print("Full pipeline per call (tokenize + compile + eval vs tokenize + parse + evaluate)")
+    print(f"{'expression':34s} {'eval':>11s} {'parser':>11s} {'speedup':>8s}")
+    for expr in EXPRESSIONS:
+        eval_time = timeit.timeit(
+            lambda: eval(compile(to_source(calc.tokenize(expr)), '<string>', 'eval'), namespace),
+            number=NUMBER)
+        parse_time = timeit.timeit(
+            lambda: parse(calc.tokenize(expr), Calculator.FUNCTIONS).evaluate(env),
+            number=NUMBER)
+        print(f"{expr:34s} {per_call(eval_time)} {per_call(parse_time)} "
+              f"{eval_time / parse_time:7.1f}x")
+
+    print()
+    print("Evaluation only (precompiled code object vs parsed tree)")
+    print(f"{'expression':34s} {'eval':>11s} {'tree':>11s} {'speedup':>8s}")
+    for expr in EXPRESSIONS:
+        code = compile(to_source(calc.tokenize(expr)), '<string>', 'eval')
+        tree = calc.parse(expr)
+        eval_time = timeit.timeit(lambda: eval(code, dict(namespace)), number=NUMBER)
+        tree_time = timeit.timeit(lambda: tree.evaluate(env), number=NUMBER)
+        print(f"{expr:34s} {per_call(eval_time)} {per_call(tree_time)} "
+              f"{eval_time / tree_time:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -32,6 +32,9 @@ setup(
     python_requires=">=3.8",
     install_requires=[],
     extras_require={
+        "numpy": [
+            "numpy>=1.20",
+        ],
         "dev": [
             "pytest>=7.0",
             "pytest-cov>=3.0",
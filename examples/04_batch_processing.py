@@ -37,19 +37,20 @@ def main():
     print("-" * 60)
     print()
     
+    # Compile once, then evaluate for every data point
     print("Circle areas for different radii:")
     radii = [1, 2, 5, 10]
-    for r in radii:
-        expr = f"pi * {r} ** 2"
-        result = calc.calculate(expr)
+    circle_area = calc.compile("pi * r^2")
+    areas = circle_area.evaluate_many({"r": r} for r in radii)
+    for r, result in zip(radii, areas):
         print(f"  Radius {r:2d}: Area = {result:.2f} units²")
     print()
     
     print("Triangle areas (using formula: 1/2 * base * height):")
     triangles = [(3, 4), (5, 12), (7, 8), (10, 15)]
+    triangle_area = calc.compile("0.5 * base * height")
     for base, height in triangles:
-        expr = f"0.5 * {base} * {height}"
-        result = calc.calculate(expr)
+        result = triangle_area(base=base, height=height)
         print(f"  Base={base:2d}, Height={height:2d}: Area = {result:.1f} units²")
     print()
     
@@ -61,9 +62,9 @@ def main():
     print("Kinetic energy (KE = 1/2 * m * v²):")
     print("(mass in kg, velocity in m/s)")
     objects = [("Car", 1000, 20), ("Bullet", 0.01, 400), ("Person", 70, 5)]
+    kinetic_energy = calc.compile("0.5 * m * v^2")
     for name, mass, velocity in objects:
-        expr = f"0.5 * {mass} * {velocity}**2"
-        result = calc.calculate(expr)
+        result = kinetic_energy(m=mass, v=velocity)
         print(f"  {name:8s} (m={mass:7}, v={velocity:3}): KE = {result:.2f} Joules")
     print()
     
@@ -141,14 +142,14 @@ def main():
     
     print("Calculating terms of a sequence:")
     print("Formula: a(n) = n² + 2n + 1 = (n+1)²")
+    sequence = calc.compile("n^2 + 2n + 1")
     for n in range(1, 6):
-        expr = f"{n}**2 + 2*{n} + 1"
-        result = calc.calculate(expr)
+        result = sequence(n=n)
         print(f"  a({n}) = {result:.0f}")
     print()
     
     print("=" * 60)
-    print(f"TOTAL CALCULATIONS PERFORMED: {len(calc.history)}")
+    print(f"TOTAL CALCULATIONS PERFORMED: {len(calc.get_history())}")
     print("=" * 60)
 
 if __name__ == "__main__":
@@ -4,7 +4,32 @@ __version__ = "1.0.0"
 __author__ = "Your Name"
 __description__ = "A comprehensive mathematical calculator with support for various functions and operations."
 
+from .budget import Budget
+from .cache import CacheStats, ExpressionCache
 from .calculator import Calculator
-from .enums import OperationType
+from .compiled import CompiledExpression
+from .enums import EvictionPolicy, OperationType
+from .errors import BudgetError, BudgetExceeded, EvaluationCancelled, ExpressionSyntaxError
+from .estimate import CostEstimate
+from .functions import UserFunction
+from .parallel import ProductKernel
+from .registry import FunctionRegistry, FunctionSpec
 
-__all__ = ["Calculator", "OperationType"]
+__all__ = [
+    "Calculator",
+    "CompiledExpression",
+    "OperationType",
+    "EvictionPolicy",
+    "ExpressionCache",
+    "CacheStats",
+    "ExpressionSyntaxError",
+    "Budget",
+    "BudgetError",
+    "BudgetExceeded",
+    "EvaluationCancelled",
+    "CostEstimate",
+    "ProductKernel",
+    "UserFunction",
+    "FunctionRegistry",
+    "FunctionSpec",
+]
@@ -0,0 +1,266 @@
+"""Evaluation within limits on time, integer size and memory."""
+
+import math
+import multiprocessing
+import pickle
+import signal
+import threading
+import time
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from .errors import BudgetError, BudgetExceeded, EvaluationCancelled
+from .estimate import call_bound
+from .functions import UserFunction
+from .integers import integral
+from .nodes import BinaryOp, Call, Node, Script, evaluate
+
+
+# True when the sandbox can limit its worker with rlimits (POSIX systems)
+HAS_RLIMITS = resource is not None
+
+# Seconds between checks of the deadline and of cancellation while waiting
+# for the sandboxed worker
+_POLL_INTERVAL = 0.01
+
+
+class Budget(NamedTuple):
+    """
+    Limits on the resources evaluating one expression may use.
+
+    In process, the limits are checked before every operation: an integer
+    operation whose result could exceed ``bits`` is refused before it is
+    computed, and the deadline is checked between operations. A single
+    operation is only bounded in time through ``bits``, so pair ``time``
+    with ``bits`` or use the sandbox.
+
+    With ``sandbox`` the expression is evaluated in a worker process. The
+    worker is killed as soon as the deadline passes, and on POSIX systems
+    its address space (``RLIMIT_AS``, above its size when started) and CPU
+    time (``RLIMIT_CPU``) are limited by the operating system. The worker
+    is forked when this process runs a single thread. Forking a process
+    with several threads, e.g. a threaded web server, may deadlock the
+    worker on a lock another thread held, and Windows cannot fork; there
+    the worker is started by the ``forkserver`` or ``spawn`` method. The
+    tree is then pickled to the worker, and starting a fresh interpreter
+    counts against the time limit.
+
+    Attributes:
+        time: Wall-clock seconds of evaluation; None for no limit. Parsing,
+            linear in the length of the expression, is not included
+        bits: Largest bit length of any integer computed, intermediate
+            values included; None for no limit
+        memory: Bytes of memory; in process, the size of the largest
+            integer computed; None for no limit
+        sandbox: Whether to evaluate in a separate worker process
+
+    Example:
+        >>> calc = Calculator(budget=Budget(time=1.0, bits=1 << 20))
+        >>> calc.calculate("9^9^9")
+        "Error: Budget exceeded - bits limit of 1048576 exceeded: ..."
+    """
+
+    time: Optional[float] = None
+    bits: Optional[int] = None
+    memory: Optional[int] = None
+    sandbox: bool = False
+
+
+def evaluate_within(node: Node, budget: Budget, cancel: Optional[Any] = None) -> Any:
+    """
+    Evaluate a tree within a budget.
+
+    The tree must be parsed without constant folding (``fold=False``), or
+    its constant subtrees were already computed without limits.
+
+    Args:
+        node: The root of the expression tree
+        budget: The limits to respect
+        cancel: Optional ``threading.Event``; setting it stops the evaluation
+
+    Returns:
+        The value of the tree
+
+    Raises:
+        BudgetExceeded: As soon as a limit is exceeded
+        EvaluationCancelled: When ``cancel`` is set
+        BudgetError: If the sandbox worker cannot be started, e.g. when the
+            tree calls functions that cannot be pickled and the worker
+            cannot be forked
+    """
+    deadline = None if budget.time is None else time.perf_counter() + budget.time
+    if budget.sandbox:
+        return _sandboxed(node, budget, deadline, cancel)
+    return _evaluate(node, _Limits(budget, deadline, cancel))
+
+
+def _evaluate(node: Node, limits: "_Limits") -> Any:
+    """Evaluate an expression or script, applying every operation through the limits."""
+    if isinstance(node, Script):
+        return node.execute(None, limits)[-1]
+    return evaluate(node, None, limits)
+
+
+class _Limits:
+    """Checks the budget before applying each operation of a tree."""
+
+    __slots__ = ('budget', 'deadline', 'cancel', 'bits', 'resource')
+
+    def __init__(self, budget: Budget, deadline: Optional[float], cancel: Optional[Any]):
+        self.budget = budget
+        self.deadline = deadline
+        self.cancel = cancel
+        # Integers are limited by the tighter of the bit and memory limits
+        self.bits = budget.bits
+        self.resource = 'bits'
+        if budget.memory is not None and (self.bits is None or 8 * budget.memory < self.bits):
+            self.bits = 8 * budget.memory
+            self.resource = 'memory'
+
+    def __call__(self, node: Node, args: List[Any]) -> Any:
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise BudgetExceeded('time', self.budget.time, "evaluation did not complete")
+        if self.cancel is not None and self.cancel.is_set():
+            raise EvaluationCancelled("Evaluation cancelled")
+        if self.bits is not None:
+            needed = _result_bits(node, args)
+            if needed > self.bits:
+                self._exceeded(node, needed)
+        func = node.func
+        if isinstance(func, UserFunction):
+            # Evaluate the body under the same limits rather than compiled
+            return evaluate(func.body, dict(zip(func.parameters, args)), self)
+        return func(*args)
+
+    def _exceeded(self, node: Node, bits: float):
+        """Raise the error for an operation whose result would be too large."""
+        name = node.name if isinstance(node, Call) else node.op
+        if self.resource == 'memory':
+            raise BudgetExceeded('memory', self.budget.memory,
+                                 f"the result of '{name}' may need {math.ceil(bits / 8)} bytes")
+        raise BudgetExceeded('bits', self.budget.bits,
+                             f"the result of '{name}' may need {math.ceil(bits)} bits")
+
+
+def _result_bits(node: Node, args: List[Any]) -> float:
+    """Bound the bit length of an integer result before computing it; 0 for other results."""
+    exact = all(isinstance(arg, int) for arg in args)
+    if isinstance(node, Call) and args:
+        if not exact:
+            # Integer functions also accept integral floats, Decimals and
+            # Fractions, so bound them by the ints they stand for
+            try:
+                args = [integral(arg, node.name) for arg in args]
+            except ValueError:
+                return 0
+        bits, integer = call_bound(node.name, max(arg.bit_length() for arg in args), exact,
+                                   len(args))
+        return bits if integer else 0
+    if not exact:
+        return 0
+    if isinstance(node, BinaryOp):
+        left, right = args
+        op = node.op
+        if op == '**':
+            if right <= 0 or -1 <= left <= 1:
+                return 0
+            # |left|**right < 2**(right * ceil(log2 |left|) + 1)
+            return (abs(left) - 1).bit_length() * right + 1
+        if op == '*':
+            return left.bit_length() + right.bit_length()
+        if op in ('+', '-'):
+            return max(left.bit_length(), right.bit_length()) + 1
+        # Divisions, remainders and comparisons do not grow their operands
+        return 0
+    return 0
+
+
+def _sandboxed(node: Node, budget: Budget, deadline: Optional[float], cancel: Optional[Any]) -> Any:
+    """Evaluate in a worker process, killed when the deadline passes or on cancellation."""
+    context = multiprocessing.get_context(_start_method())
+    receiver, sender = context.Pipe(duplex=False)
+    worker = context.Process(target=_work, args=(sender, node, budget), daemon=True)
+    try:
+        worker.start()
+    except (pickle.PicklingError, TypeError, AttributeError) as e:
+        receiver.close()
+        sender.close()
+        raise BudgetError(f"The expression cannot be sent to the sandbox worker: {e}") from None
+    sender.close()
+    try:
+        while not receiver.poll(_POLL_INTERVAL):
+            if cancel is not None and cancel.is_set():
+                raise EvaluationCancelled("Evaluation cancelled")
+            if deadline is not None and time.perf_counter() > deadline:
+                raise BudgetExceeded('time', budget.time, "evaluation did not complete")
+            if not worker.is_alive() and not receiver.poll():
+                raise _worker_died(worker.exitcode, budget)
+        try:
+            ok, value = receiver.recv()
+        except EOFError:
+            worker.join()
+            raise _worker_died(worker.exitcode, budget) from None
+    finally:
+        if worker.is_alive():
+            worker.kill()
+        worker.join()
+        receiver.close()
+    if ok:
+        return value
+    raise value
+
+
+def _start_method() -> str:
+    """Choose how to start the sandbox worker: fork unless that is unsafe or unavailable."""
+    methods = multiprocessing.get_all_start_methods()
+    if 'fork' in methods and threading.active_count() == 1:
+        return 'fork'
+    for method in ('forkserver', 'spawn'):
+        if method in methods:
+            return method
+    raise BudgetError("The sandbox cannot start a worker process on this platform")
+
+
+def _work(sender: Any, node: Node, budget: Budget):
+    """Evaluate in the worker process under rlimits and send back the outcome."""
+    if HAS_RLIMITS:
+        if budget.memory is not None:
+            limit = _address_space() + budget.memory
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        if budget.time is not None:
+            # A backstop: the parent kills the worker at the deadline
+            seconds = math.ceil(budget.time) + 1
+            resource.setrlimit(resource.RLIMIT_CPU, (seconds, seconds))
+    outcome: Tuple[bool, Any]
+    try:
+        outcome = (True, _evaluate(node, _Limits(budget, None, None)))
+    except MemoryError:
+        outcome = (False, BudgetExceeded('memory', budget.memory, "the worker ran out of memory"))
+    except Exception as e:
+        outcome = (False, e)
+    try:
+        sender.send(outcome)
+    except Exception as e:
+        # The result or the error cannot be pickled
+        sender.send((False, RuntimeError(f"{type(e).__name__}: {e}")))
+    sender.close()
+
+
+def _worker_died(exitcode: Optional[int], budget: Budget) -> Exception:
+    """Get the error for a worker that exited without sending an outcome."""
+    if exitcode is not None and -exitcode == getattr(signal, 'SIGXCPU', None):
+        return BudgetExceeded('time', budget.time, "the worker exceeded its CPU time")
+    return RuntimeError(f"The evaluation worker exited with code {exitcode}")
+
+
+def _address_space() -> int:
+    """Get the size of the address space of this process in bytes, or 0 if unknown."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return 0
@@ -0,0 +1,500 @@
+"""Compact, serializable bytecode for expressions and the stack VM running it."""
+
+import struct
+import sys
+from array import array
+from itertools import islice
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .nodes import (
+    BINARY_OPERATORS, UNARY_OPERATORS, BinaryOp, Call, Conditional, Local, Node, Number, Script,
+    UnaryOp, Variable, references, walk
+)
+
+
+# Opcodes; the operand of each instruction indexes the table named in the comment
+LOAD_CONST = 0   # constants
+LOAD_VAR = 1     # frame: variables, then locals
+UNARY = 2        # UNARY_OPS
+BINARY = 3       # BINARY_OPS
+CALL = 4         # functions (name, argument count)
+STORE = 5        # frame; the value stays on the stack (script locals, shared values)
+JUMP_IF_FALSE = 6  # number of instructions skipped when the popped value is false
+JUMP = 7         # number of instructions skipped
+
+OPCODE_NAMES = ('LOAD_CONST', 'LOAD_VAR', 'UNARY', 'BINARY', 'CALL', 'STORE', 'JUMP_IF_FALSE',
+                'JUMP')
+
+# Operator tables addressed by the UNARY and BINARY operands
+UNARY_OPS: Tuple[str, ...] = tuple(UNARY_OPERATORS)
+BINARY_OPS: Tuple[str, ...] = tuple(BINARY_OPERATORS)
+
+# Serialized layout: magic, format version, then length-prefixed sections
+_MAGIC = b'CALC'
+_VERSION = 1
+_HEADER = struct.Struct('<4sBIIII')
+_LENGTH = struct.Struct('<I')
+_FLOAT = struct.Struct('<d')
+_COMPLEX = struct.Struct('<dd')
+
+
+class Program:
+    """
+    An expression lowered to flat opcode and operand arrays.
+
+    Programs hold no references to Python functions in their serialized form:
+    called functions are stored by name and resolved against a function table
+    the first time the program runs, so they pickle compactly and can be
+    shipped to worker processes or stored on disk.
+
+    Example:
+        >>> program = Calculator().lower("x^2 + 1")
+        >>> program.variables
+        ('x',)
+        >>> program.run({'x': 3})
+        10
+    """
+
+    __slots__ = ('opcodes', 'operands', 'constants', 'variables', 'functions',
+                 '_table', '_resolved')
+
+    def __init__(
+        self,
+        opcodes: array,
+        operands: array,
+        constants: Tuple[Any, ...],
+        variables: Tuple[str, ...],
+        functions: Tuple[Tuple[str, int], ...],
+        table: Optional[Mapping[str, Callable[..., Any]]] = None,
+    ):
+        """
+        Initialize the program.
+
+        Args:
+            opcodes: One opcode per instruction (array of unsigned bytes)
+            operands: One operand per instruction (array of unsigned ints)
+            constants: Values addressed by LOAD_CONST
+            variables: Names addressed by LOAD_VAR, in binding order
+            functions: (name, argument count) pairs addressed by CALL
+            table: Function table used to resolve names; defaults to
+                Calculator.FUNCTIONS
+        """
+        self.opcodes = opcodes
+        self.operands = operands
+        self.constants = constants
+        self.variables = variables
+        self.functions = functions
+        self._table = table
+        self._resolved: Optional[List[Tuple[Callable[..., Any], int]]] = None
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    def __reduce__(self):
+        return (Program.from_bytes, (self.to_bytes(),))
+
+    def bind(self, table: Mapping[str, Callable[..., Any]]) -> "Program":
+        """
+        Resolve called function names against a different function table.
+
+        Args:
+            table: Mapping of function names to callables
+
+        Returns:
+            The program itself
+        """
+        self._table = table
+        self._resolved = None
+        return self
+
+    def run(self, env: Optional[Mapping[str, Any]] = None) -> Any:
+        """
+        Run the program with variables bound by name.
+
+        Args:
+            env: Mapping of variable names to values
+
+        Returns:
+            The value of the expression
+        """
+        if not self.variables:
+            return self.execute(())
+        env = env or {}
+        try:
+            values = [env[name] for name in self.variables]
+        except KeyError as e:
+            raise NameError(f"name '{e.args[0]}' is not defined") from None
+        return self.execute(values)
+
+    def execute(self, values: Sequence[Any]) -> Any:
+        """
+        Run the program on the stack VM.
+
+        Args:
+            values: Variable values in the order of ``self.variables``; a list
+                is used as the frame of a script and extended with its locals
+
+        Returns:
+            The value of the expression, or of the last statement of a script
+        """
+        functions = self._resolved
+        if functions is None:
+            functions = self._resolve()
+        constants = self.constants
+        unary = _UNARY_FUNCS
+        binary = _BINARY_FUNCS
+        # Locals follow the variables and are created by their first STORE
+        frame = values if isinstance(values, list) else list(values)
+        stack: List[Any] = []
+        push = stack.append
+        pop = stack.pop
+
+        # Jumps only go forward, so they skip instructions of the iterator
+        instructions = zip(self.opcodes, self.operands)
+        for opcode, operand in instructions:
+            if opcode == LOAD_CONST:
+                push(constants[operand])
+            elif opcode == LOAD_VAR:
+                push(frame[operand])
+            elif opcode == BINARY:
+                right = pop()
+                stack[-1] = binary[operand](stack[-1], right)
+            elif opcode == UNARY:
+                stack[-1] = unary[operand](stack[-1])
+            elif opcode == STORE:
+                if operand < len(frame):
+                    frame[operand] = stack[-1]
+                else:
+                    # Locals of branches that were skipped are never created
+                    frame.extend([None] * (operand - len(frame)))
+                    frame.append(stack[-1])
+            elif opcode == JUMP_IF_FALSE:
+                if not pop():
+                    next(islice(instructions, operand - 1, None), None)
+            elif opcode == JUMP:
+                next(islice(instructions, operand - 1, None), None)
+            else:
+                func, argc = functions[operand]
+                if argc == 1:
+                    stack[-1] = func(stack[-1])
+                else:
+                    args = stack[-argc:]
+                    del stack[-argc:]
+                    push(func(*args))
+
+        return stack[-1]
+
+    def disassemble(self) -> str:
+        """
+        Render the program as one instruction per line.
+
+        Returns:
+            The human-readable listing
+        """
+        lines = []
+        for index, (opcode, operand) in enumerate(zip(self.opcodes, self.operands)):
+            if opcode == LOAD_CONST:
+                detail = repr(self.constants[operand])
+            elif opcode == LOAD_VAR or opcode == STORE:
+                variables = self.variables
+                detail = variables[operand] if operand < len(variables) else f"local {operand}"
+            elif opcode == UNARY:
+                detail = UNARY_OPS[operand]
+            elif opcode == BINARY:
+                detail = BINARY_OPS[operand]
+            elif opcode == JUMP_IF_FALSE or opcode == JUMP:
+                detail = f"to {index + operand + 1}"
+            else:
+                detail = '{}/{}'.format(*self.functions[operand])
+            lines.append(f"{index:4d} {OPCODE_NAMES[opcode]:13s} {operand:4d} ({detail})")
+        return '\n'.join(lines)
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the program to a compact, self-describing byte string.
+
+        Returns:
+            The serialized program
+        """
+        parts = [_HEADER.pack(_MAGIC, _VERSION, len(self.opcodes), len(self.constants),
+                              len(self.variables), len(self.functions)),
+                 self.opcodes.tobytes(),
+                 _little_endian(self.operands).tobytes()]
+        for value in self.constants:
+            parts.append(_encode_constant(value))
+        for name in self.variables:
+            parts.append(_encode_name(name))
+        for name, argc in self.functions:
+            parts.append(_encode_name(name))
+            parts.append(_LENGTH.pack(argc))
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Program":
+        """
+        Load a program serialized with :meth:`to_bytes`.
+
+        Args:
+            data: The serialized program
+
+        Returns:
+            The program, resolving functions against Calculator.FUNCTIONS
+
+        Raises:
+            ValueError: If the data is not a supported program
+        """
+        try:
+            magic, version, n_code, n_const, n_var, n_func = _HEADER.unpack_from(data, 0)
+        except struct.error:
+            raise ValueError("Not a calculator program.") from None
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("Not a calculator program.")
+        offset = _HEADER.size
+
+        opcodes = array('B', data[offset:offset + n_code])
+        offset += n_code
+        operands = array('I')
+        operands.frombytes(data[offset:offset + n_code * operands.itemsize])
+        operands = _little_endian(operands)
+        offset += n_code * operands.itemsize
+
+        constants = []
+        for _ in range(n_const):
+            value, offset = _decode_constant(data, offset)
+            constants.append(value)
+        variables = []
+        for _ in range(n_var):
+            name, offset = _decode_name(data, offset)
+            variables.append(name)
+        functions = []
+        for _ in range(n_func):
+            name, offset = _decode_name(data, offset)
+            (argc,) = _LENGTH.unpack_from(data, offset)
+            offset += _LENGTH.size
+            functions.append((name, argc))
+
+        return cls(opcodes, operands, tuple(constants), tuple(variables), tuple(functions))
+
+    def _resolve(self) -> List[Tuple[Callable[..., Any], int]]:
+        """Look up the called functions in the function table."""
+        table = self._table
+        if table is None:
+            from .calculator import Calculator
+            table = Calculator.FUNCTIONS
+        resolved = []
+        for name, argc in self.functions:
+            if name not in table:
+                raise NameError(f"name '{name}' is not defined")
+            resolved.append((table[name], argc))
+        self._resolved = resolved
+        return resolved
+
+
+_UNARY_FUNCS = tuple(UNARY_OPERATORS[op] for op in UNARY_OPS)
+_BINARY_FUNCS = tuple(BINARY_OPERATORS[op] for op in BINARY_OPS)
+
+# Steps of the assembler's stack: emit an operation once its operands are
+# emitted, and the jumps around the branches of a conditional
+_OPERATION, _THEN, _OTHERWISE, _END = range(4)
+
+
+class _Assembler:
+    """Emits instructions for a tree, interning constants, names and functions."""
+
+    def __init__(self, node: Node):
+        self.opcodes = array('B')
+        self.operands = array('I')
+        self.constants: Dict[Tuple[type, Any], int] = {}
+        self.functions: Dict[Tuple[str, int], int] = {}
+        # Variables come first in the frame, so they are collected up front
+        self.variables: Dict[str, int] = {}
+        if isinstance(node, Script):
+            for name, _ in node.free:
+                self.variables.setdefault(name, len(self.variables))
+        else:
+            for child in walk(node):
+                if isinstance(child, Variable):
+                    self.variables.setdefault(child.name, len(self.variables))
+        # Frame index of every script slot and of every shared subexpression
+        # already computed, and the next free frame index
+        self.frame: Dict[int, int] = {}
+        self.stored: Dict[int, int] = {}
+        self.frame_size = len(self.variables)
+        self.references = references(node)
+
+    def emit(self, opcode: int, operand: int):
+        self.opcodes.append(opcode)
+        self.operands.append(operand)
+
+    def local(self) -> int:
+        """Allocate a frame index after the variables."""
+        self.frame_size += 1
+        return self.frame_size - 1
+
+    def jump(self, opcode: int) -> int:
+        """Emit a forward jump whose target is set by :meth:`land`."""
+        self.emit(opcode, 0)
+        return len(self.opcodes) - 1
+
+    def land(self, jump: int):
+        """Make a jump emitted earlier target the next instruction."""
+        self.operands[jump] = len(self.opcodes) - jump - 1
+
+    def lower(self, node: Node):
+        """Emit the instructions of ``node`` in postfix order."""
+        if not isinstance(node, Script):
+            self.expression(node)
+            return
+        for name, index in node.free:
+            self.frame[index] = self.variables[name]
+        for index, statement in node.statements:
+            # Statements do not share subexpressions, as locals change between them
+            self.stored.clear()
+            self.expression(statement)
+            if index is not None:
+                if index not in self.frame:
+                    self.frame[index] = self.local()
+                self.emit(STORE, self.frame[index])
+
+    def expression(self, root: Node):
+        """
+        Emit the instructions of an expression without recursion.
+
+        Operations whose operands are being emitted, and the jumps of
+        conditionals, wait on an explicit stack like in
+        :func:`src.nodes.evaluate`.
+        """
+        stack: List[Any] = [root]
+        while stack:
+            item = stack.pop()
+            if type(item) is tuple:
+                step, node, state = item
+                if step == _OPERATION:
+                    if isinstance(node, UnaryOp):
+                        self.emit(UNARY, UNARY_OPS.index(node.op))
+                    elif isinstance(node, BinaryOp):
+                        self.emit(BINARY, BINARY_OPS.index(node.op))
+                    else:
+                        key = (node.name, len(node.args))
+                        self.emit(CALL, self.functions.setdefault(key, len(self.functions)))
+                elif step == _THEN:
+                    # Values a branch stores are not reused after it
+                    state[0] = self.jump(JUMP_IF_FALSE)
+                    state[2] = dict(self.stored)
+                    continue
+                elif step == _OTHERWISE:
+                    self.stored = dict(state[2])
+                    state[1] = self.jump(JUMP)
+                    self.land(state[0])
+                    continue
+                else:
+                    self.stored = state[2]
+                    self.land(state[1])
+                if self.references.get(id(node), 1) > 1 and node.children():
+                    index = self.stored[id(node)] = self.local()
+                    self.emit(STORE, index)
+                continue
+
+            node = item
+            if self.references.get(id(node), 1) > 1 and node.children():
+                # Common subexpressions are stored in the frame the first time
+                index = self.stored.get(id(node))
+                if index is not None:
+                    self.emit(LOAD_VAR, index)
+                    continue
+
+            if isinstance(node, Number):
+                # Keyed by type so that 1, 1.0 and True stay distinct constants
+                key = (type(node.value), node.value)
+                self.emit(LOAD_CONST, self.constants.setdefault(key, len(self.constants)))
+            elif isinstance(node, Variable):
+                self.emit(LOAD_VAR, self.variables[node.name])
+            elif isinstance(node, Local):
+                self.emit(LOAD_VAR, self.frame[node.index])
+            elif isinstance(node, (UnaryOp, BinaryOp, Call)):
+                stack.append((_OPERATION, node, None))
+                stack.extend(reversed(node.children()))
+            elif isinstance(node, Conditional):
+                # Jump indices and the stored values before the branches
+                jumps: List[Any] = [None, None, None]
+                stack += ((_END, node, jumps), node.otherwise, (_OTHERWISE, node, jumps),
+                          node.then, (_THEN, node, jumps), node.condition)
+            else:
+                raise TypeError(f"Cannot lower {type(node).__name__} to bytecode.")
+
+
+def lower(node: Node, table: Optional[Mapping[str, Callable[..., Any]]] = None) -> Program:
+    """
+    Lower an expression tree to a bytecode program.
+
+    Args:
+        node: The root of the expression tree
+        table: Function table the program resolves calls against
+
+    Returns:
+        The program
+    """
+    assembler = _Assembler(node)
+    assembler.lower(node)
+    return Program(
+        assembler.opcodes,
+        assembler.operands,
+        tuple(value for _, value in assembler.constants),
+        tuple(assembler.variables),
+        tuple(assembler.functions),
+        table,
+    )
+
+
+def _little_endian(operands: array) -> array:
+    """Get the operands in little-endian byte order (a no-op on most hosts)."""
+    if sys.byteorder == 'little':
+        return operands
+    swapped = array('I', operands)
+    swapped.byteswap()
+    return swapped
+
+
+def _encode_name(name: str) -> bytes:
+    """Encode a length-prefixed UTF-8 name."""
+    raw = name.encode('utf-8')
+    return _LENGTH.pack(len(raw)) + raw
+
+
+def _decode_name(data: bytes, offset: int) -> Tuple[str, int]:
+    """Decode a name written by :func:`_encode_name`."""
+    (length,) = _LENGTH.unpack_from(data, offset)
+    offset += _LENGTH.size
+    return data[offset:offset + length].decode('utf-8'), offset + length
+
+
+def _encode_constant(value: Any) -> bytes:
+    """Encode a number as a type tag followed by its payload."""
+    if isinstance(value, bool):
+        return b'b' + bytes((value,))
+    if isinstance(value, int):
+        raw = value.to_bytes((value.bit_length() + 8) // 8, 'little', signed=True)
+        return b'i' + _LENGTH.pack(len(raw)) + raw
+    if isinstance(value, float):
+        return b'f' + _FLOAT.pack(value)
+    if isinstance(value, complex):
+        return b'c' + _COMPLEX.pack(value.real, value.imag)
+    raise TypeError(f"Cannot serialize constant of type {type(value).__name__}.")
+
+
+def _decode_constant(data: bytes, offset: int) -> Tuple[Any, int]:
+    """Decode a constant written by :func:`_encode_constant`."""
+    tag = data[offset:offset + 1]
+    offset += 1
+    if tag == b'i':
+        (length,) = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        return int.from_bytes(data[offset:offset + length], 'little', signed=True), offset + length
+    if tag == b'b':
+        return data[offset] != 0, offset + 1
+    if tag == b'f':
+        return _FLOAT.unpack_from(data, offset)[0], offset + _FLOAT.size
+    if tag == b'c':
+        real, imag = _COMPLEX.unpack_from(data, offset)
+        return complex(real, imag), offset + _COMPLEX.size
+    raise ValueError("Not a calculator program.")
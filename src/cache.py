@@ -0,0 +1,292 @@
+"""Bounded caches for compiled expressions and function results."""
+
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+from .enums import EvictionPolicy
+
+
+class CacheStats(NamedTuple):
+    """Snapshot of the counters of an :class:`ExpressionCache`."""
+
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    maxsize: int
+
+    @property
+    def hit_ratio(self) -> float:
+        """Fraction of lookups that were served from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ExpressionCache:
+    """
+    A size-bounded mapping used to memoize compiled expressions.
+
+    Three eviction policies are supported:
+    - LRU: discard the least recently used entry
+    - LFU: discard the least frequently used entry (ties broken by age)
+    - TTL: entries expire ``ttl`` seconds after insertion; when full the
+      oldest entry is discarded
+
+    All operations are O(1).
+
+    Example:
+        >>> cache = ExpressionCache(maxsize=2)
+        >>> cache.put("1+1", 2)
+        >>> cache.get("1+1")
+        2
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        policy: EvictionPolicy = EvictionPolicy.LRU,
+        ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            maxsize: Maximum number of entries; 0 disables caching
+            policy: The eviction policy to apply when the cache is full
+            ttl: Lifetime of an entry in seconds (required for TTL policy)
+            clock: Time source used for TTL expiry
+        """
+        if policy is EvictionPolicy.TTL and (ttl is None or ttl <= 0):
+            raise ValueError("TTL eviction requires a positive ttl.")
+
+        self.maxsize = max(0, maxsize)
+        self.policy = policy
+        self.ttl = ttl
+        self._clock = clock
+
+        # key -> value (LRU), key -> (value, expires_at) (TTL)
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        # LFU bookkeeping: key -> (value, frequency) and frequency -> keys
+        self._frequencies: Dict[int, "OrderedDict[Hashable, None]"] = {}
+        self._min_frequency = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Look up a cached value and update the policy bookkeeping.
+
+        Args:
+            key: The cache key
+            default: Value returned on a miss
+
+        Returns:
+            The cached value or ``default``
+        """
+        entries = self._entries
+        if key not in entries:
+            self.misses += 1
+            return default
+
+        if self.policy is EvictionPolicy.LRU:
+            entries.move_to_end(key)
+            value = entries[key]
+        elif self.policy is EvictionPolicy.LFU:
+            value, frequency = entries[key]
+            self._touch(key, frequency)
+            entries[key] = (value, frequency + 1)
+        else:
+            value, expires_at = entries[key]
+            if self._clock() >= expires_at:
+                del entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return default
+
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        """
+        Insert or replace a value, evicting an entry if the cache is full.
+
+        Args:
+            key: The cache key
+            value: The value to store
+        """
+        if not self.maxsize:
+            return
+
+        entries = self._entries
+        if self.policy is EvictionPolicy.LRU:
+            if key in entries:
+                entries.move_to_end(key)
+            elif len(entries) >= self.maxsize:
+                entries.popitem(last=False)
+                self.evictions += 1
+            entries[key] = value
+
+        elif self.policy is EvictionPolicy.LFU:
+            if key in entries:
+                frequency = entries[key][1]
+                self._touch(key, frequency)
+                entries[key] = (value, frequency + 1)
+                return
+            if len(entries) >= self.maxsize:
+                bucket = self._frequencies[self._min_frequency]
+                victim, _ = bucket.popitem(last=False)
+                if not bucket:
+                    del self._frequencies[self._min_frequency]
+                del entries[victim]
+                self.evictions += 1
+            entries[key] = (value, 1)
+            self._frequencies.setdefault(1, OrderedDict())[key] = None
+            self._min_frequency = 1
+
+        else:
+            now = self._clock()
+            self._expire(now)
+            if key in entries:
+                del entries[key]
+            elif len(entries) >= self.maxsize:
+                entries.popitem(last=False)
+                self.evictions += 1
+            entries[key] = (value, now + self.ttl)
+
+    def clear(self):
+        """Remove all entries and reset the statistics."""
+        self._entries.clear()
+        self._frequencies.clear()
+        self._min_frequency = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> CacheStats:
+        """
+        Get the cache statistics.
+
+        Returns:
+            A CacheStats snapshot
+        """
+        return CacheStats(self.hits, self.misses, self.evictions, len(self._entries), self.maxsize)
+
+    def _touch(self, key: Hashable, frequency: int):
+        """Move an LFU key from its frequency bucket to the next one."""
+        bucket = self._frequencies[frequency]
+        del bucket[key]
+        if not bucket:
+            del self._frequencies[frequency]
+            if self._min_frequency == frequency:
+                self._min_frequency = frequency + 1
+        self._frequencies.setdefault(frequency + 1, OrderedDict())[key] = None
+
+    def _expire(self, now: float):
+        """Drop TTL entries whose lifetime has elapsed."""
+        entries = self._entries
+        while entries:
+            key = next(iter(entries))
+            if entries[key][1] > now:
+                break
+            del entries[key]
+            self.evictions += 1
+
+
+class MemoizedFunction:
+    """
+    A pure function whose results are cached, bounded by their total size in bytes.
+
+    Results are keyed by the arguments and their types, so ``f(2)`` and
+    ``f(2.0)`` are cached separately. The least recently used results are
+    evicted once the sizes of the cached results (as reported by
+    ``sys.getsizeof``) exceed ``max_bytes``; a single result larger than the
+    bound is not cached. Calls that raise, or whose arguments are not
+    hashable, are passed straight through.
+
+    Example:
+        >>> factorial = MemoizedFunction(math.factorial, max_bytes=1 << 20)
+        >>> _ = factorial(20000), factorial(20000)
+        >>> factorial.stats().hit_ratio
+        0.5
+    """
+
+    __slots__ = ('function', 'max_bytes', 'nbytes', 'hits', 'misses', 'evictions', '_results')
+
+    def __init__(self, function: Callable[..., Any], max_bytes: int = 1 << 20):
+        """
+        Initialize the memoized function.
+
+        Args:
+            function: The pure function to memoize
+            max_bytes: Bound on the total size of the cached results
+        """
+        self.function = function
+        self.max_bytes = max(0, max_bytes)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (result, size in bytes), least recently used first
+        self._results: "OrderedDict[Tuple[Any, ...], Tuple[Any, int]]" = OrderedDict()
+
+    def __call__(self, *args: Any) -> Any:
+        results = self._results
+        key = args + tuple(map(type, args))
+        try:
+            value, _ = results[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable arguments, e.g. arrays
+            return self.function(*args)
+        else:
+            results.move_to_end(key)
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = self.function(*args)
+        size = sys.getsizeof(value)
+        if size <= self.max_bytes:
+            while self.nbytes + size > self.max_bytes:
+                _, (_, evicted) = results.popitem(last=False)
+                self.nbytes -= evicted
+                self.evictions += 1
+            results[key] = (value, size)
+            self.nbytes += size
+        return value
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def __repr__(self) -> str:
+        name = getattr(self.function, '__name__', repr(self.function))
+        return f"MemoizedFunction({name}, max_bytes={self.max_bytes})"
+
+    def clear(self):
+        """Remove all cached results and reset the statistics."""
+        self._results.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> CacheStats:
+        """
+        Get the memoization statistics.
+
+        Returns:
+            A CacheStats snapshot whose ``size`` and ``maxsize`` are in bytes
+        """
+        return CacheStats(self.hits, self.misses, self.evictions, self.nbytes, self.max_bytes)
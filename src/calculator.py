@@ -1,15 +1,80 @@
 """Core calculator implementation."""
 
 import math
-import re
-from typing import Union, List, Tuple, Dict, Any
-from decimal import Decimal, getcontext
+from collections import ChainMap, Counter
+from typing import IO, Union, List, Tuple, Dict, Any, Optional, Callable, Mapping
+from decimal import Decimal
 
-from .enums import OperationType
+from .budget import Budget, evaluate_within
+from .bytecode import Program, lower
+from .cache import CacheStats, ExpressionCache, MemoizedFunction
+from .canonical import canonical_form, fingerprint
+from .codegen import specialize
+from .compiled import CompiledExpression
+from .enums import EvictionPolicy, OperationType
+from .errors import BudgetExceeded, ExpressionSyntaxError
+from .estimate import CostEstimate, estimate
+from .functions import UserFunction
+from .integers import binom, factorial, factorial_mod, format_integer, gcd, lcm, powmod, prod
+from .lexer import (
+    ASSIGN, NAME, SEMICOLON, Token, lift_literals, split_literals, to_source, tokenize,
+    tokenize_stream
+)
+from .nodes import Node, Number, Script, evaluate
+from .optimizer import optimize as optimize_tree
+from .parallel import PARALLEL_BITS, ProductKernel
+from .parser import parse, parse_definition
+from .precise import (
+    accurate, bound_float, converge, decimal_constants, evaluate_decimal, round_digits
+)
+from .rational import evaluate_exact, rational_literal
+from .registry import FunctionRegistry, FunctionSpec, describe
+from .vectorized import array_factorial
 
+# Marker for cache entries whose result depends on evaluation
+_UNSET = object()
 
-# Set decimal precision for accurate calculations
-getcontext().prec = 50
+# Longest expression, in tokens, compiled into a template; longer ones are
+# rarely repeated and nest deeper than compiled Python code may
+_TEMPLATE_TOKENS = 1000
+
+# Marker for expression shapes seen once; their template is compiled when
+# the shape is seen again
+_SEEN = object()
+
+# Longest expression text printed in verbose mode; longer text is elided
+# in the middle
+_VERBOSE_CHARS = 200
+
+
+def _describe(node: Node) -> str:
+    """Get the text of a tree for verbose output, shortened when it is long."""
+    try:
+        text = str(node)
+    except (RecursionError, ValueError):
+        # Formatting recurses over the nodes, and a Fraction over 4300
+        # digits cannot be formatted; neither stops the evaluation
+        return f"<{type(node).__name__} too large to print>"
+    if len(text) > _VERBOSE_CHARS:
+        half = _VERBOSE_CHARS // 2
+        text = f"{text[:half]}...{text[-half:]} ({len(text)} characters)"
+    return text
+
+
+class _CacheEntry:
+    """A parsed expression held in the Calculator's expression cache."""
+    
+    __slots__ = ('node', 'value')
+    
+    def __init__(self, node: Node):
+        self.node = node
+        # Constant-only expressions and scripts are folded while parsing
+        if type(node) is Number:
+            self.value: Any = node.value
+        elif type(node) is Script and node.is_constant:
+            self.value = node.statements[-1][1].value
+        else:
+            self.value = _UNSET
 
 
 class Calculator:
@@ -42,41 +107,99 @@ class Calculator:
         'tau': 2 * math.pi,
     }
     
-    # Supported mathematical functions
-    FUNCTIONS: Dict[str, callable] = {
-        'sin': math.sin,
-        'cos': math.cos,
-        'tan': math.tan,
-        'asin': math.asin,
-        'acos': math.acos,
-        'atan': math.atan,
-        'sinh': math.sinh,
-        'cosh': math.cosh,
-        'tanh': math.tanh,
-        'sqrt': math.sqrt,
-        'exp': math.exp,
-        'log': math.log10,
-        'log10': math.log10,
-        'ln': math.log,
-        'abs': abs,
-        'floor': math.floor,
-        'ceil': math.ceil,
-        'round': round,
-        'degrees': math.degrees,
-        'radians': math.radians,
-        'factorial': math.factorial,
-    }
+    # Supported mathematical functions, with their arity, purity, NumPy
+    # counterpart and relative cost
+    FUNCTIONS: FunctionRegistry = FunctionRegistry({
+        'sin': FunctionSpec(math.sin, vectorized='sin', cost=4),
+        'cos': FunctionSpec(math.cos, vectorized='cos', cost=4),
+        'tan': FunctionSpec(math.tan, vectorized='tan', cost=4),
+        'asin': FunctionSpec(math.asin, vectorized='arcsin', cost=4),
+        'acos': FunctionSpec(math.acos, vectorized='arccos', cost=4),
+        'atan': FunctionSpec(math.atan, vectorized='arctan', cost=4),
+        'sinh': FunctionSpec(math.sinh, vectorized='sinh', cost=4),
+        'cosh': FunctionSpec(math.cosh, vectorized='cosh', cost=4),
+        'tanh': FunctionSpec(math.tanh, vectorized='tanh', cost=4),
+        'sqrt': FunctionSpec(math.sqrt, vectorized='sqrt', cost=2),
+        'exp': FunctionSpec(math.exp, vectorized='exp', cost=4),
+        'log': FunctionSpec(math.log10, vectorized='log10', cost=4),
+        'log10': FunctionSpec(math.log10, vectorized='log10', cost=4),
+        'ln': FunctionSpec(math.log, None, vectorized='log', cost=4),
+        'abs': FunctionSpec(abs, vectorized='abs'),
+        'floor': FunctionSpec(math.floor, vectorized='floor'),
+        'ceil': FunctionSpec(math.ceil, vectorized='ceil'),
+        'round': FunctionSpec(round, None, vectorized='round'),
+        'degrees': FunctionSpec(math.degrees, vectorized='degrees'),
+        'radians': FunctionSpec(math.radians, vectorized='radians'),
+        'factorial': FunctionSpec(factorial, vectorized=array_factorial, cost=16),
+        'factorial_mod': FunctionSpec(factorial_mod, 2, cost=16),
+        'powmod': FunctionSpec(powmod, 3, cost=8),
+        'binom': FunctionSpec(binom, 2, cost=8),
+        'gcd': FunctionSpec(gcd, None, cost=2),
+        'lcm': FunctionSpec(lcm, None, cost=2),
+        'prod': FunctionSpec(prod, None, cost=2),
+    })
     
-    def __init__(self, verbose: bool = False):
+    def __init__(
+        self,
+        verbose: bool = False,
+        cache_size: int = 256,
+        cache_policy: EvictionPolicy = EvictionPolicy.LRU,
+        cache_ttl: Optional[float] = None,
+        optimize: bool = True,
+        algebraic: bool = False,
+        budget: Optional[Budget] = None,
+        precision: Optional[int] = None,
+        exact: bool = False,
+    ):
         """
         Initialize the Calculator.
         
         Args:
             verbose: If True, display detailed calculation steps
+            cache_size: Maximum number of compiled expressions to keep; 0 disables the cache
+            cache_policy: Eviction policy of the expression cache
+            cache_ttl: Lifetime in seconds of cached expressions (TTL policy only)
+            optimize: If True, apply the rewrites that keep the value
+                (identity elimination, constant folding, common
+                subexpressions) to compiled expressions
+            algebraic: If True, optimized expressions are also rewritten in
+                Horner form and ``x^2`` becomes ``x*x``. Float results may
+                then differ where terms cancel or values overflow, see
+                :func:`src.optimizer.optimize`
+            budget: Limits on time, integer size and memory applied to every
+                expression calculated; None for no limits
+            precision: Significant digits of every result, computed by
+                :meth:`evaluate_precise`; None for plain float arithmetic.
+                Cannot be combined with a budget
+            exact: If True, compute with exact rationals, see
+                :meth:`evaluate_exact`. Cannot be combined with a budget or
+                a precision
+            
+        Raises:
+            ValueError: If more than one of a budget, a precision and exact
+                arithmetic are given
         """
+        if (budget is not None) + (precision is not None) + exact > 1:
+            raise ValueError("Only one of a budget, a precision and exact arithmetic can be used")
         self.verbose = verbose
         self.calculation_history: List[Tuple[str, Union[float, str]]] = []
         self.last_result: Union[float, str, None] = None
+        self._cache = ExpressionCache(cache_size, cache_policy, cache_ttl)
+        # Compiled templates by expression shape (the tokens without their numbers)
+        self._templates = ExpressionCache(cache_size, cache_policy, cache_ttl)
+        # Functions defined on this instance, looked up before FUNCTIONS
+        self.user_functions: Dict[str, UserFunction] = {}
+        # Built-in functions whose results are memoized, see memoize()
+        self.memoized = FunctionRegistry()
+        # Built-in functions computed by a multi-process kernel, see parallelize()
+        self.kernels = FunctionRegistry()
+        self.kernel: Optional[ProductKernel] = None
+        self.functions = ChainMap(self.user_functions, self.memoized, self.kernels, self.FUNCTIONS)
+        self.optimize = optimize
+        self.algebraic = algebraic
+        self.budget = budget
+        self.precision = precision
+        self.exact = exact
     
     def validate_expression(self, expression: str) -> Tuple[bool, str]:
         """
@@ -88,20 +211,33 @@ class Calculator:
         Returns:
             Tuple of (is_valid, error_message)
         """
-        # Check for empty expression
-        if not expression or not expression.strip():
-            return False, "Error: Empty expression provided."
-        
-        # Check for balanced parentheses
-        if expression.count('(') != expression.count(')'):
-            return False, "Error: Unbalanced parentheses."
+        try:
+            self.tokenize(expression)
+        except ExpressionSyntaxError as e:
+            return False, f"Error: {e}."
+        return True, ""
+    
+    def tokenize(self, expression: str, real: Callable[[str], Any] = float) -> List[Token]:
+        """
+        Validate and normalize the expression into tokens in a single pass.
         
-        # Check for valid characters
-        allowed_chars = set('0123456789+-*/%^.()abcdefghijklmnopqrstuvwxyz_ ')
-        if not all(c.lower() in allowed_chars for c in expression):
-            return False, "Error: Invalid characters in expression."
+        Constants are resolved, ``^`` becomes ``**`` and implicit
+        multiplication is made explicit.
         
-        return True, ""
+        Args:
+            expression: The raw expression string
+            real: Type of the literals with a decimal point
+            
+        Returns:
+            The list of tokens
+            
+        Raises:
+            ExpressionSyntaxError: If the expression is empty or malformed
+        """
+        # Check for empty expression
+        if not expression or expression.isspace():
+            raise ExpressionSyntaxError("Empty expression provided")
+        return tokenize(expression, self.CONSTANTS, real)
     
     def preprocess_expression(self, expression: str) -> str:
         """
@@ -112,23 +248,346 @@ class Calculator:
             
         Returns:
             The processed expression string
+            
+        Raises:
+            ExpressionSyntaxError: If the expression is empty or malformed
+        """
+        return to_source(self.tokenize(expression))
+    
+    def parse(self, expression: str) -> Node:
+        """
+        Parse the expression into a tree, folding constant subexpressions.
+        
+        Args:
+            expression: The raw expression string
+            
+        Returns:
+            The root node of the expression tree
+            
+        Raises:
+            ExpressionSyntaxError: If the expression is empty or malformed
+            NameError: If the expression calls an unknown function
+        """
+        return parse(self.tokenize(expression), self.functions, len(expression))
+    
+    def optimized(self, expression: str) -> Node:
+        """
+        Parse the expression and, unless disabled, optimize the tree.
+        
+        This is the tree compiled by :meth:`compile`, :meth:`lower` and
+        :meth:`specialize`.
+        
+        Args:
+            expression: The raw expression string
+            
+        Returns:
+            The root node of the optimized expression tree
+            
+        Raises:
+            ExpressionSyntaxError: If the expression is empty or malformed
+            NameError: If the expression calls an unknown function
+            
+        Example:
+            >>> str(Calculator(algebraic=True).optimized("3x^3 + 2x^2 + x"))
+            '(((((3 * x) + 2) * x) + 1) * x)'
+        """
+        tree = self.parse(expression)
+        return optimize_tree(tree, self.algebraic) if self.optimize else tree
+    
+    def canonical(self, expression: str) -> str:
+        """
+        Get the canonical form of an expression.
+        
+        Equivalent spellings, differing in whitespace, case, constants or the
+        operand order of ``+`` and ``*``, have the same canonical form.
+        
+        Args:
+            expression: The raw expression string
+            
+        Returns:
+            The canonical expression text
+            
+        Raises:
+            ExpressionSyntaxError: If the expression is empty or malformed
+            NameError: If the expression calls an unknown function
+            
+        Example:
+            >>> Calculator().canonical("1 + X*2")
+            '((2 * x) + 1)'
+        """
+        return canonical_form(self.parse(expression))
+    
+    def fingerprint(self, expression: str) -> int:
+        """
+        Get a stable 64-bit fingerprint of the canonical form of an expression.
+        
+        Unlike ``hash()``, the fingerprint is the same in every process and
+        run, so it can key caches on disk or shared between workers.
+        
+        Args:
+            expression: The raw expression string
+            
+        Returns:
+            An unsigned 64-bit integer
+            
+        Raises:
+            ExpressionSyntaxError: If the expression is empty or malformed
+            NameError: If the expression calls an unknown function
+        """
+        return fingerprint(self.parse(expression))
+    
+    def estimate_cost(self, expression: str) -> CostEstimate:
+        """
+        Estimate the size of the result and the work of an expression without evaluating it.
+        
+        The expression is parsed without folding constants, so nothing is
+        computed; schedulers can route or reject work by the estimate
+        before calling :meth:`calculate`.
+        
+        Args:
+            expression: The raw expression string
+            
+        Returns:
+            The CostEstimate: node count, depth, calls per function and
+            upper bounds of the result's magnitude (in bits) and of the work
+            
+        Raises:
+            ExpressionSyntaxError: If the expression is empty or malformed
+            NameError: If the expression calls an unknown function
+            
+        Example:
+            >>> calc.estimate_cost("2^2^2^30").enormous
+            True
+            >>> calc.estimate_cost("sin(x)^2 + 1").functions
+            {'sin': 1}
+        """
+        tree = parse(self.tokenize(expression), self.functions, len(expression), fold=False)
+        return estimate(tree, self.functions)
+    
+    def define(self, definition: str) -> UserFunction:
+        """
+        Define a function on this calculator instance.
+        
+        The function can be called from any later expression. Bodies small
+        enough are inlined into the calling expressions while parsing, so
+        compiled expressions pay no call overhead for them. Redefining a
+        user function replaces it, also in the user functions calling it,
+        which are defined again from their source; built-in functions
+        cannot be redefined.
+        
+        Args:
+            definition: The definition, e.g. ``"hyp(a, b) = sqrt(a^2 + b^2)"``
+            
+        Returns:
+            The defined function
+            
+        Raises:
+            ExpressionSyntaxError: If the definition is malformed
+            NameError: If the body uses an unknown function or a name that
+                is not a parameter
+            
+        Example:
+            >>> calc = Calculator()
+            >>> calc.define("hyp(a, b) = sqrt(a^2 + b^2)")
+            UserFunction('hyp(a, b) = sqrt(((a ** 2) + (b ** 2)))')
+            >>> calc.calculate("hyp(3, 4)")
+            5.0
+        """
+        function = self._define(definition, self.functions)
+        # Functions calling the previous definition captured it, inlined or
+        # called; define them again, in dependency order, so that they call
+        # the new one. Nothing changes if one of them no longer parses
+        defined = {function.name: function}
+        functions = ChainMap(defined, self.functions)
+        for dependent in self._dependents(function.name):
+            defined[dependent] = self._define(self.user_functions[dependent].source, functions)
+        self.user_functions.update(defined)
+        # Cached trees may have inlined or failed to find the previous definition
+        self.clear_cache()
+        return function
+    
+    def _define(self, definition: str, functions: Mapping[str, Callable[..., Any]]) -> UserFunction:
+        """Parse a definition against the given functions."""
+        tokens = self.tokenize(definition)
+        name, parameters, body = parse_definition(tokens, functions, len(definition))
+        calls = {value for kind, value, _ in tokens
+                 if kind == NAME and isinstance(functions.get(value), UserFunction)}
+        return UserFunction(name, parameters, body, self.optimize, self.algebraic,
+                            definition, calls)
+    
+    def _dependents(self, name: str) -> List[str]:
+        """Get the user functions calling ``name``, directly or not, callees first."""
+        dependents = set()
+        changed = [name]
+        while changed:
+            callee = changed.pop()
+            for function in self.user_functions.values():
+                if (callee in function.calls and function.name != name
+                        and function.name not in dependents):
+                    dependents.add(function.name)
+                    changed.append(function.name)
+        ordered: List[str] = []
+        while dependents:
+            ready = [dependent for dependent in self.user_functions if dependent in dependents
+                     and not (self.user_functions[dependent].calls - {dependent}) & dependents]
+            if not ready:
+                # Functions calling each other: their definition order will do
+                ready = [dependent for dependent in self.user_functions if dependent in dependents]
+            ordered.extend(ready)
+            dependents.difference_update(ready)
+        return ordered
+    
+    def memoize(self, name: str, max_bytes: int = 1 << 20) -> MemoizedFunction:
+        """
+        Cache the results of a built-in function on this calculator instance.
+        
+        Worthwhile for expensive pure functions called with the same
+        arguments again and again, such as ``factorial`` of large integers.
+        Memoizing a function again replaces its cache.
+        
+        Args:
+            name: The name of a function in FUNCTIONS
+            max_bytes: Bound on the total size of the cached results
+            
+        Returns:
+            The memoized function, whose ``stats()`` report its hit ratio
+            
+        Raises:
+            ValueError: If ``name`` is not a built-in function or is impure
+            
+        Example:
+            >>> calc = Calculator()
+            >>> calc.memoize("factorial", max_bytes=1 << 20)
+            MemoizedFunction(factorial, max_bytes=1048576)
+            >>> calc.calculate("factorial(20000) % 7"), calc.calculate("factorial(20000) % 11")
+            (0, 0)
+            >>> calc.memo_info()["factorial"].hit_ratio
+            0.5
+        """
+        if name not in self.FUNCTIONS:
+            raise ValueError(f"Cannot memoize unknown built-in function '{name}'")
+        spec = describe(ChainMap(self.kernels, self.FUNCTIONS), name)
+        if not spec.pure:
+            raise ValueError(f"Cannot memoize impure function '{name}'")
+        function = MemoizedFunction(spec.function, max_bytes)
+        self.memoized[name] = spec._replace(function=function)
+        # Cached trees hold the function they were parsed with
+        self.clear_cache()
+        return function
+    
+    def parallelize(
+        self,
+        workers: Optional[int] = None,
+        threshold: int = PARALLEL_BITS,
+    ) -> ProductKernel:
+        """
+        Compute huge ``factorial`` and ``prod`` results on a pool of worker processes.
+        
+        Products whose result exceeds ``threshold`` bits are split into
+        product trees across the workers (see :class:`ProductKernel`);
+        smaller ones are computed in process as before. Functions memoized
+        with :meth:`memoize` stay memoized and use the kernel. Calling it
+        again replaces the kernel and stops the previous pool.
+        
+        Args:
+            workers: Number of worker processes; defaults to the CPU count
+            threshold: Bit length of the result below which products are
+                computed in process
+            
+        Returns:
+            The kernel; ``close()`` stops its workers
+            
+        Example:
+            >>> calc = Calculator()
+            >>> calc.parallelize(workers=8)
+            ProductKernel(workers=8, threshold=4194304)
+            >>> calc.calculate("factorial(10^6) % 1000003")
+            500001
+        """
+        if self.kernel is not None:
+            self.kernel.close()
+        self.kernel = ProductKernel(workers, threshold)
+        for name, function in (('factorial', self.kernel.factorial), ('prod', self.kernel.prod)):
+            self.kernels[name] = describe(self.FUNCTIONS, name)._replace(function=function)
+            if name in self.memoized:
+                # A memo resolves first: compute its misses on the kernel,
+                # keeping the results cached so far
+                self.memoized[name].function = function
+        # Cached trees hold the function they were parsed with
+        self.clear_cache()
+        return self.kernel
+    
+    def memo_info(self) -> Dict[str, CacheStats]:
+        """
+        Get the statistics of every memoized function.
+        
+        Returns:
+            Mapping of function names to CacheStats snapshots, with sizes in bytes
+        """
+        return {name: function.stats() for name, function in self.memoized.items()}
+    
+    def compile(self, expression: str) -> CompiledExpression:
+        """
+        Compile an expression with free variables for repeated evaluation.
+        
+        The expression is parsed and compiled once; names that are neither
+        constants nor functions are variables bound at evaluation time.
+        
+        Args:
+            expression: The raw expression string, e.g. ``"pi * r^2"``
+            
+        Returns:
+            The compiled expression
+            
+        Raises:
+            ExpressionSyntaxError: If the expression is empty or malformed
+            NameError: If the expression calls an unknown function
+            
+        Example:
+            >>> area = Calculator().compile("pi * r^2")
+            >>> area.evaluate_many({'r': r} for r in [1, 2, 5])
+            [3.141592653589793, 12.566370614359172, 78.53981633974483]
+        """
+        return CompiledExpression(expression, self.optimized(expression))
+    
+    def lower(self, expression: str) -> Program:
         """
-        processed = expression.lower().strip()
+        Compile the expression into a serializable bytecode program.
         
-        # Replace constants
-        for const_name, const_value in self.CONSTANTS.items():
-            processed = re.sub(r'\b' + const_name + r'\b', str(const_value), processed)
+        Programs can be pickled or stored with ``Program.to_bytes()`` and run
+        repeatedly without reparsing.
         
-        # Replace ^ with ** for exponentiation
-        processed = processed.replace('^', '**')
+        Args:
+            expression: The raw expression string
+            
+        Returns:
+            The bytecode program
+            
+        Raises:
+            ExpressionSyntaxError: If the expression is empty or malformed
+            NameError: If the expression calls an unknown function
+        """
+        return lower(self.optimized(expression), self.functions)
+    
+    def specialize(self, expression: str) -> Callable[..., Any]:
+        """
+        Compile the expression into a specialized Python function for hot paths.
         
-        # Add multiplication operator where needed (e.g., "2pi" -> "2*pi")
-        processed = re.sub(r'(\d)([a-z])', r'\1*\2', processed)
-        processed = re.sub(r'(\))(\()', r'\1*\2', processed)
-        processed = re.sub(r'(\d)(\()', r'\1*\2', processed)
-        processed = re.sub(r'(\))(\d)', r'\1*\2', processed)
+        Functions from FUNCTIONS are bound as closure locals, so calls involve
+        no dictionary lookups. Variables become positional parameters listed
+        in the function's ``variables`` attribute.
         
-        return processed
+        Args:
+            expression: The raw expression string
+            
+        Returns:
+            The specialized function
+            
+        Raises:
+            ExpressionSyntaxError: If the expression is empty or malformed
+            NameError: If the expression calls an unknown function
+        """
+        return specialize(self.optimized(expression))
     
     def calculate(self, expression: str) -> Union[float, str]:
         """
@@ -140,61 +599,333 @@ class Calculator:
         Returns:
             The result of the calculation or an error message
         """
-        # Validate expression
-        is_valid, error_msg = self.validate_expression(expression)
-        if not is_valid:
+        try:
+            result = self._evaluate(expression)
+        except Exception as e:
+            error_msg = self._error_message(e)
             self.calculation_history.append((expression, error_msg))
             return error_msg
         
+        # Store in history and as last result
+        self.calculation_history.append((expression, result))
+        self.last_result = result
+        return result
+    
+    def calculate_stream(self, stream: IO[str], chunk_size: int = 1 << 16) -> Union[float, str]:
+        """
+        Calculate an expression read from a text file object.
+        
+        For machine-generated expressions too large to hold comfortably as
+        one string: the source is tokenized chunk by chunk, and parsing and
+        evaluation use explicit stacks, so nesting depth is not limited by
+        Python's recursion limit. The expression cache is bypassed, and the
+        history records the stream's name in place of the expression.
+        
+        Args:
+            stream: A text file object holding one expression or script
+            chunk_size: Number of characters read at a time
+            
+        Returns:
+            The result of the calculation or an error message
+            
+        Example:
+            >>> with open("generated.txt") as f:
+            ...     calc.calculate_stream(f)
+        """
+        name = str(getattr(stream, 'name', '<stream>'))
         try:
-            # Preprocess the expression
-            processed = self.preprocess_expression(expression)
+            tokens, length = tokenize_stream(stream, self.CONSTANTS, chunk_size)
+            if not tokens:
+                raise ExpressionSyntaxError("Empty expression provided")
+            if self.budget is None:
+                result = evaluate(parse(tokens, self.functions, length))
+            else:
+                tree = parse(tokens, self.functions, length, fold=False)
+                result = evaluate_within(tree, self.budget)
+        except Exception as e:
+            error_msg = self._error_message(e)
+            self.calculation_history.append((name, error_msg))
+            return error_msg
+        
+        self.calculation_history.append((name, result))
+        self.last_result = result
+        return result
+    
+    def evaluate_budgeted(
+        self,
+        expression: str,
+        budget: Optional[Budget] = None,
+        cancel: Optional[Any] = None,
+    ) -> Any:
+        """
+        Evaluate an expression within limits on time, integer size and memory.
+        
+        Nothing is computed while parsing; every operation is checked
+        against the budget before it runs, so ``factorial(100000)`` or
+        ``9^9^9`` fail at once instead of pinning a CPU. See :class:`Budget`
+        for the sandboxed worker with rlimits.
+        
+        Args:
+            expression: The raw expression string
+            budget: The limits; defaults to the calculator's budget
+            cancel: Optional ``threading.Event``; setting it from another
+                thread stops the evaluation
             
-            if self.verbose:
-                print(f"Processing expression: {processed}")
+        Returns:
+            The value of the expression
+            
+        Raises:
+            BudgetExceeded: When a limit is exceeded, with the resource and
+                its limit as attributes
+            EvaluationCancelled: When ``cancel`` is set
+            ExpressionSyntaxError: If the expression is empty or malformed
             
-            # Create a safe evaluation environment
-            safe_dict: Dict[str, Any] = {
-                '__builtins__': {},
-                **self.FUNCTIONS,
-                **self.CONSTANTS,
-            }
+        Example:
+            >>> calc.evaluate_budgeted("factorial(100000)", Budget(bits=100000))
+            Traceback (most recent call last):
+            BudgetExceeded: bits limit of 100000 exceeded: ...
+        """
+        if budget is None:
+            budget = self.budget if self.budget is not None else Budget()
+        tree = parse(self.tokenize(expression), self.functions, len(expression), fold=False)
+        return evaluate_within(tree, budget, cancel)
+    
+    def evaluate_exact(self, expression: str) -> Any:
+        """
+        Evaluate an expression with exact rational arithmetic.
+        
+        Literals such as ``0.1`` are read as exact fractions and
+        ``+ - * / ^`` keep results exact, so ``1/3*3`` is exactly 1 and
+        ``0.1 + 0.2 == 0.3`` holds. Results that are integers are native
+        ints. Functions without an exact result, e.g. ``sin`` or ``ln``,
+        and the constants pi, e, phi and tau give floats.
+        
+        Args:
+            expression: The raw expression string
             
-            # Evaluate the expression
-            result = eval(processed, safe_dict)
+        Returns:
+            An int, Fraction, bool or float
             
-            # Store in history and as last result
-            self.calculation_history.append((expression, result))
-            self.last_result = result
+        Raises:
+            ExpressionSyntaxError: If the expression is empty or malformed
             
-            return result
+        Example:
+            >>> Calculator().evaluate_exact("1/3 + 0.25")
+            Fraction(7, 12)
+        """
+        tokens = self.tokenize(expression, rational_literal)
+        return evaluate_exact(parse(tokens, self.functions, len(expression), fold=False))
+    
+    def evaluate_precise(self, expression: str, digits: Optional[int] = None) -> Any:
+        """
+        Evaluate an expression correct to a number of significant digits.
         
-        except ZeroDivisionError:
-            error_msg = "Error: Division by zero."
-            self.calculation_history.append((expression, error_msg))
-            return error_msg
+        The expression is first evaluated in floats while bounding the
+        accumulated rounding error; when the bound shows the float result
+        has the requested digits, it is used. Otherwise, e.g. for
+        ``(1 + 10^-17) - 1`` or more digits than a float holds, it is
+        evaluated again with exact Decimal literals in a local decimal
+        context (see :func:`src.precise.converge`). The global decimal
+        context is never changed.
         
-        except ValueError as e:
-            error_msg = f"Error: Invalid mathematical operation - {str(e)}"
-            self.calculation_history.append((expression, error_msg))
-            return error_msg
+        Args:
+            expression: The raw expression string
+            digits: Significant digits; defaults to the calculator's
+                precision, or 15 when it has none
+            
+        Returns:
+            An int for exact integer results, a bool for comparisons,
+            otherwise a Decimal rounded to ``digits`` significant digits
+            
+        Raises:
+            ExpressionSyntaxError: If the expression is empty or malformed
+            ValueError: If digits is not positive
+            
+        Example:
+            >>> Calculator().evaluate_precise("sqrt(2)", 30)
+            Decimal('1.41421356237309504880168872421')
+        """
+        if digits is None:
+            digits = self.precision if self.precision is not None else 15
+        if digits < 1:
+            raise ValueError("digits must be positive")
+        tree = parse(self.tokenize(expression), self.functions, len(expression), fold=False)
+        bounded = bound_float(tree)
+        if accurate(bounded, digits):
+            if self.verbose:
+                print(f"Processing expression: {_describe(tree)} (floats suffice)")
+            return round_digits(bounded[0], digits)
         
-        except Exception as e:
-            error_msg = f"Error: {type(e).__name__} - {str(e)}"
-            self.calculation_history.append((expression, error_msg))
-            return error_msg
+        def compute() -> Any:
+            tokens = tokenize(expression, decimal_constants(self.CONSTANTS), Decimal)
+            return evaluate_decimal(parse(tokens, self.functions, len(expression), fold=False))
+        
+        return converge(compute, digits)
     
     def calculate_batch(self, expressions: List[str]) -> List[Union[float, str]]:
         """
         Calculate multiple expressions in batch.
         
+        The batch is planned as a whole: each distinct expression is parsed
+        and evaluated once, and the constant subexpressions shared by several
+        expressions (e.g. the same ``(1 + 0.05/12)^(12*10)`` growth factor in
+        many rows) are computed once for the whole batch. Expressions calling
+        impure functions are evaluated every time they occur. Results and
+        history are the same as calling :meth:`calculate` on each expression
+        in turn.
+        
         Args:
             expressions: List of expressions to evaluate
             
         Returns:
-            List of results
+            List of results, in the order of ``expressions``
+        """
+        # Values of the constant subtrees folded so far in this batch
+        memo: Dict[Any, Any] = {}
+        counts = Counter(expressions)
+        outcomes: Dict[str, Tuple[bool, Any]] = {}
+        
+        results = []
+        for expression in expressions:
+            outcome = outcomes.get(expression)
+            if outcome is None:
+                try:
+                    outcome = (True, self._evaluate(expression, memo))
+                except Exception as e:
+                    outcome = (False, self._error_message(e))
+                # Repeated expressions are evaluated once, unless they call
+                # impure functions
+                if counts[expression] > 1 and not self._calls_impure(expression):
+                    outcomes[expression] = outcome
+            ok, result = outcome
+            self.calculation_history.append((expression, result))
+            if ok:
+                self.last_result = result
+            results.append(result)
+        return results
+    
+    def _evaluate(self, expression: str, memo: Optional[Dict[Any, Any]] = None) -> Any:
+        """
+        Evaluate an expression through the expression cache.
+        
+        Args:
+            expression: The raw expression string
+            memo: Values of constant subtrees shared with other expressions
+            
+        Returns:
+            The value of the expression
+        """
+        if self.precision is not None:
+            return self.evaluate_precise(expression)
+        if self.exact:
+            return self.evaluate_exact(expression)
+        
+        entry = self._cache.get(expression)
+        if entry is not None and entry.value is not _UNSET:
+            if self.verbose:
+                print(f"Processing expression: {_describe(entry.node)} (cached)")
+            return entry.value
+        
+        if self.budget is not None:
+            # Nothing may be computed outside the budget: no folding while
+            # parsing and no templates
+            tokens = self.tokenize(expression)
+            tree = parse(tokens, self.functions, len(expression), fold=False)
+            value = evaluate_within(tree, self.budget)
+            if not self._calls_impure(tokens):
+                self._cache.put(expression, _CacheEntry(Number(value)))
+            return value
+        
+        if entry is None:
+            tokens = self.tokenize(expression)
+            shape, literals = split_literals(tokens)
+            template = self._templates.get(shape)
+            if template is not None and template is not _SEEN and template is not False:
+                # Same shape as earlier expressions: only the numbers differ
+                value = template(*literals)
+                self._cache.put(expression, _CacheEntry(Number(value)))
+                if self.verbose:
+                    print(f"Processing expression: {expression} (template)")
+                return value
+            
+            # Parse the expression once; syntax errors are raised here, so
+            # only shapes that parse are remembered
+            tree = parse(tokens, self.functions, len(expression), memo)
+            entry = _CacheEntry(tree)
+            self._cache.put(expression, entry)
+            if template is None:
+                self._templates.put(shape, _SEEN)
+            elif template is _SEEN:
+                self._templates.put(shape, self._template(tokens))
+        
+        if self.verbose:
+            print(f"Processing expression: {_describe(entry.node)}")
+        
+        # Evaluate the expression tree
+        return evaluate(entry.node)
+    
+    def _template(self, tokens: List[Token]) -> Any:
+        """
+        Compile an expression with its numbers lifted into parameters.
+        
+        Args:
+            tokens: The tokens of an expression that parsed successfully
+            
+        Returns:
+            A function of the literal values in order, or False when the
+            expression has variables or statements and cannot be a template
+        """
+        if len(tokens) > _TEMPLATE_TOKENS:
+            return False
+        if any(kind in (ASSIGN, SEMICOLON) for kind, _, _ in tokens):
+            return False
+        if self._calls_impure(tokens):
+            # Results of templates are cached as values
+            return False
+        lifted, names = lift_literals(tokens)
+        try:
+            function = specialize(parse(lifted, self.functions), parameters=names)
+        except (ExpressionSyntaxError, NameError, SyntaxError, RecursionError):
+            # Nested too deeply for the Python compiler
+            return False
+        if len(function.variables) != len(names):
+            return False
+        return function
+    
+    def _calls_impure(self, expression: Union[str, List[Token]]) -> bool:
+        """
+        Check whether an expression calls a function that is not pure.
+        
+        The values of such expressions are never cached or reused.
+        
+        Args:
+            expression: The raw expression string, or its tokens
+            
+        Returns:
+            True if any function called is impure; False for expressions
+            that do not tokenize, since their errors repeat
         """
-        return [self.calculate(expr) for expr in expressions]
+        if isinstance(expression, str):
+            try:
+                expression = self.tokenize(expression)
+            except ExpressionSyntaxError:
+                return False
+        functions = self.functions
+        return any(kind == NAME and name in functions and not describe(functions, name).pure
+                   for kind, name, _ in expression)
+    
+    @staticmethod
+    def _error_message(error: Exception) -> str:
+        """Format an error raised by an expression as a result string."""
+        if isinstance(error, ExpressionSyntaxError):
+            return f"Error: {error}."
+        if isinstance(error, ZeroDivisionError):
+            return "Error: Division by zero."
+        if isinstance(error, BudgetExceeded):
+            return f"Error: Budget exceeded - {error}"
+        if isinstance(error, ValueError):
+            return f"Error: Invalid mathematical operation - {str(error)}"
+        return f"Error: {type(error).__name__} - {str(error)}"
     
     def get_history(self, limit: int = None) -> List[Tuple[str, Union[float, str]]]:
         """
@@ -215,6 +946,34 @@ class Calculator:
         self.calculation_history = []
         self.last_result = None
     
+    def cache_info(self) -> CacheStats:
+        """
+        Get hit, miss and eviction statistics of the expression cache.
+        
+        Returns:
+            A CacheStats snapshot
+        """
+        return self._cache.stats()
+    
+    def template_cache_info(self) -> CacheStats:
+        """
+        Get statistics of the template cache.
+        
+        Expressions that miss the expression cache are looked up by shape,
+        i.e. with their numbers left out. ``"0.5 * 1000 * 20^2"`` and
+        ``"0.5 * 1200 * 25^2"`` share one compiled template, so generated
+        workloads that only vary their numbers are compiled once.
+        
+        Returns:
+            A CacheStats snapshot
+        """
+        return self._templates.stats()
+    
+    def clear_cache(self):
+        """Discard all cached expressions, e.g. after changing FUNCTIONS or CONSTANTS."""
+        self._cache.clear()
+        self._templates.clear()
+    
     @staticmethod
     def format_result(result: Union[float, str], decimal_places: int = 2) -> str:
         """
@@ -230,9 +989,12 @@ class Calculator:
         if isinstance(result, str):
             return result
         
-        if isinstance(result, float):
+        if isinstance(result, int) and not isinstance(result, bool):
+            return format_integer(result)
+        
+        if isinstance(result, (float, Decimal)):
             if result == int(result):
-                return str(int(result))
+                return format_integer(int(result))
             return f"{result:.{decimal_places}f}"
         
         return str(result)
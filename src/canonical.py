@@ -0,0 +1,115 @@
+"""Canonical forms and stable fingerprints of expression trees."""
+
+from hashlib import blake2b
+from typing import Dict, Tuple
+
+from .nodes import BinaryOp, Call, Conditional, Node, Script, UnaryOp
+
+
+# Operators whose two operands can be swapped without changing the result,
+# including its rounding
+COMMUTATIVE = frozenset(('+', '*', '==', '!='))
+
+# Distinguishes fingerprints of this form from other blake2b hashes; bump it
+# when the canonical form changes so that persisted keys are not reused
+_PERSON = b'calculator-v1'
+
+
+def canonicalize(node: Node) -> Node:
+    """
+    Rewrite a tree into the canonical form of the expressions equivalent to it.
+
+    Parsing already removes whitespace and case differences and resolves
+    constants. This puts the operands of every commutative operation in a
+    fixed order, so ``2*x + 1`` and ``1 + x*2`` have the same canonical form.
+    Grouping is kept: ``(a + b) + c`` and ``a + (b + c)`` round differently
+    for floats and stay distinct.
+
+    Args:
+        node: The root of the expression tree
+
+    Returns:
+        The canonical tree; ``node`` itself is left unchanged
+
+    Example:
+        >>> str(canonicalize(Calculator().parse("1 + x*2")))
+        '((2 * x) + 1)'
+    """
+    return _canonicalize(node)[0]
+
+
+def canonical_form(node: Node) -> str:
+    """
+    Get the text of the canonical form of a tree.
+
+    Args:
+        node: The root of the expression tree
+
+    Returns:
+        The fully parenthesized canonical expression
+    """
+    return _canonicalize(node)[1]
+
+
+def fingerprint(node: Node) -> int:
+    """
+    Get a 64-bit fingerprint of the canonical form of a tree.
+
+    The fingerprint is a keyed BLAKE2b hash rather than ``hash()``, so it is
+    the same in every process and run and can key caches on disk or shared
+    between workers. Functions are identified by name.
+
+    Args:
+        node: The root of the expression tree
+
+    Returns:
+        An unsigned 64-bit integer
+
+    Example:
+        >>> calc = Calculator()
+        >>> fingerprint(calc.parse("x*2 + 1")) == fingerprint(calc.parse("1 + 2X"))
+        True
+    """
+    digest = blake2b(canonical_form(node).encode(), digest_size=8, person=_PERSON)
+    return int.from_bytes(digest.digest(), 'big')
+
+
+def _canonicalize(root: Node) -> Tuple[Node, str]:
+    """Get the canonical tree and its text, building both bottom-up without recursion."""
+    results: Dict[int, Tuple[Node, str]] = {}
+    stack = [(root, False)]
+    while stack:
+        node, ready = stack.pop()
+        if id(node) in results:
+            continue
+        children = node.children()
+        if children and not ready:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(children))
+            continue
+        parts = [results[id(child)] for child in children]
+        if isinstance(node, UnaryOp):
+            operand, text = parts[0]
+            result = UnaryOp(node.op, operand), f"({node.op}{text})"
+        elif isinstance(node, BinaryOp):
+            (left, left_text), (right, right_text) = parts
+            if node.op in COMMUTATIVE and right_text < left_text:
+                left, right = right, left
+                left_text, right_text = right_text, left_text
+            result = BinaryOp(node.op, left, right), f"({left_text} {node.op} {right_text})"
+        elif isinstance(node, Call):
+            text = f"{node.name}({', '.join(arg_text for _, arg_text in parts)})"
+            result = Call(node.name, node.func, tuple(arg for arg, _ in parts), node.pure), text
+        elif isinstance(node, Conditional):
+            text = f"if({', '.join(text for _, text in parts)})"
+            result = Conditional(*(child for child, _ in parts)), text
+        elif isinstance(node, Script):
+            statements = tuple((index, statement) for (index, _), (statement, _)
+                               in zip(node.statements, parts))
+            text = '; '.join(text if index is None else f"{node.names[index]} = {text}"
+                             for (index, _), (_, text) in zip(node.statements, parts))
+            result = Script(statements, node.names, node.free), text
+        else:
+            result = node, str(node)
+        results[id(node)] = result
+    return results[id(root)]
@@ -0,0 +1,362 @@
+"""Code generation specializing expression trees into plain Python functions."""
+
+import math
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+from .errors import ExpressionSyntaxError
+from .functions import UserFunction
+from .nodes import (
+    BinaryOp, Call, Conditional, Local, Node, Number, Script, UnaryOp, Variable, references
+)
+
+
+# Deepest subtree rendered as one nested Python expression; the Python
+# compiler refuses about 200 nested parentheses and recurses on nesting
+MAX_NESTING = 64
+
+# Largest ints written into the source as literals; larger ones are bound,
+# since converting them to decimal text is slow or refused beyond 4300 digits
+_LITERAL_BITS = 64
+
+
+class _Generator:
+    """Renders a tree as Python source, collecting the closure bindings it needs."""
+
+    def __init__(self, functions: Optional[Mapping[str, Callable[..., Any]]] = None,
+                 select: Optional[Callable[..., Any]] = None):
+        # Replacements for the functions referenced by Call nodes, by name
+        self.functions = functions or {}
+        # Evaluates conditionals over arrays; plain conditional expressions if None
+        self.select = select
+        # Closure name -> bound value (functions and non-literal constants)
+        self.bindings: Dict[str, Any] = {}
+        self._bound_ids: Dict[Tuple[str, int], str] = {}
+        # Variable name -> parameter name, in order of first appearance
+        self.parameters: Dict[str, str] = {}
+        # Reference counts of the nodes, and the local caching each shared
+        # node of the current statement once computed
+        self.references: Dict[int, int] = {}
+        self.temporaries: Dict[int, str] = {}
+        self._temporary_count = 0
+        # Names read by each conditional branch being rendered, innermost last
+        self._reads: List[Set[str]] = []
+        # Nesting depth of every node
+        self.depths: Dict[int, int] = {}
+
+    def bind(self, prefix: str, value: Any) -> str:
+        """Get the closure local holding ``value``."""
+        key = (prefix, id(value))
+        name = self._bound_ids.get(key)
+        if name is None:
+            name = f"_{prefix}{len(self._bound_ids)}"
+            self._bound_ids[key] = name
+            self.bindings[name] = value
+        return name
+
+    def expression(self, node: Node) -> str:
+        """
+        Render ``node`` as a fully parenthesized Python expression.
+
+        A node referenced several times is assigned to a local with ``:=``
+        where it is first evaluated and read from it afterwards, which keeps
+        the evaluation order of the tree.
+        """
+        if self.references.get(id(node), 1) == 1 or not node.children():
+            return self._render(node)
+        name = self.temporaries.get(id(node))
+        if name is None:
+            text = self._render(node)
+            name = self.temporaries[id(node)] = f"_t{self._temporary_count}"
+            self._temporary_count += 1
+            return f"({name} := {text})"
+        self._read(name)
+        return name
+
+    def _render(self, node: Node) -> str:
+        """Render a node without looking up shared subexpressions."""
+        if isinstance(node, Number):
+            value = node.value
+            if ((type(value) is int and value.bit_length() <= _LITERAL_BITS)
+                    or (type(value) is float and math.isfinite(value))):
+                return f"({value!r})"
+            return self.bind('k', value)
+        if isinstance(node, Variable):
+            parameter = self.parameters.get(node.name)
+            if parameter is None:
+                parameter = self.parameters[node.name] = f"v{len(self.parameters)}"
+            self._read(parameter)
+            return parameter
+        if isinstance(node, Local):
+            self._read(f"s{node.index}")
+            return f"s{node.index}"
+        if isinstance(node, UnaryOp):
+            return f"({node.op}{self.expression(node.operand)})"
+        if isinstance(node, BinaryOp):
+            return f"({self.expression(node.left)} {node.op} {self.expression(node.right)})"
+        if isinstance(node, Call):
+            return self._call(node, [self.expression(arg) for arg in node.args])
+        if isinstance(node, Conditional):
+            return self._conditional(node, self.expression(node.condition))
+        raise TypeError(f"Cannot generate code for {type(node).__name__}.")
+
+    def _call(self, node: Call, args: List[str]) -> str:
+        """Render a call with rendered arguments."""
+        func = self.functions.get(node.name, node.func)
+        if isinstance(func, UserFunction):
+            # Call the compiled body directly rather than through the wrapper
+            func = func.function
+        return f"{self.bind('f', func)}({', '.join(args)})"
+
+    def _conditional(self, node: Conditional, condition: str) -> str:
+        """Render a conditional with a rendered condition."""
+        then, then_reads = self._branch(node.then)
+        otherwise, otherwise_reads = self._branch(node.otherwise)
+        if self.select is None:
+            return f"({then} if {condition} else {otherwise})"
+        # Each branch is a lambda over the values it reads, so that the
+        # select function can pass it the selected elements only
+        names = sorted(then_reads | otherwise_reads)
+        parameters = ', '.join(names)
+        args = ''.join(f", {name}" for name in names)
+        return (f"{self.bind('c', self.select)}({condition}, (lambda {parameters}: {then}), "
+                f"(lambda {parameters}: {otherwise}){args})")
+
+    def statement(self, root: Node, lines: List[str]) -> str:
+        """
+        Render a statement, splitting it when it is nested too deeply.
+
+        Subtrees at most :data:`MAX_NESTING` deep are rendered as nested
+        expressions. The operations above them, and their operands, are
+        computed one per line into locals, in evaluation order and without
+        recursion. Branches of
+        conditionals are only evaluated when selected, so they cannot be
+        split and must be shallow enough.
+
+        Args:
+            root: The statement's tree
+            lines: The function body; the lines computing the locals are appended
+
+        Returns:
+            The expression giving the statement's value
+
+        Raises:
+            ExpressionSyntaxError: If a branch of a conditional is nested too deeply
+        """
+        depths = self.depths
+        if depths[id(root)] <= MAX_NESTING:
+            return self.expression(root)
+        values: List[str] = []
+        stack: List[Any] = [root]
+        while stack:
+            item = stack.pop()
+            if type(item) is tuple:
+                node = item[1]
+                if isinstance(node, Conditional):
+                    for branch in (node.then, node.otherwise):
+                        if depths[id(branch)] > MAX_NESTING:
+                            raise ExpressionSyntaxError("Expression too deeply nested")
+                    text = self._conditional(node, values.pop())
+                else:
+                    count = len(node.children())
+                    args = values[len(values) - count:]
+                    del values[len(values) - count:]
+                    if isinstance(node, UnaryOp):
+                        text = f"({node.op}{args[0]})"
+                    elif isinstance(node, BinaryOp):
+                        text = f"({args[0]} {node.op} {args[1]})"
+                    else:
+                        text = self._call(node, args)
+                name = f"_t{self._temporary_count}"
+                self._temporary_count += 1
+                lines.append(f"{name} = {text}")
+                if self.references.get(id(node), 1) > 1:
+                    self.temporaries[id(node)] = name
+                values.append(name)
+                continue
+            node = item
+            name = self.temporaries.get(id(node))
+            if name is not None:
+                values.append(name)
+            elif not node.children():
+                values.append(self._render(node))
+            elif depths[id(node)] <= MAX_NESTING:
+                # Computed on its own line, so that it runs before the operands after it
+                name = f"_t{self._temporary_count}"
+                self._temporary_count += 1
+                lines.append(f"{name} = {self.expression(node)}")
+                values.append(name)
+            elif isinstance(node, Conditional):
+                stack += ((None, node), node.condition)
+            else:
+                stack.append((None, node))
+                stack.extend(reversed(node.children()))
+        return values[-1]
+
+    def _branch(self, node: Node) -> Tuple[str, Set[str]]:
+        """
+        Render a branch of a conditional, which is only evaluated when selected.
+
+        Temporaries first assigned inside the branch are forgotten afterwards,
+        since later code cannot rely on the branch having run.
+
+        Returns:
+            Tuple of (source, names read from outside the branch)
+        """
+        temporaries = dict(self.temporaries)
+        self._reads.append(set())
+        text = self.expression(node)
+        reads = self._reads.pop()
+        reads.difference_update(name for key, name in self.temporaries.items()
+                                if key not in temporaries)
+        self.temporaries = temporaries
+        if self._reads:
+            self._reads[-1].update(reads)
+        return text, reads
+
+    def _read(self, name: str):
+        """Record that the branch being rendered reads a local."""
+        if self._reads:
+            self._reads[-1].add(name)
+
+    def body(self, node: Node, all_values: bool = False) -> List[str]:
+        """Render the statements of the generated function."""
+        self.references = references(node)
+        self.depths = _depths(node)
+        lines: List[str] = []
+        if not isinstance(node, Script):
+            value = self.statement(node, lines)
+            lines.append(f"return [{value}]" if all_values else f"return {value}")
+            return lines
+        # Free script variables are parameters named after their slot
+        for name, index in node.free:
+            self.parameters[name] = f"s{index}"
+        results = []
+        for position, (index, statement) in enumerate(node.statements):
+            # Statements do not share subexpressions, as locals change between them
+            self.temporaries.clear()
+            value = self.statement(statement, lines)
+            last = position == len(node.statements) - 1
+            if all_values:
+                # Slots may be reassigned, so every value gets its own local
+                target = f"_r{position}" if index is None else f"s{index} = _r{position}"
+                lines.append(f"{target} = {value}")
+                results.append(f"_r{position}")
+            elif index is not None:
+                lines.append(f"s{index} = {value}")
+                if last:
+                    lines.append(f"return s{index}")
+            else:
+                lines.append(f"return {value}" if last else value)
+        if all_values:
+            lines.append(f"return [{', '.join(results)}]")
+        return lines
+
+
+def _depths(root: Node) -> Dict[int, int]:
+    """Get the nesting depth of every node of a tree, without recursion; leaves are 1 deep."""
+    depths: Dict[int, int] = {}
+    stack = [(root, False)]
+    while stack:
+        node, ready = stack.pop()
+        if id(node) in depths:
+            continue
+        children = node.children()
+        if ready or not children:
+            depths[id(node)] = 1 + max((depths[id(child)] for child in children), default=0)
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in children)
+    return depths
+
+
+def generate(
+    node: Node,
+    functions: Optional[Mapping[str, Callable[..., Any]]] = None,
+    all_values: bool = False,
+    parameters: Optional[Sequence[str]] = None,
+    select: Optional[Callable[..., Any]] = None,
+) -> Tuple[str, Dict[str, Any], Tuple[str, ...]]:
+    """
+    Generate the source of a factory returning the specialized function.
+
+    Functions and constants without a literal spelling become parameters of
+    the factory, so the generated function reads them as closure cells
+    instead of looking them up in a dictionary on every call.
+
+    Args:
+        node: The root of the expression tree
+        functions: Implementations to use instead of the called functions,
+            by name (e.g. NumPy ufuncs)
+        all_values: Return the list of every statement value of a script
+            instead of the last one
+        parameters: Variable names in parameter order, instead of their
+            order of first appearance
+        select: Function evaluating conditionals, called as
+            ``select(condition, then, otherwise, *values)`` where the branches
+            are functions of the values they read (e.g. masked NumPy
+            evaluation); conditionals are plain ``a if c else b`` if None
+
+    Returns:
+        Tuple of (source, bindings for the factory, variable names in
+        parameter order)
+    """
+    generator = _Generator(functions, select)
+    for name in parameters or ():
+        generator.parameters[name] = f"v{len(generator.parameters)}"
+    body = ''.join(f"        {line}\n" for line in generator.body(node, all_values))
+    bound = ', '.join(generator.bindings)
+    signature = ', '.join(generator.parameters.values())
+    source = (
+        f"def _factory({bound}):\n"
+        f"    def expression({signature}):\n"
+        f"{body}"
+        f"    return expression\n"
+    )
+    return source, generator.bindings, tuple(generator.parameters)
+
+
+def specialize(
+    node: Node,
+    functions: Optional[Mapping[str, Callable[..., Any]]] = None,
+    all_values: bool = False,
+    parameters: Optional[Sequence[str]] = None,
+    select: Optional[Callable[..., Any]] = None,
+) -> Callable[..., Any]:
+    """
+    Compile an expression tree into a plain Python function.
+
+    The function takes the expression's variables as positional arguments in
+    order of first appearance; they are also available as its ``variables``
+    attribute, and the generated code as ``source``. Scripts compile to a
+    single function whose slots are Python locals.
+
+    Args:
+        node: The root of the expression tree
+        functions: Implementations to use instead of the called functions,
+            by name
+        all_values: Return the list of every statement value of a script
+        parameters: Variable names in parameter order
+        select: Function evaluating conditionals, see :func:`generate`
+
+    Returns:
+        The specialized function
+
+    Example:
+        >>> f = specialize(Calculator().parse("sqrt(x^2 + y^2)"))
+        >>> f.variables
+        ('x', 'y')
+        >>> f(3, 4)
+        5.0
+    """
+    source, bindings, variables = generate(node, functions, all_values, parameters, select)
+    namespace: Dict[str, Any] = {'__builtins__': {}}
+    try:
+        code = compile(source, '<calculator>', 'exec')
+    except (SyntaxError, RecursionError, MemoryError):
+        # Too many nested parentheses or too deep for the Python compiler
+        raise ExpressionSyntaxError("Expression too deeply nested") from None
+    exec(code, namespace)
+    function = namespace['_factory'](**bindings)
+    function.variables = variables
+    function.source = source
+    return function
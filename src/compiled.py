@@ -0,0 +1,243 @@
+"""Reusable compiled expressions with free variables."""
+
+from operator import itemgetter
+from typing import Any, Iterable, List, Mapping, Optional, Tuple
+
+from .codegen import specialize
+from .nodes import Node
+from .optimizer import shared_nodes
+from .vectorized import (
+    DEFAULT_BLOCK_SIZE, HAS_NUMPY, BlockedKernel, evaluate_arrays, evaluate_scalar,
+    use_blocked, vectorize
+)
+
+
+class CompiledExpression:
+    """
+    An expression parsed and compiled once, evaluated many times.
+
+    Free names in the expression are variables bound at evaluation time,
+    either as keyword arguments or from mappings.
+
+    Example:
+        >>> area = Calculator().compile("pi * r^2")
+        >>> area.variables
+        ('r',)
+        >>> area(r=2)
+        12.566370614359172
+        >>> area.evaluate_many([{'r': 1}, {'r': 2}])
+        [3.141592653589793, 12.566370614359172]
+    """
+
+    __slots__ = ('expression', 'tree', 'variables', '_function', '_getter', '_vectorized',
+                 '_kernel', '_all_values')
+
+    def __init__(self, expression: str, tree: Node):
+        """
+        Initialize the compiled expression.
+
+        Args:
+            expression: The source expression
+            tree: The parsed expression tree
+        """
+        self.expression = expression
+        self.tree = tree
+        self._function = specialize(tree)
+        self.variables: Tuple[str, ...] = self._function.variables
+        self._getter = itemgetter(*self.variables) if self.variables else None
+        self._vectorized: Optional[Any] = None
+        self._kernel: Optional[BlockedKernel] = None
+        self._all_values: Optional[Any] = None
+
+    @property
+    def shared(self) -> int:
+        """Number of common subexpressions computed once per evaluation and reused."""
+        return shared_nodes(self.tree)
+
+    def __repr__(self) -> str:
+        return f"CompiledExpression({self.expression!r}, variables={self.variables!r})"
+
+    def __call__(self, **bindings: Any) -> Any:
+        """
+        Evaluate the expression with variables bound by keyword.
+
+        Returns:
+            The value of the expression
+        """
+        return self.evaluate(bindings)
+
+    def evaluate(self, bindings: Optional[Mapping[str, Any]] = None) -> Any:
+        """
+        Evaluate the expression for one set of variable bindings.
+
+        Args:
+            bindings: Mapping of variable names to values; extra names are ignored
+
+        Returns:
+            The value of the expression
+
+        Raises:
+            NameError: If a variable is not bound
+        """
+        if bindings is None:
+            bindings = {}
+        try:
+            args = [bindings[name] for name in self.variables]
+        except KeyError as e:
+            raise NameError(f"name '{e.args[0]}' is not defined") from None
+        return self._function(*args)
+
+    def evaluate_all(self, bindings: Optional[Mapping[str, Any]] = None) -> List[Any]:
+        """
+        Evaluate a script and return the value of every statement.
+
+        A plain expression is a script of one statement.
+
+        Args:
+            bindings: Mapping of variable names to values
+
+        Returns:
+            The statement values, in order
+
+        Raises:
+            NameError: If a variable is not bound
+
+        Example:
+            >>> script = Calculator().compile("a = x + 1; b = a^2; b - a")
+            >>> script.evaluate_all({'x': 2})
+            [3, 9, 6]
+        """
+        if bindings is None:
+            bindings = {}
+        try:
+            args = [bindings[name] for name in self.variables]
+        except KeyError as e:
+            raise NameError(f"name '{e.args[0]}' is not defined") from None
+        if self._all_values is None:
+            self._all_values = specialize(self.tree, all_values=True)
+        return self._all_values(*args)
+
+    def evaluate_many(self, bindings: Iterable[Mapping[str, Any]]) -> List[Any]:
+        """
+        Evaluate the expression once per set of variable bindings.
+
+        Only the numeric work is repeated; the expression is not reparsed.
+
+        Args:
+            bindings: Iterable of mappings of variable names to values
+
+        Returns:
+            The values, in the order of ``bindings``
+
+        Raises:
+            NameError: If a variable is not bound in one of the mappings
+        """
+        function = self._function
+        getter = self._getter
+        if getter is None:
+            return [function() for _ in bindings]
+        rows = bindings if isinstance(bindings, list) else list(bindings)
+        try:
+            if len(self.variables) == 1:
+                return [function(getter(row)) for row in rows]
+            return [function(*getter(row)) for row in rows]
+        except KeyError:
+            for row in rows:
+                missing = self._unbound(row)
+                if missing:
+                    raise NameError(f"name '{missing}' is not defined") from None
+            raise
+
+    def evaluate_array(self, bindings: Optional[Mapping[str, Any]] = None, **arrays: Any) -> Any:
+        """
+        Evaluate the expression over whole arrays of variable values in one call.
+
+        With NumPy installed every function runs as a ufunc over the full
+        arrays (float64, NumPy error semantics: NaN/inf instead of exceptions);
+        1-D inputs longer than one block go through the memory-bounded
+        blocked kernel (see :meth:`evaluate_blocked`). Without NumPy the
+        scalar path is applied row by row.
+
+        Args:
+            bindings: Mapping of variable names to arrays or scalars
+            **arrays: Further variable bindings by keyword
+
+        Returns:
+            A NumPy array of results, or a list when NumPy is absent
+
+        Raises:
+            NameError: If a variable is not bound
+
+        Example:
+            >>> area = Calculator().compile("pi * r^2")
+            >>> area.evaluate_array(r=numpy.arange(1_000_000))
+        """
+        if bindings:
+            arrays = {**bindings, **arrays}
+        try:
+            columns = [arrays[name] for name in self.variables]
+        except KeyError as e:
+            raise NameError(f"name '{e.args[0]}' is not defined") from None
+
+        if use_blocked(columns):
+            return self._blocked(columns, None, DEFAULT_BLOCK_SIZE)
+        if HAS_NUMPY and self._vectorized is None:
+            self._vectorized = vectorize(self.tree)
+        return evaluate_arrays(self._vectorized, self._function, columns)
+
+    def evaluate_blocked(
+        self,
+        bindings: Mapping[str, Any],
+        out: Optional[Any] = None,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+    ) -> Any:
+        """
+        Evaluate over long 1-D arrays in cache-sized blocks with bounded memory.
+
+        Scratch buffers of ``block_size`` elements are allocated once and
+        reused through ufunc ``out=`` arguments, so peak memory does not grow
+        with the input length. Inputs may be ``numpy.memmap`` arrays, and
+        passing a memmap as ``out`` streams results to disk as well.
+
+        Args:
+            bindings: Mapping of variable names to 1-D arrays or scalars
+            out: Optional preallocated float64 output array
+            block_size: Number of elements processed per block
+
+        Returns:
+            The output array (a list when NumPy is absent and ``out`` is None)
+
+        Raises:
+            NameError: If a variable is not bound
+
+        Example:
+            >>> x = numpy.memmap("x.f64", dtype=float, mode="r")
+            >>> y = numpy.memmap("y.f64", dtype=float, mode="w+", shape=x.shape)
+            >>> Calculator().compile("sqrt(x) * 2").evaluate_blocked({'x': x}, out=y)
+        """
+        try:
+            columns = [bindings[name] for name in self.variables]
+        except KeyError as e:
+            raise NameError(f"name '{e.args[0]}' is not defined") from None
+        return self._blocked(columns, out, block_size)
+
+    def _blocked(self, columns: List[Any], out: Optional[Any], block_size: int) -> Any:
+        """Run the blocked kernel, or the scalar path without NumPy."""
+        if not HAS_NUMPY:
+            results = evaluate_scalar(self._function, columns)
+            if out is None:
+                return results
+            out[:] = results
+            return out
+        kernel = self._kernel
+        if kernel is None or kernel.block_size != block_size:
+            kernel = self._kernel = BlockedKernel(self.tree, block_size=block_size)
+        by_name = dict(zip(self.variables, columns))
+        return kernel([by_name[name] for name in kernel.variables], out)
+
+    def _unbound(self, bindings: Mapping[str, Any]) -> Optional[str]:
+        """Get the first variable missing from ``bindings``, if any."""
+        for name in self.variables:
+            if name not in bindings:
+                return name
+        return None
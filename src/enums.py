@@ -12,3 +12,11 @@ class OperationType(Enum):
     POWER = "power"
     STATISTICAL = "statistical"
     HYPERBOLIC = "hyperbolic"
+
+
+class EvictionPolicy(Enum):
+    """Enumeration for the eviction strategies of the expression cache."""
+    
+    LRU = "lru"
+    LFU = "lfu"
+    TTL = "ttl"
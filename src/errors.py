@@ -0,0 +1,47 @@
+"""Exceptions raised while processing expressions."""
+
+from typing import Any, Optional
+
+
+class ExpressionSyntaxError(SyntaxError):
+    """
+    Raised when an expression cannot be tokenized or parsed.
+
+    Attributes:
+        position: Zero-based offset of the offending character, if known
+    """
+
+    def __init__(self, message: str, position: Optional[int] = None):
+        if position is not None:
+            message = f"{message} at position {position}"
+        super().__init__(message)
+        self.position = position
+
+
+class BudgetError(Exception):
+    """Raised when a budget cannot be enforced, e.g. when no sandbox worker can be started."""
+
+
+class BudgetExceeded(BudgetError):
+    """
+    Raised when evaluating an expression would exceed its resource budget.
+
+    Attributes:
+        resource: The exhausted resource: ``'time'``, ``'bits'`` or ``'memory'``
+        limit: The limit of that resource, in seconds, bits or bytes
+        detail: What exceeded it
+    """
+
+    def __init__(self, resource: str, limit: Any, detail: str = ""):
+        super().__init__(resource, limit, detail)
+        self.resource = resource
+        self.limit = limit
+        self.detail = detail
+
+    def __str__(self) -> str:
+        message = f"{self.resource} limit of {self.limit} exceeded"
+        return f"{message}: {self.detail}" if self.detail else message
+
+
+class EvaluationCancelled(Exception):
+    """Raised when an evaluation is cancelled before it completes."""
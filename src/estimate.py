@@ -0,0 +1,384 @@
+"""Static estimates of the size and work of evaluating an expression."""
+
+import math
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from .functions import UserFunction
+from .nodes import COMPARISONS, BinaryOp, Call, Conditional, Local, Node, Number, Script, Variable
+from .optimizer import OPERATOR_COSTS
+from .registry import describe
+
+
+# Every finite float is below 2**1024; larger float results raise OverflowError
+FLOAT_BITS = 1024.0
+
+# Bound assumed for variables, whose values are unknown before evaluation
+VARIABLE_BITS = FLOAT_BITS
+
+# Estimates beyond either limit are flagged as enormous: a result of more
+# than about 315,000 decimal digits, or about a second of big-integer work
+ENORMOUS_BITS = float(1 << 20)
+ENORMOUS_WORK = 1e9
+
+# Bits per unit of big-integer work, a machine word
+_WORD_BITS = 64
+
+# Exponent of Karatsuba multiplication, used by CPython for large integers
+_KARATSUBA = math.log2(3)
+
+_LOG2_E = math.log2(math.e)
+
+# Bound of a value: (bound of log2 of its magnitude, whether it is an int)
+_Bound = Tuple[float, bool]
+
+# Estimate of a subtree: (nodes, depth, bound of log2 |value|, int, work)
+_Estimate = Tuple[int, int, float, bool, float]
+
+
+def _pow2(bits: float) -> float:
+    """Get ``2**bits``, or infinity when it does not fit in a float."""
+    return 2.0 ** bits if bits < FLOAT_BITS else math.inf
+
+
+def _log_bits(bits: float) -> float:
+    """Bound log2 |log(x)|: large for huge x, and at most 745 for tiny floats."""
+    return max(math.log2(bits) if bits > 1 else 0.0, 10.0)
+
+
+# Bound of log2 |f(x)| given the bound of log2 |x|, for the built-in functions;
+# other functions are assumed to return any float
+_MAGNITUDES: Dict[str, Callable[[float], float]] = {
+    'sin': lambda bits: 0.0,
+    'cos': lambda bits: 0.0,
+    'tanh': lambda bits: 0.0,
+    # The tangent of a float is below 2**54
+    'tan': lambda bits: 54.0,
+    'asin': lambda bits: 2.0,
+    'acos': lambda bits: 2.0,
+    'atan': lambda bits: 2.0,
+    'sinh': lambda bits: _pow2(bits) * _LOG2_E,
+    'cosh': lambda bits: _pow2(bits) * _LOG2_E,
+    'exp': lambda bits: _pow2(bits) * _LOG2_E,
+    'sqrt': lambda bits: bits / 2,
+    'log': _log_bits,
+    'log10': _log_bits,
+    'ln': _log_bits,
+    'abs': lambda bits: bits,
+    'floor': lambda bits: bits,
+    'ceil': lambda bits: bits,
+    'round': lambda bits: bits,
+    'degrees': lambda bits: bits + 6,
+    'radians': lambda bits: bits,
+    # n! <= n**n
+    'factorial': lambda bits: _pow2(bits) * bits,
+    # Residues are below the modulus
+    'factorial_mod': lambda bits: bits,
+    'powmod': lambda bits: bits,
+    # binom(n, k) <= 2**n
+    'binom': _pow2,
+    'gcd': lambda bits: bits,
+    # Per argument
+    'lcm': lambda bits: bits,
+    'prod': lambda bits: bits,
+}
+
+# Functions whose result may grow with the number of arguments
+_PER_ARGUMENT = frozenset(('lcm', 'prod'))
+
+# Functions returning an int, and those returning one for int arguments
+_INTEGER_FUNCTIONS = frozenset((
+    'factorial', 'floor', 'ceil', 'factorial_mod', 'powmod', 'binom', 'gcd', 'lcm'
+))
+_INTEGER_PRESERVING = frozenset(('abs', 'round', 'prod'))
+
+# Marker on the stack of :func:`_estimate`: combine the estimates of the
+# children of a node
+_COMBINE = object()
+
+
+class CostEstimate(NamedTuple):
+    """
+    Static estimate of evaluating an expression, made without evaluating it.
+
+    Attributes:
+        nodes: Number of nodes of the expression tree
+        depth: Nesting depth of the expression tree
+        functions: Number of calls of each function, including the calls
+            made by user functions
+        bits: Upper bound of log2 of the magnitude of the result; infinite
+            when not even that fits in a float
+        work: Upper bound of the work, in arithmetic operations on machine
+            words; infinite when it cannot be bounded
+    """
+
+    nodes: int
+    depth: int
+    functions: Dict[str, int]
+    bits: float
+    work: float
+
+    @property
+    def digits(self) -> float:
+        """Upper bound of the number of decimal digits of the result."""
+        if self.bits == math.inf:
+            return math.inf
+        return math.floor(self.bits * math.log10(2)) + 1
+
+    @property
+    def enormous(self) -> bool:
+        """Whether the result or the work exceed what should be attempted."""
+        return self.bits > ENORMOUS_BITS or self.work > ENORMOUS_WORK
+
+
+def estimate(
+    node: Node,
+    functions: Optional[Mapping[str, Callable[..., Any]]] = None,
+) -> CostEstimate:
+    """
+    Estimate the size of the result and the work of evaluating a tree.
+
+    Magnitudes are propagated bottom-up as bounds of log2 ``|value|``, e.g.
+    ``a * b`` has at most ``bits(a) + bits(b)`` bits and ``a ** b`` at most
+    ``bits(a) * b``. Work on floats counts operations weighted as by
+    :func:`src.optimizer.cost` and function costs from the registry; work
+    on integers grows with their size in machine words, so huge powers and
+    factorials are flagged. Variables are assumed to hold any float.
+
+    The tree should be parsed without constant folding, otherwise the
+    constant subtrees were already evaluated while parsing.
+
+    Args:
+        node: The root of the expression tree
+        functions: Mapping of function names to functions, for their costs
+
+    Returns:
+        The CostEstimate
+
+    Example:
+        >>> tokens = tokenize("factorial(10^6)", {})
+        >>> estimate(parse(tokens, Calculator.FUNCTIONS, fold=False)).enormous
+        True
+    """
+    counts: Dict[str, int] = {}
+    if not isinstance(node, Script):
+        nodes, depth, bits, _, work = _estimate(node, functions, counts, {}, {})
+        return CostEstimate(nodes, depth, counts, bits, work)
+
+    slots: Dict[int, _Bound] = {}
+    nodes = depth = 0
+    bits = work = 0.0
+    for index, statement in node.statements:
+        size, height, bits, integer, cost = _estimate(statement, functions, counts, {}, slots)
+        nodes += size
+        depth = max(depth, height)
+        work += cost
+        if index is not None:
+            slots[index] = (bits, integer)
+    return CostEstimate(nodes, depth, counts, bits, work)
+
+
+def call_bound(name: str, bits: float, integer: bool, arguments: int = 1) -> Tuple[float, bool]:
+    """
+    Bound the result of calling a built-in function.
+
+    Args:
+        name: The function name
+        bits: Bound of log2 of the magnitude of the largest argument
+        integer: Whether every argument is an int
+        arguments: Number of arguments
+
+    Returns:
+        Tuple of (bound of log2 of the magnitude of the result, whether the
+        result is an int); unknown functions are assumed to return any float
+    """
+    rule = _MAGNITUDES.get(name)
+    if rule is None:
+        return FLOAT_BITS, False
+    result = rule(bits)
+    if name in _PER_ARGUMENT:
+        result *= max(arguments, 1)
+    return result, name in _INTEGER_FUNCTIONS or (integer and name in _INTEGER_PRESERVING)
+
+
+def _estimate(
+    node: Node,
+    functions: Optional[Mapping[str, Callable[..., Any]]],
+    counts: Dict[str, int],
+    variables: Dict[str, _Bound],
+    slots: Dict[int, _Bound],
+) -> _Estimate:
+    """Estimate a tree bottom-up without recursion."""
+    results: List[_Estimate] = []
+    stack: List[Any] = [node]
+    while stack:
+        node = stack.pop()
+        if node is _COMBINE:
+            node = stack.pop()
+            start = len(results) - len(node.children())
+            operands = results[start:]
+            del results[start:]
+            results.append(_combine(node, operands, functions, counts))
+            continue
+
+        children = node.children()
+        if children:
+            stack += (node, _COMBINE)
+            stack.extend(reversed(children))
+            continue
+        if isinstance(node, Number):
+            value = node.value
+            bits, integer = _literal(value), isinstance(value, int)
+        elif isinstance(node, Variable):
+            bits, integer = variables.get(node.name, (VARIABLE_BITS, False))
+        elif isinstance(node, Local):
+            bits, integer = slots.get(node.index, (VARIABLE_BITS, False))
+        elif isinstance(node, Call):
+            # A call without arguments
+            results.append(_combine(node, [], functions, counts))
+            continue
+        else:
+            bits, integer = VARIABLE_BITS, False
+        results.append((1, 1, bits, integer, 0.0))
+    return results[-1]
+
+
+def _combine(
+    node: Node,
+    operands: List[_Estimate],
+    functions: Optional[Mapping[str, Callable[..., Any]]],
+    counts: Dict[str, int],
+) -> _Estimate:
+    """Estimate a node from the estimates of its children."""
+    nodes = 1 + sum(operand[0] for operand in operands)
+    depth = 1 + max((operand[1] for operand in operands), default=0)
+    work = sum(operand[4] for operand in operands)
+
+    if isinstance(node, BinaryOp):
+        (_, _, left, left_int, _), (_, _, right, right_int, _) = operands
+        bits, integer, cost = _binary(node, left, left_int, right, right_int)
+    elif isinstance(node, Conditional):
+        condition, then, otherwise = operands
+        bits = max(then[2], otherwise[2])
+        integer = then[3] and otherwise[3]
+        # Only one branch is evaluated
+        work = condition[4] + max(then[4], otherwise[4])
+        cost = 0.0
+    elif isinstance(node, Call):
+        bits, integer, cost = _call(node, operands, functions, counts)
+    else:
+        # Prefix operators keep the magnitude and the type
+        _, _, bits, integer, _ = operands[0]
+        cost = _words(bits) if integer else 1.0
+
+    if not integer:
+        bits = min(bits, FLOAT_BITS)
+    return nodes, depth, bits, integer, work + cost
+
+
+def _binary(
+    node: BinaryOp,
+    left: float,
+    left_int: bool,
+    right: float,
+    right_int: bool,
+) -> Tuple[float, bool, float]:
+    """Bound the result of a binary operation, and the work of applying it."""
+    op = node.op
+    integer = left_int and right_int
+    if op in COMPARISONS:
+        return 0.0, True, _words(max(left, right)) if integer else 1.0
+    if op in ('+', '-'):
+        bits = max(left, right) + 1
+        return bits, integer, _words(bits) if integer else 1.0
+    if op == '*':
+        bits = left + right
+    elif op == '%':
+        bits = right
+    elif op in ('/', '//'):
+        # Dividing by a magnitude of at least one does not grow the dividend
+        divisor = node.right
+        at_least_one = right_int or (type(divisor) is Number and abs(divisor.value) >= 1)
+        bits = left if at_least_one else FLOAT_BITS
+        integer = integer and op == '//'
+    else:
+        exponent = node.right
+        known = type(exponent) is Number
+        power = _exponent(exponent.value) if known else _pow2(right)
+        if left == 0:
+            # A float below one raised to a negative power can be any float
+            bits = 0.0 if integer or known else FLOAT_BITS
+        else:
+            bits = left * power if power else 0.0
+        if not integer:
+            return bits, False, OPERATOR_COSTS['**']
+        # Squaring up to the size of the result dominates
+        return bits, True, _multiply(bits, bits)
+    if integer:
+        return bits, True, _multiply(left, right)
+    return bits, False, OPERATOR_COSTS.get(op, 1)
+
+
+def _exponent(value: Any) -> float:
+    """Get a literal exponent as a float, infinite when it is too large for one."""
+    if isinstance(value, complex):
+        value = abs(value)
+    try:
+        return max(float(value), 0.0)
+    except OverflowError:
+        return math.inf if value > 0 else 0.0
+
+
+def _call(
+    node: Call,
+    operands: List[_Estimate],
+    functions: Optional[Mapping[str, Callable[..., Any]]],
+    counts: Dict[str, int],
+) -> Tuple[float, bool, float]:
+    """Bound the result of a function call, and the work of the call itself."""
+    name = node.name
+    counts[name] = counts.get(name, 0) + 1
+    func = node.func
+    if isinstance(func, UserFunction):
+        # Estimate the body with the parameters bound to the arguments
+        variables = {parameter: (operand[2], operand[3])
+                     for parameter, operand in zip(func.parameters, operands)}
+        _, _, bits, integer, work = _estimate(func.body, functions, counts, variables, {})
+        return bits, integer, work
+
+    bits, integer = call_bound(name, max((operand[2] for operand in operands), default=0.0),
+                               all(operand[3] for operand in operands), len(operands))
+    cost = 1
+    if functions is not None:
+        try:
+            cost = describe(functions, name).cost
+        except KeyError:
+            pass
+    if integer and bits > _WORD_BITS:
+        # Big results are built by multiplications up to their own size
+        return bits, True, cost * _multiply(bits, bits)
+    return bits, integer, cost
+
+
+def _literal(value: Any) -> float:
+    """Bound log2 |value| of a number from above, exactly rather than rounded."""
+    magnitude = abs(value)
+    if magnitude <= 1:
+        return 0.0
+    if isinstance(magnitude, int):
+        return float((magnitude - 1).bit_length())
+    if magnitude == math.inf:
+        return math.inf
+    return float(math.frexp(magnitude)[1])
+
+
+def _words(bits: float) -> float:
+    """Get the number of machine words holding an integer of ``bits`` bits."""
+    return max(1.0, bits / _WORD_BITS)
+
+
+def _multiply(left: float, right: float) -> float:
+    """Estimate the work of multiplying integers of the given sizes."""
+    small, large = sorted((_words(left), _words(right)))
+    if large == math.inf:
+        return math.inf
+    return large * small ** (_KARATSUBA - 1)
@@ -0,0 +1,131 @@
+"""User-defined functions such as ``hyp(a, b) = sqrt(a^2 + b^2)``."""
+
+from typing import AbstractSet, Any, Callable, Dict, Optional, Set, Tuple
+
+from .nodes import Call, Conditional, Local, Node, Number, Variable, walk
+from .optimizer import optimize
+
+
+# User functions whose body has at most this many nodes are inlined into the
+# expressions calling them instead of being called
+INLINE_LIMIT = 32
+
+# Argument nodes cheap enough to duplicate when a parameter is used twice
+_TRIVIAL = (Number, Variable, Local)
+
+
+class UserFunction:
+    """
+    A function defined by an expression over its parameters.
+
+    The body is compiled into a specialized Python function the first time
+    the function is called. Small bodies are also substituted into calling
+    expressions while parsing, so that compiled programs do not pay for a
+    call frame.
+
+    Example:
+        >>> hyp = Calculator().define("hyp(a, b) = sqrt(a^2 + b^2)")
+        >>> hyp.parameters
+        ('a', 'b')
+        >>> hyp(3, 4)
+        5.0
+    """
+
+    __slots__ = ('name', 'parameters', 'body', 'size', 'uses', 'strict', 'optimize', 'algebraic',
+                 'source', 'calls', '_function')
+
+    def __init__(self, name: str, parameters: Tuple[str, ...], body: Node,
+                 optimize: bool = False, algebraic: bool = False,
+                 source: Optional[str] = None, calls: AbstractSet[str] = frozenset()):
+        """
+        Initialize the function.
+
+        Args:
+            name: The function name
+            parameters: Parameter names, in call order
+            body: The expression tree of the body, reading parameters as variables
+            optimize: If True, the compiled body is optimized; inlined copies
+                are optimized with the expression calling the function
+            algebraic: If True, the optimized body is also rewritten by the
+                algebraic passes of :func:`src.optimizer.optimize`
+            source: The definition the function was parsed from
+            calls: Names of the user functions the definition calls, which
+                the body has captured
+        """
+        self.name = name
+        self.parameters = parameters
+        self.body = body
+        self.optimize = optimize
+        self.algebraic = algebraic
+        self.source = source
+        self.calls = frozenset(calls)
+        # Number of nodes in the body, of times each parameter is read, and
+        # the parameters read whichever branches of conditionals are taken
+        self.size = 0
+        self.uses: Dict[str, int] = dict.fromkeys(parameters, 0)
+        self.strict: Set[str] = set()
+        stack = [(body, False)]
+        while stack:
+            node, lazy = stack.pop()
+            self.size += 1
+            if isinstance(node, Variable):
+                self.uses[node.name] += 1
+                if not lazy:
+                    self.strict.add(node.name)
+            elif isinstance(node, Conditional):
+                stack.extend(((node.condition, lazy), (node.then, True), (node.otherwise, True)))
+            else:
+                stack.extend((child, lazy) for child in node.children())
+        self._function: Optional[Callable[..., Any]] = None
+
+    @property
+    def function(self) -> Callable[..., Any]:
+        """The specialized Python function computing the body."""
+        if self._function is None:
+            from .codegen import specialize
+            body = optimize(self.body, self.algebraic) if self.optimize else self.body
+            self._function = specialize(body, parameters=self.parameters)
+        return self._function
+
+    @property
+    def pure(self) -> bool:
+        """True if the body only calls pure functions."""
+        return all(node.pure for node in walk(self.body) if isinstance(node, Call))
+
+    def can_inline(self, args: Tuple[Node, ...]) -> bool:
+        """
+        Check whether a call with the given arguments should be inlined.
+
+        A call evaluates every argument, so the argument of an unused
+        parameter is only dropped when it is a number, and the argument of a
+        parameter read only in a branch of a conditional is only moved there
+        when it is trivial; otherwise errors such as that of ``h(1/0)`` would
+        disappear. Arguments used more than once by the body are likewise
+        only duplicated when they are trivial to evaluate.
+
+        Args:
+            args: The argument nodes of the call
+
+        Returns:
+            True when the body is small and inlining duplicates and skips no work
+        """
+        if self.size > INLINE_LIMIT:
+            return False
+        for name, arg in zip(self.parameters, args):
+            if isinstance(arg, Number):
+                continue
+            if not self.uses[name]:
+                return False
+            if ((self.uses[name] > 1 or name not in self.strict)
+                    and not isinstance(arg, _TRIVIAL)):
+                return False
+        return True
+
+    def __call__(self, *args: Any) -> Any:
+        return self.function(*args)
+
+    def __repr__(self) -> str:
+        return f"UserFunction({str(self)!r})"
+
+    def __str__(self) -> str:
+        return f"{self.name}({', '.join(self.parameters)}) = {self.body}"
@@ -0,0 +1,281 @@
+"""Exact integer functions that never build huge intermediate values."""
+
+import decimal
+import math
+from decimal import Decimal
+from typing import Any, Dict, Sequence
+
+# Numbers multiplied at a time by factorial_mod before reducing; their
+# product stays a few machine words long
+_CHUNK = 64
+
+# Bit length up to which ints are converted to decimal text by str(); str()
+# is quadratic and refuses more than 4300 digits on recent Pythons
+_STR_BITS = 8192
+
+# Bit length of the pieces converted directly while splitting an int
+_PIECE_BITS = 128
+
+
+def powmod(base: Any, exponent: Any, modulus: Any) -> int:
+    """
+    Compute ``base^exponent mod modulus`` by square-and-multiply.
+
+    Every intermediate value is reduced, so ``powmod(2, 10^18, p)`` takes
+    about 60 modular multiplications instead of building ``2^10^18``. A
+    negative exponent uses the modular inverse of the base.
+
+    Args:
+        base: An integer
+        exponent: An integer
+        modulus: A nonzero integer
+
+    Returns:
+        The residue, with the sign of the modulus as for ``%``
+
+    Raises:
+        ValueError: For non-integral arguments, a zero modulus, or a
+            negative exponent when the base is not invertible
+    """
+    return pow(integral(base, 'powmod'), integral(exponent, 'powmod'),
+               integral(modulus, 'powmod'))
+
+
+def binom(n: Any, k: Any) -> int:
+    """
+    Compute the binomial coefficient ``n choose k``.
+
+    Args:
+        n: A nonnegative integer
+        k: A nonnegative integer; the result is 0 when it exceeds ``n``
+
+    Returns:
+        The number of ways to choose ``k`` of ``n`` items
+
+    Raises:
+        ValueError: For negative or non-integral arguments
+    """
+    return math.comb(integral(n, 'binom'), integral(k, 'binom'))
+
+
+def factorial(n: Any) -> int:
+    """
+    Compute ``n!`` exactly.
+
+    ``math.factorial`` already multiplies the odd parts by binary splitting
+    in C, balancing the sizes of the factors, and shifts in the powers of
+    two at the end; this only accepts integral floats as well.
+
+    Args:
+        n: A nonnegative integer
+
+    Returns:
+        The factorial
+
+    Raises:
+        ValueError: For negative or non-integral arguments
+    """
+    return math.factorial(integral(n, 'factorial'))
+
+
+def factorial_mod(n: Any, modulus: Any) -> int:
+    """
+    Compute ``n! mod modulus`` without computing ``n!``.
+
+    The product is reduced after every few factors; ``n! = 0 (mod m)``
+    once ``n >= |m|``, so at most ``|m|`` factors are multiplied.
+
+    Args:
+        n: A nonnegative integer
+        modulus: A nonzero integer
+
+    Returns:
+        The residue, with the sign of the modulus as for ``%``
+
+    Raises:
+        ValueError: For a negative n, a zero modulus or non-integral arguments
+    """
+    n = integral(n, 'factorial_mod')
+    modulus = integral(modulus, 'factorial_mod')
+    if n < 0:
+        raise ValueError("factorial_mod() not defined for negative values")
+    if not modulus:
+        raise ValueError("factorial_mod() modulus cannot be 0")
+    if n >= abs(modulus):
+        return 0
+    result = 1
+    for start in range(2, n + 1, _CHUNK):
+        result = result * math.prod(range(start, min(start + _CHUNK, n + 1))) % modulus
+    return result % modulus
+
+
+def prod(*values: Any) -> Any:
+    """
+    Multiply any number of values.
+
+    Ints are multiplied by binary splitting (see :func:`product`); other
+    values in order, as by ``math.prod``.
+
+    Args:
+        *values: Numbers
+
+    Returns:
+        The product; 1 when there are no values
+    """
+    for value in values:
+        if not isinstance(value, int):
+            return math.prod(values)
+    return product(values)
+
+
+def product(values: Sequence[int]) -> int:
+    """
+    Multiply ints by binary splitting.
+
+    Multiplying the halves of the sequence recursively keeps the factors
+    of every multiplication of similar size, which Karatsuba
+    multiplication needs to pay off; multiplying left to right instead
+    multiplies an ever larger product by small factors, quadratic overall.
+
+    Args:
+        values: The ints
+
+    Returns:
+        The product; 1 for an empty sequence
+    """
+    def split(low: int, high: int) -> int:
+        if high - low <= _CHUNK:
+            return math.prod(values[low:high])
+        middle = (low + high) // 2
+        return split(low, middle) * split(middle, high)
+
+    return split(0, len(values))
+
+
+def range_product(low: int, high: int) -> int:
+    """
+    Multiply the integers ``low, low + 1, ..., high - 1`` by binary splitting.
+
+    Args:
+        low: The first factor
+        high: The end of the range, excluded
+
+    Returns:
+        The product; 1 for an empty range
+    """
+    if high - low <= _CHUNK:
+        return math.prod(range(low, high))
+    middle = (low + high) // 2
+    return range_product(low, middle) * range_product(middle, high)
+
+
+def gcd(*values: Any) -> int:
+    """
+    Compute the greatest common divisor of any number of integers.
+
+    Args:
+        *values: Integers
+
+    Returns:
+        The nonnegative gcd; 0 when there are no values or all are 0
+    """
+    result = 0
+    for value in values:
+        result = math.gcd(result, integral(value, 'gcd'))
+    return result
+
+
+def lcm(*values: Any) -> int:
+    """
+    Compute the least common multiple of any number of integers.
+
+    Args:
+        *values: Integers
+
+    Returns:
+        The nonnegative lcm; 1 when there are no values, 0 when one is 0
+    """
+    result = 1
+    for value in values:
+        value = integral(value, 'lcm')
+        if not value or not result:
+            result = 0
+        else:
+            result = result // math.gcd(result, value) * abs(value)
+    return result
+
+
+def format_integer(n: int) -> str:
+    """
+    Get the decimal text of an int of any size.
+
+    Large ints are split in halves by powers of two, recursively, and the
+    halves are combined with Decimal arithmetic, which multiplies huge
+    numbers in subquadratic time; ``str()`` takes quadratic time and
+    refuses ints of more than 4300 digits on recent Pythons.
+
+    Args:
+        n: The integer
+
+    Returns:
+        Its decimal digits, with a leading ``-`` when negative
+    """
+    if n.bit_length() <= _STR_BITS:
+        return str(n)
+    powers: Dict[int, Decimal] = {}
+
+    def power(bits: int) -> Decimal:
+        """Get 2**bits as a Decimal."""
+        result = powers.get(bits)
+        if result is None:
+            if bits <= _PIECE_BITS:
+                result = Decimal(2) ** bits
+            else:
+                half = bits >> 1
+                result = power(half) * power(bits - half)
+            powers[bits] = result
+        return result
+
+    def convert(n: int, bits: int) -> Decimal:
+        """Convert a nonnegative int below 2**bits."""
+        if bits <= _PIECE_BITS:
+            return Decimal(n)
+        half = bits >> 1
+        high = n >> half
+        low = n - (high << half)
+        return convert(low, half) + convert(high, bits - half) * power(half)
+
+    with decimal.localcontext() as context:
+        # Exact: enough digits for any int, and an error otherwise
+        context.prec = decimal.MAX_PREC
+        context.Emax = decimal.MAX_EMAX
+        context.Emin = decimal.MIN_EMIN
+        context.traps[decimal.Inexact] = True
+        magnitude = abs(n)
+        text = str(convert(magnitude, magnitude.bit_length()))
+    return '-' + text if n < 0 else text
+
+
+def integral(value: Any, name: str) -> int:
+    """
+    Get an argument of an integer function as an int.
+
+    Args:
+        value: An int, or an integral float, Decimal or Fraction
+        name: The function name, for the error message
+
+    Returns:
+        The int equal to ``value``
+
+    Raises:
+        ValueError: If ``value`` is not an integer
+    """
+    if isinstance(value, int):
+        return value
+    try:
+        integer = int(value)
+    except (TypeError, ValueError, OverflowError):
+        integer = None
+    if integer is None or integer != value:
+        raise ValueError(f"{name}() only accepts integral values")
+    return integer
@@ -0,0 +1,273 @@
+"""Single-pass tokenizer for calculator expressions."""
+
+import re
+from typing import IO, Any, Callable, Iterable, List, Mapping, Tuple, Union
+
+from .errors import ExpressionSyntaxError
+
+
+# Token kinds
+NUMBER = "number"
+NAME = "name"
+OP = "op"
+LPAREN = "("
+RPAREN = ")"
+ASSIGN = "="
+SEMICOLON = ";"
+COMMA = ","
+
+
+# A lexical token: (kind, value, zero-based position in the source expression).
+# Plain tuples keep tokenization cheap on long expressions.
+Token = Tuple[str, Union[int, float, str], int]
+
+
+# One group per token kind, tried in order of frequency; leading whitespace is
+# consumed by the same match so every match yields a token (trailing
+# whitespace never matches)
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (\*\*|//|[<>=!]=|[-+*/%^<>])          # 1: operator
+      | ([A-Za-z_][A-Za-z_0-9]*)              # 2: name
+      | ((?:\d+\.?\d*|\.\d+)[\d.]*)          # 3: number (malformed if several dots)
+      | (\()                                  # 4: left parenthesis
+      | (\))                                  # 5: right parenthesis
+      | ([=;,])                               # 6: assignment, separator or comma
+      | (\S)                                  # 7: invalid character
+    )
+""", re.VERBOSE)
+
+_OP, _NAME, _NUMBER, _LPAREN, _RPAREN, _PUNCTUATION, _INVALID = range(1, 8)
+
+# Python spellings of the operator tokens
+_OPERATORS = {'^': '**'}
+
+_IMPLICIT_MUL = '*'
+
+# Characters a stream may be split after without splitting a token
+_BOUNDARIES = ' \t\n\r(),;'
+
+
+def tokenize(
+    expression: str,
+    constants: Mapping[str, Any],
+    real: Callable[[str], Any] = float,
+) -> List[Token]:
+    """
+    Tokenize, validate and normalize an expression in one linear pass.
+
+    Names are lowercased and constants are resolved to NUMBER tokens, ``^`` is
+    turned into ``**`` and implicit multiplication (``2pi``, ``3(1+2)``,
+    ``(1)(2)``, ``(1)2``) is made explicit. Only adjacent tokens multiply:
+    across whitespace, as in ``2 pi`` or ``2 3``, the expression is a syntax
+    error. ``=`` and ``;`` are passed through for multi-statement scripts
+    and ``,`` for argument lists; comparisons such as ``<=`` and ``==`` are
+    operators.
+
+    Args:
+        expression: The raw expression string
+        constants: Mapping of constant names to their values
+        real: Type of the literals with a decimal point, e.g. ``Decimal`` to
+            keep them exact; integer literals are always ints
+
+    Returns:
+        The list of tokens
+
+    Raises:
+        ExpressionSyntaxError: On an invalid character, a malformed number or
+            unbalanced parentheses
+    """
+    return _tokenize(((expression, 0),), constants, real)
+
+
+def tokenize_stream(
+    stream: IO[str],
+    constants: Mapping[str, float],
+    chunk_size: int = 1 << 16,
+) -> Tuple[List[Token], int]:
+    """
+    Tokenize an expression read from a text file object, chunk by chunk.
+
+    The source is never held in memory as one string: every chunk is cut
+    after its last whitespace, parenthesis, comma or semicolon, and the
+    remainder is carried into the next chunk, so no token is split.
+    Positions in the tokens and in errors count from the start of the stream.
+
+    Args:
+        stream: A text file object
+        constants: Mapping of constant names to their values
+        chunk_size: Number of characters read at a time
+
+    Returns:
+        Tuple of (the list of tokens, number of characters read)
+
+    Raises:
+        ExpressionSyntaxError: As for :func:`tokenize`
+    """
+    length = 0
+
+    def pieces() -> Iterable[Tuple[str, int]]:
+        nonlocal length
+        pending = ''
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            text = pending + chunk
+            cut = max(text.rfind(boundary) for boundary in _BOUNDARIES) + 1
+            if cut:
+                yield text[:cut], length
+                length += cut
+            pending = text[cut:]
+        if pending:
+            yield pending, length
+            length += len(pending)
+
+    tokens = _tokenize(pieces(), constants)
+    return tokens, length
+
+
+def _tokenize(
+    pieces: Iterable[Tuple[str, int]],
+    constants: Mapping[str, Any],
+    real: Callable[[str], Any] = float,
+) -> List[Token]:
+    """Tokenize consecutive pieces of one source, given with their offsets."""
+    tokens: List[Token] = []
+    append = tokens.append
+    operators = _OPERATORS
+    open_parens: List[int] = []
+    # Whether the previous token ends an operand, and whether it was ")"
+    after_operand = after_rparen = False
+    # Where the previous token ends: implicit multiplication needs no gap
+    end = -1
+
+    for source, offset in pieces:
+        for match in _TOKEN_RE.finditer(source):
+            group = match.lastindex
+            pos = offset + match.start(group)
+            adjacent = pos == end
+            end = offset + match.end(group)
+
+            if group == _OP:
+                text = match.group(group)
+                append((OP, operators.get(text, text), pos))
+                after_operand = after_rparen = False
+
+            elif group == _NAME:
+                name = match.group(group).lower()
+                if after_operand and adjacent:
+                    append((OP, _IMPLICIT_MUL, pos))
+                if name in constants:
+                    append((NUMBER, constants[name], pos))
+                    after_operand, after_rparen = True, False
+                else:
+                    append((NAME, name, pos))
+                    after_operand = after_rparen = False
+
+            elif group == _NUMBER:
+                text = match.group(group)
+                if '.' in text:
+                    if text.count('.') > 1:
+                        raise ExpressionSyntaxError(f"Malformed number '{text}'", pos)
+                    value: Any = real(text)
+                else:
+                    value = int(text)
+                if after_rparen and adjacent:
+                    append((OP, _IMPLICIT_MUL, pos))
+                append((NUMBER, value, pos))
+                after_operand, after_rparen = True, False
+
+            elif group == _LPAREN:
+                if after_operand and adjacent:
+                    append((OP, _IMPLICIT_MUL, pos))
+                open_parens.append(pos)
+                append((LPAREN, LPAREN, pos))
+                after_operand = after_rparen = False
+
+            elif group == _RPAREN:
+                if not open_parens:
+                    raise ExpressionSyntaxError("Unbalanced parentheses", pos)
+                open_parens.pop()
+                append((RPAREN, RPAREN, pos))
+                after_operand = after_rparen = True
+
+            elif group == _PUNCTUATION:
+                text = match.group(group)
+                append((text, text, pos))
+                after_operand = after_rparen = False
+
+            else:
+                raise ExpressionSyntaxError(f"Invalid character '{match.group(group)}'", pos)
+
+    if open_parens:
+        raise ExpressionSyntaxError("Unbalanced parentheses", open_parens[-1])
+
+    return tokens
+
+
+def to_source(tokens: List[Token]) -> str:
+    """
+    Render tokens back into a Python expression string.
+
+    Args:
+        tokens: Tokens produced by :func:`tokenize`
+
+    Returns:
+        The expression as Python source
+    """
+    parts = []
+    for token in tokens:
+        kind, value, _ = token
+        if kind != NUMBER:
+            parts.append(value)
+        elif value < 0:
+            parts.append(f"({value!r})")
+        else:
+            parts.append(repr(value))
+    return ' '.join(parts)
+
+
+def split_literals(tokens: List[Token]) -> Tuple[Tuple[Any, ...], List[Union[int, float]]]:
+    """
+    Separate the numeric literals of an expression from its shape.
+
+    Expressions differing only in their numbers, such as ``0.5 * 1000 * 20**2``
+    and ``0.5 * 1200 * 25**2``, have the same shape.
+
+    Args:
+        tokens: Tokens produced by :func:`tokenize`
+
+    Returns:
+        Tuple of (shape, literal values in order); the shape holds None in
+        place of every number
+    """
+    literals = [value for kind, value, _ in tokens if kind == NUMBER]
+    shape = tuple(None if kind == NUMBER else value for kind, value, _ in tokens)
+    return shape, literals
+
+
+def lift_literals(tokens: List[Token]) -> Tuple[List[Token], Tuple[str, ...]]:
+    """
+    Replace every numeric literal by a parameter name.
+
+    The names (``#0``, ``#1``, ...) cannot be written in an expression, so
+    they never clash with its variables.
+
+    Args:
+        tokens: Tokens produced by :func:`tokenize`
+
+    Returns:
+        Tuple of (tokens reading the literals as variables, parameter names
+        in literal order)
+    """
+    lifted: List[Token] = []
+    names: List[str] = []
+    for token in tokens:
+        kind, _, pos = token
+        if kind == NUMBER:
+            name = f"#{len(names)}"
+            names.append(name)
+            token = (NAME, name, pos)
+        lifted.append(token)
+    return lifted, tuple(names)
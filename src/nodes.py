@@ -0,0 +1,415 @@
+"""Abstract syntax tree for calculator expressions."""
+
+import operator
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from .integers import format_integer
+
+
+# Binary operators and the functions implementing them
+BINARY_OPERATORS: Dict[str, Callable[[Any, Any], Any]] = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '//': operator.floordiv,
+    '%': operator.mod,
+    '**': operator.pow,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+# Binary operators comparing their operands
+COMPARISONS = frozenset(('<', '<=', '>', '>=', '==', '!='))
+
+# Unary (prefix) operators and the functions implementing them
+UNARY_OPERATORS: Dict[str, Callable[[Any], Any]] = {
+    '-': operator.neg,
+    '+': operator.pos,
+}
+
+# Markers on the stack of :func:`evaluate`: apply an operation to the values
+# of its operands, and pick the branch of a conditional
+_APPLY, _SELECT = range(2)
+
+
+class Node:
+    """
+    Base class of all expression nodes.
+
+    Every node evaluates itself against an environment mapping variable
+    names to values, so evaluating a tree is a walk of direct method calls.
+    """
+
+    __slots__ = ()
+
+    def evaluate(self, env: Optional[Mapping[str, Any]] = None) -> Any:
+        """
+        Evaluate the node.
+
+        Args:
+            env: Mapping of variable names to values
+
+        Returns:
+            The value of the node
+        """
+        raise NotImplementedError
+
+    def children(self) -> Tuple["Node", ...]:
+        """Get the direct sub-expressions of the node."""
+        return ()
+
+
+class Number(Node):
+    """A numeric literal or a folded constant."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def evaluate(self, env=None):
+        return self.value
+
+    def __repr__(self) -> str:
+        return f"Number({self.value!r})"
+
+    def __str__(self) -> str:
+        value = self.value
+        # repr() refuses ints of more than 4300 digits
+        text = format_integer(value) if type(value) is int else repr(value)
+        if isinstance(value, complex) or value < 0:
+            return f"({text})"
+        return text
+
+
+class Variable(Node):
+    """A free name whose value is supplied when the expression is evaluated."""
+
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def evaluate(self, env=None):
+        try:
+            return env[self.name]
+        except (KeyError, TypeError):
+            raise NameError(f"name '{self.name}' is not defined") from None
+
+    def __repr__(self) -> str:
+        return f"Variable({self.name!r})"
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class UnaryOp(Node):
+    """A prefix operator applied to one operand."""
+
+    __slots__ = ('op', 'operand', 'func')
+
+    def __init__(self, op: str, operand: Node):
+        self.op = op
+        self.operand = operand
+        self.func = UNARY_OPERATORS[op]
+
+    def evaluate(self, env=None):
+        return self.func(self.operand.evaluate(env))
+
+    def children(self):
+        return (self.operand,)
+
+    def __repr__(self) -> str:
+        return f"UnaryOp({self.op!r}, {self.operand!r})"
+
+    def __str__(self) -> str:
+        return f"({self.op}{self.operand})"
+
+
+class BinaryOp(Node):
+    """An infix operator applied to two operands."""
+
+    __slots__ = ('op', 'left', 'right', 'func')
+
+    def __init__(self, op: str, left: Node, right: Node):
+        self.op = op
+        self.left = left
+        self.right = right
+        self.func = BINARY_OPERATORS[op]
+
+    def evaluate(self, env=None):
+        return self.func(self.left.evaluate(env), self.right.evaluate(env))
+
+    def children(self):
+        return (self.left, self.right)
+
+    def __repr__(self) -> str:
+        return f"BinaryOp({self.op!r}, {self.left!r}, {self.right!r})"
+
+    def __str__(self) -> str:
+        return f"({self.left} {self.op} {self.right})"
+
+
+class Call(Node):
+    """A call of a named function."""
+
+    __slots__ = ('name', 'func', 'args', 'pure')
+
+    def __init__(self, name: str, func: Callable[..., Any], args: Tuple[Node, ...],
+                 pure: bool = True):
+        self.name = name
+        self.func = func
+        self.args = args
+        # Impure calls are never folded, shared or memoized
+        self.pure = pure
+
+    def evaluate(self, env=None):
+        args = self.args
+        if len(args) == 1:
+            return self.func(args[0].evaluate(env))
+        return self.func(*[arg.evaluate(env) for arg in args])
+
+    def children(self):
+        return self.args
+
+    def __repr__(self) -> str:
+        return f"Call({self.name!r}, {self.args!r})"
+
+    def __str__(self) -> str:
+        return f"{self.name}({', '.join(str(arg) for arg in self.args)})"
+
+
+class Conditional(Node):
+    """
+    ``if(condition, then, otherwise)``: only the selected branch is evaluated.
+
+    ``piecewise(...)`` is parsed into nested conditionals.
+    """
+
+    __slots__ = ('condition', 'then', 'otherwise')
+
+    def __init__(self, condition: Node, then: Node, otherwise: Node):
+        self.condition = condition
+        self.then = then
+        self.otherwise = otherwise
+
+    def evaluate(self, env=None):
+        if self.condition.evaluate(env):
+            return self.then.evaluate(env)
+        return self.otherwise.evaluate(env)
+
+    def children(self):
+        return (self.condition, self.then, self.otherwise)
+
+    def __repr__(self) -> str:
+        return f"Conditional({self.condition!r}, {self.then!r}, {self.otherwise!r})"
+
+    def __str__(self) -> str:
+        return f"if({self.condition}, {self.then}, {self.otherwise})"
+
+
+class Local(Node):
+    """A script variable stored in a slot of the script's frame."""
+
+    __slots__ = ('name', 'index')
+
+    def __init__(self, name: str, index: int):
+        self.name = name
+        self.index = index
+
+    def evaluate(self, env=None):
+        # Inside a script the environment is the frame list
+        return env[self.index]
+
+    def __repr__(self) -> str:
+        return f"Local({self.name!r}, {self.index})"
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class Script(Node):
+    """
+    A sequence of statements evaluated as one unit.
+
+    Every name of the script is resolved to a slot index while parsing.
+    Statements are (slot, expression) pairs, with slot None for plain
+    expressions; names read before their first assignment are free and
+    are loaded from the environment into their slot when the script starts.
+    """
+
+    __slots__ = ('statements', 'names', 'free')
+
+    def __init__(
+        self,
+        statements: Tuple[Tuple[Optional[int], Node], ...],
+        names: Tuple[str, ...],
+        free: Tuple[Tuple[str, int], ...],
+    ):
+        """
+        Initialize the script.
+
+        Args:
+            statements: (slot or None, expression) pairs
+            names: Variable name of each slot
+            free: (name, slot) of the variables bound by the environment
+        """
+        self.statements = statements
+        self.names = names
+        self.free = free
+
+    @property
+    def is_constant(self) -> bool:
+        """Whether every statement was folded to a number while parsing."""
+        return all(type(node) is Number for _, node in self.statements)
+
+    def evaluate(self, env=None):
+        return self.execute(env)[-1]
+
+    def execute(
+        self,
+        env: Optional[Mapping[str, Any]] = None,
+        apply: Optional[Callable[["Node", List[Any]], Any]] = None,
+    ) -> List[Any]:
+        """
+        Run every statement.
+
+        Args:
+            env: Mapping of the free variable names to values
+            apply: Computes every operation, as for :func:`evaluate`
+
+        Returns:
+            The value of each statement, in order
+        """
+        frame: List[Any] = [None] * len(self.names)
+        for name, index in self.free:
+            try:
+                frame[index] = env[name]
+            except (KeyError, TypeError):
+                raise NameError(f"name '{name}' is not defined") from None
+        values = []
+        for index, node in self.statements:
+            value = evaluate(node, frame, apply)
+            if index is not None:
+                frame[index] = value
+            values.append(value)
+        return values
+
+    def children(self):
+        return tuple(node for _, node in self.statements)
+
+    def __repr__(self) -> str:
+        return f"Script({self.statements!r}, {self.names!r}, {self.free!r})"
+
+    def __str__(self) -> str:
+        return '; '.join(str(node) if index is None else f"{self.names[index]} = {node}"
+                         for index, node in self.statements)
+
+
+def evaluate(
+    node: Node,
+    env: Optional[Mapping[str, Any]] = None,
+    apply: Optional[Callable[[Node, List[Any]], Any]] = None,
+) -> Any:
+    """
+    Evaluate a tree without recursion.
+
+    ``node.evaluate(env)`` makes one Python call per level of nesting and
+    overflows the interpreter stack on deeply nested trees. This keeps the
+    pending operations on an explicit stack instead, so any depth that fits
+    in memory evaluates, in time linear in the size of the tree. Only the
+    selected branch of a conditional is evaluated.
+
+    Args:
+        node: The root of the tree
+        env: Mapping of variable names to values (the frame inside a script)
+        apply: Called as ``apply(node, operand values)`` to compute every
+            operator and call, e.g. to check limits before computing it
+
+    Returns:
+        The value of the tree
+    """
+    values: List[Any] = []
+    stack: List[Any] = [node]
+    while stack:
+        node = stack.pop()
+        kind = type(node)
+        if kind is Number:
+            values.append(node.value)
+        elif kind is tuple:
+            marker, node = node
+            if marker == _SELECT:
+                stack.append(node.then if values.pop() else node.otherwise)
+            elif apply is not None:
+                start = len(values) - len(node.children())
+                args = values[start:]
+                del values[start:]
+                values.append(apply(node, args))
+            elif type(node) is BinaryOp:
+                right = values.pop()
+                values[-1] = node.func(values[-1], right)
+            elif type(node) is UnaryOp:
+                values[-1] = node.func(values[-1])
+            else:
+                start = len(values) - len(node.args)
+                args = values[start:]
+                del values[start:]
+                values.append(node.func(*args))
+        elif kind is BinaryOp:
+            stack += ((_APPLY, node), node.right, node.left)
+        elif kind is UnaryOp:
+            stack += ((_APPLY, node), node.operand)
+        elif kind is Call:
+            stack.append((_APPLY, node))
+            stack.extend(reversed(node.args))
+        elif kind is Conditional:
+            stack += ((_SELECT, node), node.condition)
+        else:
+            values.append(node.evaluate(env))
+    return values[-1]
+
+
+def walk(node: Node) -> Iterator[Node]:
+    """
+    Iterate over a tree in pre-order without recursion.
+
+    Args:
+        node: The root of the tree
+
+    Yields:
+        Every node of the tree, parents before their children
+    """
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node.children()))
+
+
+def references(node: Node) -> Dict[int, int]:
+    """
+    Count the references to every node of a tree whose subtrees may be shared.
+
+    Args:
+        node: The root of the tree
+
+    Returns:
+        Mapping of ``id(node)`` to the number of parents referencing it (1
+        for the root); a count above 1 marks a common subexpression
+    """
+    counts = {id(node): 1}
+    stack = [node]
+    while stack:
+        for child in stack.pop().children():
+            key = id(child)
+            if key in counts:
+                counts[key] += 1
+            else:
+                counts[key] = 1
+                stack.append(child)
+    return counts
@@ -0,0 +1,440 @@
+"""Algebraic rewrites applied to expression trees before they are compiled."""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .nodes import (
+    BinaryOp, Call, Conditional, Local, Node, Number, Script, UnaryOp, Variable, references
+)
+
+
+# Errors that leave a constant subtree unfolded so they surface at evaluation
+_FOLDING_ERRORS = (ArithmeticError, ValueError, TypeError)
+
+# Highest power expanded when rewriting a polynomial in Horner form
+MAX_DEGREE = 32
+
+# Relative cost of each operator, used to decide whether a rewrite pays off
+OPERATOR_COSTS = {'**': 4, '/': 2, '//': 2, '%': 2}
+
+# Variable nodes a rewrite may duplicate without duplicating work
+_TRIVIAL = (Variable, Local)
+
+# A polynomial: the variable it is in (None for a constant) and its
+# coefficients by degree
+_Polynomial = Tuple[Optional[Node], Dict[int, Any]]
+
+
+def optimize(node: Node, algebraic: bool = False) -> Node:
+    """
+    Rewrite a tree into a cheaper equivalent.
+
+    The default passes keep the value of the tree for every input:
+    - Identity elimination: ``x*1``, ``1*x``, ``x+0``, ``x-0``, ``x^1``
+      and ``+x`` become ``x``, ``--x`` becomes ``x`` and ``0-x`` becomes ``-x``
+    - Constant folding of the subtrees made constant by the rewrites, and
+      of conditionals whose condition became constant
+    - Common subexpressions: identical subtrees become one shared node (see
+      :func:`share`), which compiled code evaluates once
+
+    Identities are only applied for the integers 0 and 1 so that the type of
+    the result (int or float) is preserved; only the sign of a zero result
+    may change, e.g. ``-0.0 + 0`` is ``0.0``.
+
+    With ``algebraic``, two rewrites that are exact for ints but not for
+    floats are applied as well:
+    - Horner form: polynomials in one variable, e.g. ``3x^3 + 2x^2 + x``,
+      become nested products ``((3*x + 2)*x + 1)*x``. Expanding changes
+      float results where terms cancel, e.g. ``(x+1)^2 - x^2`` is ``2x + 1``
+      and gives 2e17 instead of 0.0 at ``x = 1e17``, and where values are not
+      finite, e.g. ``2x - x`` is ``x`` and gives inf instead of nan at
+      ``x = inf``
+    - Strength reduction: ``x^2`` becomes ``x*x``, with ``x`` computed once;
+      a float square that overflows gives inf instead of raising
+      OverflowError
+
+    Args:
+        node: The root of the expression tree
+        algebraic: Whether to also expand polynomials and reduce squares
+
+    Returns:
+        The optimized tree; ``node`` itself is left unchanged
+
+    Example:
+        >>> str(optimize(Calculator().parse("x^2*1 + 2x + 0")))
+        '((x ** 2) + (2 * x))'
+        >>> str(optimize(Calculator().parse("x^2*1 + 2x + 0"), algebraic=True))
+        '((x + 2) * x)'
+    """
+    if isinstance(node, Script):
+        statements = tuple((index, optimize(statement, algebraic))
+                           for index, statement in node.statements)
+        return Script(statements, node.names, node.free)
+    if algebraic:
+        node = _horner(node)
+    return share(_simplify(node, algebraic))
+
+
+def share(node: Node) -> Node:
+    """
+    Hash-cons a tree so that identical subtrees are a single node object.
+
+    The result is a directed acyclic graph; code generators evaluate a node
+    referenced several times once and reuse its value. Every function is
+    assumed pure. Statements of a script are shared separately, since a
+    local may hold different values in different statements.
+
+    Args:
+        node: The root of the expression tree
+
+    Returns:
+        The root of the shared tree
+
+    Example:
+        >>> tree = share(Calculator().parse("sin(x)^2 + sin(x)*cos(x)"))
+        >>> shared_nodes(tree)
+        1
+    """
+    if isinstance(node, Script):
+        statements = tuple((index, share(statement)) for index, statement in node.statements)
+        return Script(statements, node.names, node.free)
+    return _share(node, {})
+
+
+def shared_nodes(node: Node) -> int:
+    """
+    Count the operations referenced more than once, i.e. computed once and reused.
+
+    Args:
+        node: The root of a tree returned by :func:`share` or :func:`optimize`
+
+    Returns:
+        The number of shared operation nodes
+    """
+    counts = references(node)
+    seen = set()
+    shared = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        if counts[id(node)] > 1 and isinstance(node, (UnaryOp, BinaryOp, Call, Conditional)):
+            shared += 1
+        stack.extend(node.children())
+    return shared
+
+
+def cost(node: Node) -> int:
+    """
+    Estimate the work of evaluating a tree once.
+
+    Args:
+        node: The root of the expression tree
+
+    Returns:
+        The weighted number of operations; a conditional counts its
+        condition and its costlier branch
+    """
+    return _costs(node)[id(node)]
+
+
+def _costs(root: Node) -> Dict[int, int]:
+    """Compute the cost of every node of a tree bottom-up, without recursion."""
+    costs: Dict[int, int] = {}
+    stack = [(root, False)]
+    while stack:
+        node, ready = stack.pop()
+        key = id(node)
+        if key in costs:
+            continue
+        if not ready:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.children())
+            continue
+        if isinstance(node, Conditional):
+            costs[key] = costs[id(node.condition)] + max(costs[id(node.then)],
+                                                         costs[id(node.otherwise)])
+            continue
+        total = sum(costs[id(child)] for child in node.children())
+        if isinstance(node, BinaryOp):
+            total += OPERATOR_COSTS.get(node.op, 1)
+        elif isinstance(node, (UnaryOp, Call)):
+            total += 1
+        costs[key] = total
+    return costs
+
+
+def _transform(
+    root: Node,
+    rebuild: Callable[[Node, List[Node]], Node],
+    replace: Optional[Callable[[Node], Optional[Node]]] = None,
+) -> Node:
+    """
+    Rebuild a tree bottom-up without recursion.
+
+    Args:
+        root: The root of the tree
+        rebuild: Called as ``rebuild(node, rebuilt children)`` for every node,
+            children first
+        replace: Called on every node before its children; a node it
+            returns replaces the whole subtree
+
+    Returns:
+        The rebuilt root
+    """
+    results: Dict[int, Node] = {}
+    stack = [(root, False)]
+    while stack:
+        node, ready = stack.pop()
+        key = id(node)
+        if key in results:
+            continue
+        if ready:
+            results[key] = rebuild(node, [results[id(child)] for child in node.children()])
+            continue
+        if replace is not None:
+            replacement = replace(node)
+            if replacement is not None:
+                results[key] = replacement
+                continue
+        stack.append((node, True))
+        stack.extend((child, False) for child in reversed(node.children()))
+    return results[id(root)]
+
+
+def _with_children(node: Node, children: List[Node]) -> Node:
+    """Copy an operation node with new operands."""
+    if isinstance(node, UnaryOp):
+        return UnaryOp(node.op, children[0])
+    if isinstance(node, BinaryOp):
+        return BinaryOp(node.op, children[0], children[1])
+    if isinstance(node, Call):
+        return Call(node.name, node.func, tuple(children), node.pure)
+    if isinstance(node, Conditional):
+        return Conditional(*children)
+    return node
+
+
+def _horner(root: Node) -> Node:
+    """Rewrite the largest polynomial subtrees in Horner form."""
+    # The polynomial and the cost of every subtree, computed once bottom-up
+    polynomials: Dict[int, Optional[_Polynomial]] = {}
+    stack = [(root, False)]
+    while stack:
+        node, ready = stack.pop()
+        if id(node) in polynomials:
+            continue
+        if ready:
+            polynomials[id(node)] = _polynomial(node, polynomials)
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.children())
+    costs = _costs(root)
+
+    def replace(node: Node) -> Optional[Node]:
+        if isinstance(node, (BinaryOp, UnaryOp)):
+            polynomial = polynomials[id(node)]
+            if polynomial is not None and polynomial[0] is not None:
+                rewritten = _build_horner(*polynomial)
+                if rewritten is not None and cost(rewritten) < costs[id(node)]:
+                    return rewritten
+        return None
+
+    return _transform(root, _with_children, replace)
+
+
+def _polynomial(node: Node, polynomials: Dict[int, Optional[_Polynomial]]) -> Optional[_Polynomial]:
+    """Get the coefficients of a polynomial in at most one variable, if it is one."""
+    if isinstance(node, Number):
+        value = node.value
+        if type(value) is int or type(value) is float:
+            return None, {0: value}
+        return None
+    if isinstance(node, _TRIVIAL):
+        return node, {1: 1}
+
+    if isinstance(node, UnaryOp):
+        operand = polynomials[id(node.operand)]
+        if operand is None or node.op == '+':
+            return operand
+        return operand[0], {degree: -c for degree, c in operand[1].items()}
+
+    if not isinstance(node, BinaryOp) or node.op not in ('+', '-', '*', '**'):
+        return None
+    left = polynomials[id(node.left)]
+    if left is None:
+        return None
+
+    if node.op == '**':
+        exponent = node.right
+        if (type(exponent) is not Number or type(exponent.value) is not int
+                or not 0 <= exponent.value <= MAX_DEGREE
+                or exponent.value * max(left[1], default=0) > MAX_DEGREE):
+            return None
+        result: Optional[_Polynomial] = (None, {0: 1})
+        for _ in range(exponent.value):
+            result = _multiply(result, left)
+        return result
+
+    right = polynomials[id(node.right)]
+    if right is None:
+        return None
+    if node.op == '*':
+        return _multiply(left, right)
+
+    variable = _same_variable(left[0], right[0])
+    if variable is False:
+        return None
+    sign = 1 if node.op == '+' else -1
+    coefficients = dict(left[1])
+    for degree, c in right[1].items():
+        coefficients[degree] = coefficients.get(degree, 0) + sign * c
+    return variable, coefficients
+
+
+def _multiply(left: _Polynomial, right: _Polynomial) -> Optional[_Polynomial]:
+    """Multiply two polynomials in the same variable."""
+    variable = _same_variable(left[0], right[0])
+    if variable is False:
+        return None
+    coefficients: Dict[int, Any] = {}
+    for left_degree, a in left[1].items():
+        for right_degree, b in right[1].items():
+            degree = left_degree + right_degree
+            if degree > MAX_DEGREE:
+                return None
+            coefficients[degree] = coefficients.get(degree, 0) + a * b
+    return variable, coefficients
+
+
+def _same_variable(left: Optional[Node], right: Optional[Node]) -> Any:
+    """Get the variable shared by two polynomials, or False if they differ."""
+    if left is None:
+        return right
+    if right is None or right is left:
+        return left
+    if type(left) is type(right) and _key(left) == _key(right):
+        return left
+    return False
+
+
+def _key(node: Node) -> Any:
+    """Identify a variable node."""
+    return node.index if isinstance(node, Local) else node.name
+
+
+def _build_horner(variable: Node, coefficients: Dict[int, Any]) -> Optional[Node]:
+    """Build ``(((c_n*x + c_n-1)*x + ...)*x + c_0`` from the coefficients."""
+    terms = {degree: c for degree, c in coefficients.items() if c != 0}
+    degree = max(terms, default=0)
+    if degree == 0:
+        # Keep the variable so that it is still required at evaluation
+        return None
+    node: Node = Number(terms[degree])
+    for power in range(degree - 1, -1, -1):
+        node = _simplify_binary('*', node, variable)
+        c = terms.get(power)
+        if c is not None:
+            if c < 0:
+                node = BinaryOp('-', node, Number(-c))
+            else:
+                node = BinaryOp('+', node, Number(c))
+    return node
+
+
+def _simplify(root: Node, algebraic: bool) -> Node:
+    """Apply identity elimination, folding and, if algebraic, strength reduction bottom-up."""
+    def rebuild(node: Node, children: List[Node]) -> Node:
+        if isinstance(node, UnaryOp):
+            operand = children[0]
+            if node.op == '+':
+                return operand
+            if isinstance(operand, UnaryOp) and operand.op == '-':
+                return operand.operand
+            return _fold(UnaryOp(node.op, operand))
+        if isinstance(node, BinaryOp):
+            return _simplify_binary(node.op, children[0], children[1], algebraic)
+        if isinstance(node, Call):
+            return _fold(Call(node.name, node.func, tuple(children), node.pure))
+        if isinstance(node, Conditional):
+            condition, then, otherwise = children
+            if type(condition) is Number:
+                return then if condition.value else otherwise
+            return Conditional(condition, then, otherwise)
+        return node
+
+    return _transform(root, rebuild)
+
+
+def _simplify_binary(op: str, left: Node, right: Node, algebraic: bool = False) -> Node:
+    """Build a binary operation, dropping integer identities and, if algebraic, reducing squares."""
+    if op == '+':
+        if _is_int(right, 0):
+            return left
+        if _is_int(left, 0):
+            return right
+    elif op == '-':
+        if _is_int(right, 0):
+            return left
+        if _is_int(left, 0):
+            return _fold(UnaryOp('-', right))
+    elif op == '*':
+        if _is_int(right, 1):
+            return left
+        if _is_int(left, 1):
+            return right
+        if _is_int(left, -1):
+            return _fold(UnaryOp('-', right))
+    elif op == '**':
+        if _is_int(right, 1):
+            return left
+        if algebraic and _is_int(right, 2):
+            # The base is one shared node, so it is still computed once
+            return BinaryOp('*', left, left)
+    return _fold(BinaryOp(op, left, right))
+
+
+def _share(root: Node, table: Dict[Any, Node]) -> Node:
+    """Get the canonical node structurally equal to ``root``."""
+    def rebuild(node: Node, children: List[Node]) -> Node:
+        if isinstance(node, Number):
+            value = node.value
+            # repr keeps 0.0 and -0.0 apart
+            key: Any = (Number, type(value), value if type(value) is int else repr(value))
+        elif isinstance(node, Variable):
+            key = (Variable, node.name)
+        elif isinstance(node, Local):
+            key = (Local, node.index)
+        elif isinstance(node, (UnaryOp, BinaryOp, Conditional)):
+            node = _with_children(node, children)
+            key = (type(node), getattr(node, 'op', None)) + tuple(id(child) for child in children)
+        elif isinstance(node, Call):
+            node = _with_children(node, children)
+            if not node.pure:
+                # Every impure call is evaluated on its own
+                return node
+            key = (Call, node.name, id(node.func)) + tuple(id(arg) for arg in children)
+        else:
+            return node
+        return table.setdefault(key, node)
+
+    return _transform(root, rebuild)
+
+
+def _is_int(node: Node, value: int) -> bool:
+    """Check whether a node is the integer constant ``value``."""
+    return type(node) is Number and type(node.value) is int and node.value == value
+
+
+def _fold(node: Node) -> Node:
+    """Replace a node whose operands are all numbers by its value."""
+    if type(node) is Call and not node.pure:
+        return node
+    for child in node.children():
+        if type(child) is not Number:
+            return node
+    try:
+        return Number(node.evaluate())
+    except _FOLDING_ERRORS:
+        return node
@@ -0,0 +1,217 @@
+"""Multi-process product trees for huge factorials and products."""
+
+import math
+import multiprocessing
+import operator
+import os
+import threading
+from typing import Any, List, Optional, Sequence, Tuple
+
+from .integers import factorial, integral, prod, product, range_product
+
+
+# Products whose result has at most this many bits (factorials up to about
+# 200,000) are computed in process; below it a pool costs more than it saves
+PARALLEL_BITS = 1 << 22
+
+# Multiplications of operands smaller than this are done in the parent
+# process rather than sent to a worker
+_SPLIT_BITS = 1 << 20
+
+
+class ProductKernel:
+    """
+    Computes huge integer products on a pool of worker processes.
+
+    The factors are split into one slice per worker, balanced by the bits
+    of their products; each worker multiplies its slice by binary
+    splitting. The partial products are merged pairwise, and each
+    multiplication of the merge is itself split across the workers: ``a *
+    b`` is computed as the sum of ``(a_i * b) << shift_i`` over slices
+    ``a_i`` of ``a``. The last multiplications dominate the work of a
+    product tree, so splitting them is what lets every core work to the end.
+
+    Only ranges, slices and partial products cross process boundaries;
+    ints are pickled from their binary form in linear time.
+
+    The pool is started on first use and reused; call :meth:`close` or use
+    the kernel as a context manager to stop it. Its workers are forked only
+    while this process runs a single thread, since a fork may copy a lock
+    held by another thread; otherwise they are started by ``forkserver``
+    or ``spawn``. Products below the threshold, and products computed
+    inside a daemon process such as a budget's sandbox, are computed in
+    process.
+
+    Example:
+        >>> with ProductKernel(workers=8) as kernel:
+        ...     digits = len(format_integer(kernel.factorial(10**6)))
+        >>> digits
+        5565709
+    """
+
+    def __init__(self, workers: Optional[int] = None, threshold: int = PARALLEL_BITS):
+        """
+        Initialize the kernel.
+
+        Args:
+            workers: Number of worker processes; defaults to the CPU count
+            threshold: Bit length of the result below which products are
+                computed in process
+        """
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.threshold = threshold
+        self._pool: Optional[Any] = None
+
+    def factorial(self, n: Any) -> int:
+        """
+        Compute ``n!``, on the workers when it is large.
+
+        Args:
+            n: A nonnegative integer
+
+        Returns:
+            The factorial
+
+        Raises:
+            ValueError: For negative or non-integral arguments
+        """
+        n = integral(n, 'factorial')
+        if n < 2 or not self._parallel(_factorial_bits(n)):
+            return factorial(n)
+        slices = _balanced_ranges(2, n + 1, self.workers)
+        return self._merge(self._pool_map(range_product, slices))
+
+    def prod(self, *values: Any) -> Any:
+        """
+        Multiply any number of values, on the workers when they are large ints.
+
+        Args:
+            *values: Numbers
+
+        Returns:
+            The product; 1 when there are no values
+        """
+        if not all(isinstance(value, int) for value in values):
+            return prod(*values)
+        sizes = [value.bit_length() for value in values]
+        if not self._parallel(sum(sizes)):
+            return product(values)
+        slices = [(values[low:high],) for low, high in _balanced_slices(sizes, self.workers)]
+        return self._merge(self._pool_map(product, slices))
+
+    def close(self):
+        """Stop the worker processes."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self) -> "ProductKernel":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"ProductKernel(workers={self.workers}, threshold={self.threshold})"
+
+    def _parallel(self, bits: float) -> bool:
+        """Check whether a product of this size is worth the workers."""
+        return (self.workers > 1 and bits > self.threshold
+                and not multiprocessing.current_process().daemon)
+
+    def _pool_map(self, function: Any, tasks: Sequence[Any]) -> List[Any]:
+        """Apply a function to every task on the pool, in order."""
+        if self._pool is None:
+            self._pool = _context().Pool(self.workers)
+        return self._pool.starmap(function, tasks, chunksize=1)
+
+    def _merge(self, values: List[int]) -> int:
+        """Multiply partial products pairwise, splitting large multiplications."""
+        while len(values) > 1:
+            pairs = [(values[i], values[i + 1]) for i in range(0, len(values) - 1, 2)]
+            rest = values[-1:] if len(values) % 2 else []
+            if min(min(a.bit_length(), b.bit_length()) for a, b in pairs) < _SPLIT_BITS:
+                merged = [a * b for a, b in pairs]
+            else:
+                merged = self._multiply(pairs)
+            values = merged + rest
+        return values[0]
+
+    def _multiply(self, pairs: List[Tuple[int, int]]) -> List[int]:
+        """Multiply pairs of ints, each split into slices shared by the workers."""
+        pieces = max(1, self.workers // len(pairs))
+        tasks = []
+        shifts = []
+        signs = []
+        for a, b in pairs:
+            # Slices are taken of the magnitudes
+            signs.append(-1 if (a < 0) != (b < 0) else 1)
+            a, b = abs(a), abs(b)
+            if a.bit_length() < b.bit_length():
+                a, b = b, a
+            width = -(-a.bit_length() // pieces)
+            mask = (1 << width) - 1
+            shifts.append([width * i for i in range(pieces)])
+            tasks += [((a >> shift) & mask, b) for shift in shifts[-1]]
+        products = iter(self._pool_map(operator.mul, tasks))
+        merged = []
+        for sign, pair_shifts in zip(signs, shifts):
+            total = 0
+            for shift in pair_shifts:
+                total += next(products) << shift
+            merged.append(total if sign > 0 else -total)
+        return merged
+
+
+def _factorial_bits(n: int) -> float:
+    """Approximate the bit length of ``n!`` by Stirling's formula."""
+    return (n * math.log(n) - n + 0.5 * math.log(2 * math.pi * n)) / math.log(2)
+
+
+def _log_product(x: float) -> float:
+    """Approximate log of the product of the integers below ``x``: an antiderivative of log."""
+    return x * math.log(x) - x if x > 0 else 0.0
+
+
+def _context() -> Any:
+    """Get the multiprocessing context of the pool: fork only while single-threaded."""
+    methods = multiprocessing.get_all_start_methods()
+    if 'fork' in methods and threading.active_count() == 1:
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _balanced_ranges(low: int, high: int, parts: int) -> List[Tuple[int, int]]:
+    """Split ``[low, high)`` into ranges whose products have about the same size."""
+    start = _log_product(low)
+    step = (_log_product(high) - start) / parts
+    bounds = [low]
+    for part in range(1, parts):
+        target = start + step * part
+        # Bisect the increasing antiderivative for the next bound
+        left, right = bounds[-1], high
+        while right - left > 1:
+            middle = (left + right) // 2
+            if _log_product(middle) < target:
+                left = middle
+            else:
+                right = middle
+        bounds.append(right)
+    bounds.append(high)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if a < b]
+
+
+def _balanced_slices(sizes: List[int], parts: int) -> List[Tuple[int, int]]:
+    """Split a sequence into contiguous slices of about the same total size."""
+    target = sum(sizes) / parts
+    slices = []
+    low = 0
+    total = 0
+    for index, size in enumerate(sizes):
+        total += size
+        if total >= target * (len(slices) + 1) and index + 1 < len(sizes):
+            slices.append((low, index + 1))
+            low = index + 1
+    slices.append((low, len(sizes)))
+    return slices
@@ -0,0 +1,550 @@
+"""Pratt parser turning calculator tokens into an abstract syntax tree."""
+
+import math
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set, Tuple
+
+from .errors import ExpressionSyntaxError
+from .functions import UserFunction
+from .lexer import ASSIGN, COMMA, LPAREN, NAME, NUMBER, OP, RPAREN, SEMICOLON, Token
+from .nodes import (
+    COMPARISONS, BinaryOp, Call, Conditional, Local, Node, Number, Script, UnaryOp, Variable,
+    walk
+)
+from .registry import FunctionSpec, describe
+
+
+# Binding power of the infix operators (higher binds tighter)
+BINARY_PRECEDENCE = {
+    '<': 5,
+    '<=': 5,
+    '>': 5,
+    '>=': 5,
+    '==': 5,
+    '!=': 5,
+    '+': 10,
+    '-': 10,
+    '*': 20,
+    '/': 20,
+    '//': 20,
+    '%': 20,
+    '**': 40,
+}
+
+# Prefix operators bind looser than ** so that -2**2 == -(2**2), as in Python
+UNARY_PRECEDENCE = 30
+
+# Conditional forms, parsed into Conditional nodes rather than calls
+CONDITIONALS = frozenset(('if', 'piecewise'))
+
+# Errors that leave a constant subtree unfolded so they surface at evaluation
+_FOLDING_ERRORS = (ArithmeticError, ValueError, TypeError)
+
+# Kinds of the operations pending while parsing
+_BINARY, _UNARY, _GROUP, _CALL = range(4)
+
+# Fold memo markers: not folded yet, and folding raised
+_UNFOLDED = object()
+_FAILED = object()
+
+
+class Parser:
+    """
+    Precedence-climbing parser for calculator expressions.
+
+    Operator precedence and associativity follow Python: ``**`` is right
+    associative and binds tighter than unary minus, the remaining binary
+    operators are left associative. Comparisons bind loosest and, unlike
+    Python, do not chain: ``1 < x < 3`` is a syntax error, while
+    ``(x > 0) == (y > 0)`` compares two parenthesized comparisons. Subtrees
+    made only of numbers and function calls are folded into a single Number
+    while parsing.
+
+    Example:
+        >>> tokens = tokenize("2 * x + 1", {})
+        >>> Parser(tokens, Calculator.FUNCTIONS).parse()
+        BinaryOp('+', BinaryOp('*', Number(2), Variable('x')), Number(1))
+    """
+
+    def __init__(
+        self,
+        tokens: List[Token],
+        functions: Mapping[str, Callable[..., Any]],
+        source_length: Optional[int] = None,
+        memo: Optional[Dict[Any, Any]] = None,
+        fold: bool = True,
+    ):
+        """
+        Initialize the parser.
+
+        Args:
+            tokens: Tokens produced by :func:`src.lexer.tokenize`
+            functions: Mapping of callable names to functions
+            source_length: Length of the source, used to report errors at its end
+            memo: Values of the constant subtrees folded so far; sharing one
+                memo between parsers folds each distinct subtree only once
+            fold: Whether to fold constant subtrees; without folding nothing
+                is evaluated while parsing
+        """
+        self.tokens = tokens
+        self.functions = functions
+        self.memo = memo
+        self.folding = fold
+        self.position = 0
+        if source_length is None:
+            source_length = tokens[-1][2] + 1 if tokens else 0
+        self.source_length = source_length
+        # Script state: the slot of every name (None outside scripts), the
+        # names holding a known constant, the names assigned so far and the
+        # names read before their first assignment
+        self.slots: Optional[Dict[str, int]] = None
+        self.known: Dict[str, Any] = {}
+        self.assigned: Set[str] = set()
+        self.free: Dict[str, int] = {}
+
+    def parse(self) -> Node:
+        """
+        Parse the whole token list as one expression or script.
+
+        Returns:
+            The root node of the expression, or a Script when the tokens
+            contain assignments or statement separators
+
+        Raises:
+            ExpressionSyntaxError: If the tokens do not form a valid expression
+            NameError: If an unknown function is called
+        """
+        for kind, _, _ in self.tokens:
+            if kind == ASSIGN or kind == SEMICOLON:
+                return self.parse_script()
+        node = self.parse_expression(0)
+        if self.position < len(self.tokens):
+            self._unexpected(self.tokens[self.position])
+        return node
+
+    def parse_script(self) -> Script:
+        """
+        Parse statements separated by ``;``, e.g. ``a = 3; b = a*2; b^2``.
+
+        Names are resolved to frame slots. A name assigned a constant is
+        replaced by that constant until it is reassigned, so constant
+        scripts fold completely. Functions and the conditionals ``if`` and
+        ``piecewise`` cannot be assigned to.
+
+        Returns:
+            The Script node
+        """
+        tokens = self.tokens
+        self.slots = {}
+        statements = []
+
+        while self.position < len(tokens):
+            kind, name, _ = tokens[self.position]
+            if kind == SEMICOLON:
+                # Empty statement
+                self.position += 1
+                continue
+
+            target = None
+            if (kind == NAME and self.position + 1 < len(tokens)
+                    and tokens[self.position + 1][0] == ASSIGN):
+                if name in self.functions or name in CONDITIONALS:
+                    raise ExpressionSyntaxError(f"Cannot assign to function '{name}'",
+                                                tokens[self.position][2])
+                self.position += 2
+                target = name
+
+            node = self.parse_expression(0)
+            if self.position < len(tokens) and tokens[self.position][0] != SEMICOLON:
+                self._unexpected(tokens[self.position])
+
+            if target is None:
+                statements.append((None, node))
+                continue
+            slot = self.slots.setdefault(target, len(self.slots))
+            self.assigned.add(target)
+            if type(node) is Number:
+                self.known[target] = node.value
+            else:
+                self.known.pop(target, None)
+            statements.append((slot, node))
+
+        if not statements:
+            raise ExpressionSyntaxError("Empty script", self.source_length)
+        return Script(tuple(statements), tuple(self.slots),
+                      tuple(self.free.items()))
+
+    def parse_expression(self, min_precedence: int) -> Node:
+        """
+        Parse an expression whose operators bind tighter than ``min_precedence``.
+
+        The parser does not recurse: operations still waiting for an operand
+        (prefix and infix operators, parentheses and calls with their
+        arguments so far) are kept on an explicit stack. Nesting depth and
+        length are therefore bounded by memory rather than by the Python
+        recursion limit, and every token is handled once.
+
+        Args:
+            min_precedence: The binding power of the enclosing operator
+
+        Returns:
+            The parsed node
+        """
+        tokens = self.tokens
+        count = len(tokens)
+        binding = BINARY_PRECEDENCE
+        fold = self._fold
+        # Each pending operation with the binding power in effect around it,
+        # restored once the operation is complete
+        pending: List[Tuple[int, Any, int]] = []
+        push = pending.append
+        precedence = min_precedence
+        # Whether the operand just completed is an unparenthesized comparison
+        compared = False
+
+        while True:
+            # Prefix operators and opening parentheses up to the next operand
+            node = None
+            compared = False
+            while node is None:
+                if self.position >= count:
+                    raise ExpressionSyntaxError("Unexpected end of expression",
+                                                self.source_length)
+                token = tokens[self.position]
+                self.position += 1
+                kind, value, pos = token
+                if kind == NUMBER:
+                    node = Number(value)
+                elif kind == OP and value in ('-', '+'):
+                    push((_UNARY, value, precedence))
+                    precedence = UNARY_PRECEDENCE
+                elif kind == LPAREN:
+                    push((_GROUP, None, precedence))
+                    precedence = 0
+                elif kind == NAME:
+                    if self.position < count and tokens[self.position][0] == LPAREN:
+                        node = self._open_call(value, pos, pending, precedence)
+                        if node is None:
+                            precedence = 0
+                    elif value in self.functions:
+                        raise ExpressionSyntaxError(
+                            f"Missing arguments for function '{value}'", pos)
+                    elif self.slots is None:
+                        node = Variable(value)
+                    else:
+                        node = self.parse_local(value)
+                else:
+                    self._unexpected(token)
+
+            # Complete the pending operations the operand ends, until an
+            # infix operator binding tighter than the enclosing one follows
+            while True:
+                if self.position < count:
+                    kind, op, pos = tokens[self.position]
+                    if kind == OP and binding[op] > precedence:
+                        if compared and op in COMPARISONS:
+                            raise ExpressionSyntaxError(
+                                "Comparisons cannot be chained; use parentheses", pos)
+                        self.position += 1
+                        push((_BINARY, (op, node), precedence))
+                        # ** is right associative, and the exponent may carry a sign
+                        precedence = UNARY_PRECEDENCE if op == '**' else binding[op]
+                        break
+                if not pending:
+                    return node
+                frame, data, precedence = pending.pop()
+                compared = frame == _BINARY and data[0] in COMPARISONS
+                if frame == _BINARY:
+                    node = fold(BinaryOp(data[0], data[1], node))
+                elif frame == _UNARY:
+                    node = fold(UnaryOp(data, node))
+                elif frame == _GROUP:
+                    self._expect(RPAREN)
+                else:
+                    data[-1].append(node)
+                    if self._peek_kind() == COMMA:
+                        self.position += 1
+                        push((frame, data, precedence))
+                        precedence = 0
+                        break
+                    self._expect(RPAREN)
+                    node = self._close_call(*data)
+
+    def parse_local(self, name: str) -> Node:
+        """
+        Resolve a name read inside a script.
+
+        Args:
+            name: The variable name
+
+        Returns:
+            The constant it holds, or a Local node reading its slot
+        """
+        if name in self.known:
+            return Number(self.known[name])
+        slot = self.slots.setdefault(name, len(self.slots))
+        if name not in self.assigned:
+            self.free.setdefault(name, slot)
+        return Local(name, slot)
+
+    def _open_call(
+        self,
+        name: str,
+        pos: int,
+        pending: List[Tuple[int, Any, int]],
+        precedence: int,
+    ) -> Optional[Node]:
+        """
+        Start a function call or conditional at its name.
+
+        Args:
+            name: The function name, followed by ``(``
+            pos: Position of the name
+            pending: The parser's stack of pending operations
+            precedence: The binding power in effect around the call
+
+        Returns:
+            The node of a call without arguments, or None after pushing the
+            call to parse its arguments
+        """
+        if name in CONDITIONALS:
+            func = spec = None
+        else:
+            func = self.functions.get(name)
+            if func is None:
+                raise NameError(f"name '{name}' is not defined")
+            spec = describe(self.functions, name)
+        self._expect(LPAREN)
+        if spec is not None and spec.arity is not None and self._peek_kind() == RPAREN:
+            self.position += 1
+            return self._close_call(name, pos, func, spec, [])
+        pending.append((_CALL, (name, pos, func, spec, []), precedence))
+        return None
+
+    def _close_call(
+        self,
+        name: str,
+        pos: int,
+        func: Optional[Callable[..., Any]],
+        spec: Optional[FunctionSpec],
+        args: List[Node],
+    ) -> Node:
+        """
+        Build a function call or conditional from its parsed arguments.
+
+        Calls to small user functions are replaced by their body with the
+        arguments substituted for the parameters. The number of arguments is
+        checked against the arity the function declares.
+
+        Returns:
+            The Call node, folded when its arguments are constant and the
+            function is pure
+        """
+        if func is None:
+            return self._conditional(name, pos, args)
+        if spec.arity is not None and len(args) != spec.arity:
+            raise ExpressionSyntaxError(
+                f"Function '{name}' expects {spec.arity} argument(s), got {len(args)}", pos)
+        if isinstance(func, UserFunction) and func.can_inline(args):
+            return self._substitute(func.body, dict(zip(func.parameters, args)))
+        return self._fold(Call(name, func, tuple(args), spec.pure))
+
+    def _conditional(self, name: str, pos: int, args: List[Node]) -> Node:
+        """
+        Build ``if(condition, then, otherwise)`` or ``piecewise(c1, v1, ..., otherwise)``.
+
+        ``piecewise`` takes the value of the first condition that holds, and
+        becomes nested conditionals. A constant condition keeps only the
+        branch it selects.
+
+        Args:
+            name: ``if`` or ``piecewise``
+            pos: Position of the name
+            args: The parsed arguments
+
+        Returns:
+            The Conditional node, or the selected branch
+        """
+        if name == 'if' and len(args) != 3:
+            raise ExpressionSyntaxError(
+                f"Function 'if' expects 3 argument(s), got {len(args)}", pos)
+        if len(args) < 3 or len(args) % 2 == 0:
+            raise ExpressionSyntaxError(
+                "Function 'piecewise' expects condition/value pairs and a default value", pos)
+        node = args[-1]
+        for index in range(len(args) - 3, -1, -2):
+            node = self._select(args[index], args[index + 1], node)
+        return node
+
+    def parse_definition(self) -> Tuple[str, Tuple[str, ...], Node]:
+        """
+        Parse a function definition such as ``hyp(a, b) = sqrt(a^2 + b^2)``.
+
+        Returns:
+            Tuple of (name, parameter names, body)
+
+        Raises:
+            ExpressionSyntaxError: If the definition is malformed
+            NameError: If the body reads a name that is not a parameter
+        """
+        token = self._next()
+        kind, name, pos = token
+        if kind != NAME:
+            self._unexpected(token)
+        if name in CONDITIONALS or (name in self.functions
+                                    and not isinstance(self.functions[name], UserFunction)):
+            raise ExpressionSyntaxError(f"Cannot redefine built-in function '{name}'", pos)
+        self._expect(LPAREN)
+        parameters: List[str] = []
+        if self._peek_kind() != RPAREN:
+            while True:
+                token = self._next()
+                kind, parameter, pos = token
+                if kind != NAME or parameter in self.functions or parameter in CONDITIONALS:
+                    self._unexpected(token)
+                if parameter in parameters:
+                    raise ExpressionSyntaxError(f"Duplicate parameter '{parameter}'", pos)
+                parameters.append(parameter)
+                if self._peek_kind() != COMMA:
+                    break
+                self.position += 1
+        self._expect(RPAREN)
+        self._expect(ASSIGN)
+
+        body = self.parse_expression(0)
+        if self.position < len(self.tokens):
+            self._unexpected(self.tokens[self.position])
+        for node in walk(body):
+            if isinstance(node, Variable) and node.name not in parameters:
+                raise NameError(f"name '{node.name}' is not defined")
+        return name, tuple(parameters), body
+
+    def _substitute(self, node: Node, bindings: Dict[str, Node]) -> Node:
+        """Copy a function body, replacing parameters by argument nodes."""
+        if isinstance(node, Variable):
+            return bindings[node.name]
+        if isinstance(node, UnaryOp):
+            return self._fold(UnaryOp(node.op, self._substitute(node.operand, bindings)))
+        if isinstance(node, BinaryOp):
+            return self._fold(BinaryOp(node.op, self._substitute(node.left, bindings),
+                                       self._substitute(node.right, bindings)))
+        if isinstance(node, Call):
+            args = tuple(self._substitute(arg, bindings) for arg in node.args)
+            return self._fold(Call(node.name, node.func, args, node.pure))
+        if isinstance(node, Conditional):
+            return self._select(self._substitute(node.condition, bindings),
+                                self._substitute(node.then, bindings),
+                                self._substitute(node.otherwise, bindings))
+        return node
+
+    @staticmethod
+    def _select(condition: Node, then: Node, otherwise: Node) -> Node:
+        """Build a conditional, keeping only the branch a constant condition selects."""
+        if type(condition) is Number:
+            return then if condition.value else otherwise
+        return Conditional(condition, then, otherwise)
+
+    def _fold(self, node: Node) -> Node:
+        """Replace a node whose operands are all numbers by its value."""
+        if not self.folding or (type(node) is Call and not node.pure):
+            return node
+        for child in node.children():
+            if type(child) is not Number:
+                return node
+        # Only calls and powers cost more to compute than to look up
+        memo = self.memo
+        if memo is not None and not (type(node) is Call or node.op == '**'):
+            memo = None
+        if memo is not None:
+            key = _fold_key(node)
+            value = memo.get(key, _UNFOLDED)
+            if value is not _UNFOLDED:
+                return node if value is _FAILED else Number(value)
+        try:
+            value = node.evaluate()
+        except _FOLDING_ERRORS:
+            value = _FAILED
+        if memo is not None:
+            memo[key] = value
+        return node if value is _FAILED else Number(value)
+
+    def _next(self) -> Token:
+        """Consume and return the next token."""
+        if self.position >= len(self.tokens):
+            raise ExpressionSyntaxError("Unexpected end of expression", self.source_length)
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def _peek_kind(self) -> Optional[str]:
+        """Get the kind of the next token without consuming it."""
+        if self.position < len(self.tokens):
+            return self.tokens[self.position][0]
+        return None
+
+    def _expect(self, kind: str):
+        """Consume the next token, which must be of the given kind."""
+        token = self._next()
+        if token[0] != kind:
+            self._unexpected(token)
+
+    @staticmethod
+    def _unexpected(token: Token):
+        """Raise a syntax error for a token that cannot appear where it is."""
+        kind, value, pos = token
+        text = repr(value) if kind == NUMBER else value
+        raise ExpressionSyntaxError(f"Unexpected '{text}'", pos)
+
+
+def _fold_key(node: Node) -> Tuple[Any, ...]:
+    """Identify a node whose operands are numbers by its operation and operand values."""
+    if isinstance(node, Call):
+        key: Tuple[Any, ...] = (Call, node.name, id(node.func))
+    else:
+        key = (type(node), node.op)
+    for child in node.children():
+        value = child.value
+        # Types keep 1 and 1.0 apart, and the sign keeps 0.0 and -0.0 apart
+        key += (type(value), value, type(value) is float and math.copysign(1.0, value))
+    return key
+
+
+def parse(
+    tokens: List[Token],
+    functions: Mapping[str, Callable[..., Any]],
+    source_length: Optional[int] = None,
+    memo: Optional[Dict[Any, Any]] = None,
+    fold: bool = True,
+) -> Node:
+    """
+    Parse tokens into an expression tree.
+
+    Args:
+        tokens: Tokens produced by :func:`src.lexer.tokenize`
+        functions: Mapping of callable names to functions
+        source_length: Length of the source, used to report errors at its end
+        memo: Values of constant subtrees shared between parses
+        fold: Whether to fold constant subtrees while parsing
+
+    Returns:
+        The root node of the expression
+    """
+    return Parser(tokens, functions, source_length, memo, fold).parse()
+
+
+def parse_definition(
+    tokens: List[Token],
+    functions: Mapping[str, Callable[..., Any]],
+    source_length: Optional[int] = None,
+) -> Tuple[str, Tuple[str, ...], Node]:
+    """
+    Parse tokens of a function definition.
+
+    Args:
+        tokens: Tokens produced by :func:`src.lexer.tokenize`
+        functions: Mapping of callable names to functions
+        source_length: Length of the source, used to report errors at its end
+
+    Returns:
+        Tuple of (name, parameter names, body)
+    """
+    return Parser(tokens, functions, source_length).parse_definition()
@@ -0,0 +1,675 @@
+"""High-precision evaluation: floats when they are accurate enough, Decimal otherwise."""
+
+import decimal
+import math
+import sys
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from .functions import UserFunction
+from .integers import factorial
+from .nodes import (
+    COMPARISONS, BinaryOp, Conditional, Local, Node, Number, Script, UnaryOp, Variable,
+    evaluate
+)
+
+
+# Unit roundoff of float arithmetic: a rounded result is within this
+# fraction of the exact one
+_UNIT = sys.float_info.epsilon / 2
+
+# Absolute rounding error of results in the subnormal range
+_TINY = sys.float_info.min * sys.float_info.epsilon
+
+# Largest integer every smaller one of which converts to a float exactly
+_EXACT_INTS = 2 ** 53
+
+# Error of the math library functions, in units of roundoff
+_LIBRARY_ERROR = 4 * _UNIT
+
+# Digits carried beyond those requested while evaluating with Decimal
+GUARD_DIGITS = 10
+
+# Evaluations at doubling precisions before giving up on two agreeing
+_MAX_RETRIES = 4
+
+# Markers on the stack of :func:`bound_float`
+_APPLY, _SELECT = range(2)
+
+# A float value and a bound of its absolute error
+_Bounded = Tuple[Any, float]
+
+
+class _Undecided(Exception):
+    """Raised when the rounding error could change a discrete decision."""
+
+
+def bound_float(node: Node) -> Optional[_Bounded]:
+    """
+    Evaluate a tree in floats along with a bound of the rounding error.
+
+    Every operation adds its own rounding to the errors it inherits from
+    its operands, e.g. ``|a|*eb + |b|*ea + ea*eb + |a*b|*u`` for ``a * b``,
+    with ``u`` the unit roundoff. Integer arithmetic is exact. Functions
+    propagate the error through a bound of their derivative.
+
+    Args:
+        node: The root of a tree parsed without constant folding
+
+    Returns:
+        Tuple of (value, bound of its absolute error), or None when floats
+        cannot decide the result: a comparison, a condition or a rounding
+        function too close to its boundary, an error or overflow that the
+        exact value might not have, or a function without an error bound
+    """
+    try:
+        if isinstance(node, Script):
+            frame: List[Any] = [None] * len(node.names)
+            if node.free:
+                return None
+            result: _Bounded = (None, 0.0)
+            for index, statement in node.statements:
+                result = _bound(statement, frame)
+                if index is not None:
+                    frame[index] = result
+            return result
+        return _bound(node, None)
+    except (_Undecided, ArithmeticError, ValueError, TypeError, LookupError, NameError):
+        # Decided by the exact evaluation, which raises the error if it is real
+        return None
+
+
+def _bound(node: Node, env: Any) -> _Bounded:
+    """Evaluate a tree iteratively, as :func:`src.nodes.evaluate` does, with error bounds."""
+    values: List[_Bounded] = []
+    stack: List[Any] = [node]
+    while stack:
+        node = stack.pop()
+        kind = type(node)
+        if kind is tuple:
+            marker, node = node
+            if marker == _SELECT:
+                condition, error = values.pop()
+                if _undecided(condition, error):
+                    raise _Undecided
+                stack.append(node.then if condition else node.otherwise)
+                continue
+            start = len(values) - len(node.children())
+            args = values[start:]
+            del values[start:]
+            values.append(_apply(node, args))
+        elif kind is Number:
+            values.append(_literal(node.value))
+        elif kind is Variable:
+            values.append(env[node.name])
+        elif kind is Local:
+            values.append(env[node.index])
+        elif kind is Conditional:
+            stack += ((_SELECT, node), node.condition)
+        else:
+            stack.append((_APPLY, node))
+            stack.extend(reversed(node.children()))
+    return values[-1]
+
+
+def _literal(value: Any) -> _Bounded:
+    """Bound the error of a literal or constant, rounded to a float by the lexer."""
+    if type(value) is float and not (value.is_integer() and abs(value) <= _EXACT_INTS):
+        return value, abs(value) * _UNIT
+    return value, 0.0
+
+
+def _rounding(result: Any) -> float:
+    """Bound the error of rounding an exact result to a float."""
+    if isinstance(result, int):
+        return 0.0
+    if isinstance(result, complex):
+        raise _Undecided
+    return abs(result) * _UNIT + _TINY
+
+
+def _converted(value: Any, error: float) -> float:
+    """Add the error of converting an int operand to a float."""
+    if isinstance(value, int) and abs(value) > _EXACT_INTS:
+        return error + abs(value) * _UNIT
+    return error
+
+
+def _undecided(distance: Any, error: float) -> bool:
+    """Check whether a value within ``error`` of ``distance`` could have either sign."""
+    return error != 0 and not abs(distance) > error
+
+
+def _apply(node: Node, args: List[_Bounded]) -> _Bounded:
+    """Compute one operation and bound the error of its result."""
+    if isinstance(node, BinaryOp):
+        (a, ea), (b, eb) = args
+        return _binary(node.op, a, ea, b, eb)
+    if isinstance(node, UnaryOp):
+        value, error = args[0]
+        return node.func(value), error
+    func = node.func
+    if isinstance(func, UserFunction):
+        return _bound(func.body, dict(zip(func.parameters, args)))
+    rule = _DERIVATIVES.get(node.name)
+    if len(args) == 1:
+        (x, ex), = args
+        if rule is not None:
+            result = func(x)
+            if ex == 0 and isinstance(x, int) and isinstance(result, int):
+                return result, 0.0
+            slope = rule(x, ex)
+            return result, 2 * slope * _converted(x, ex) + abs(result) * _LIBRARY_ERROR + _TINY
+        if node.name in _STEPS:
+            return _step(node.name, func, x, ex)
+    raise _Undecided
+
+
+def _binary(op: str, a: Any, ea: float, b: Any, eb: float) -> _Bounded:
+    """Compute a binary operation and bound the error of its result."""
+    if op in COMPARISONS:
+        # The factor covers the rounding of the difference itself
+        if _undecided(a - b, 2 * (ea + eb)):
+            raise _Undecided
+        return _BINARY[op](a, b), 0.0
+    result = _BINARY[op](a, b)
+    exact = isinstance(result, int)
+    if not exact:
+        ea = _converted(a, ea)
+        eb = _converted(b, eb)
+    if op in ('+', '-'):
+        return result, ea + eb + _rounding(result)
+    if op == '*':
+        return result, abs(a) * eb + abs(b) * ea + ea * eb + _rounding(result)
+    if op == '/':
+        if not eb < abs(b):
+            raise _Undecided
+        return result, (abs(a) * eb + abs(b) * ea) / (abs(b) * (abs(b) - eb)) + _rounding(result)
+    if op in ('//', '%'):
+        if ea or eb:
+            # The floor of the quotient must not depend on the errors
+            quotient = a / b
+            if not eb < abs(b):
+                raise _Undecided
+            error = (abs(a) * eb + abs(b) * ea) / (abs(b) * (abs(b) - eb)) + abs(quotient) * _UNIT
+            if _undecided(quotient - round(quotient), error):
+                raise _Undecided
+        if op == '//':
+            return result, 0.0
+        return result, ea + abs(a // b) * eb + _rounding(result)
+    # Powers
+    if exact:
+        return result, 0.0
+    if ea == 0 and eb == 0 and isinstance(b, int):
+        # Only the exact base may round
+        return result, abs(result) * _LIBRARY_ERROR + _TINY
+    if not ea < abs(a) or (a < 0 and eb):
+        raise _Undecided
+    relative = abs(b) * ea / (abs(a) - ea) + abs(math.log(abs(a))) * eb
+    if relative > 0.5:
+        raise _Undecided
+    # |exp(t) - 1| <= 2|t| for |t| <= 1/2
+    return result, abs(result) * (2 * relative + _LIBRARY_ERROR) + _TINY
+
+
+def _step(name: str, func: Callable[[Any], Any], x: Any, ex: float) -> _Bounded:
+    """Compute a piecewise constant function, exact unless ``x`` is near a step."""
+    if ex:
+        if name == 'round':
+            # Steps at the halves
+            edge = math.floor(x) + 0.5
+        elif name == 'factorial':
+            raise _Undecided
+        else:
+            edge = round(x)
+        if _undecided(x - edge, ex):
+            raise _Undecided
+    return func(x), 0.0
+
+
+def _slope_sqrt(x: Any, ex: float) -> float:
+    if not ex < x:
+        raise _Undecided
+    return 0.5 / math.sqrt(x - ex)
+
+
+def _slope_log(x: Any, ex: float) -> float:
+    if not ex < x:
+        raise _Undecided
+    return 1 / (x - ex)
+
+
+def _slope_arcsine(x: Any, ex: float) -> float:
+    if not abs(x) + ex < 1:
+        raise _Undecided
+    return 1 / math.sqrt(1 - (abs(x) + ex) ** 2)
+
+
+def _slope_tan(x: Any, ex: float) -> float:
+    if not ex < 0.5:
+        raise _Undecided
+    near = min(abs(math.cos(x)) - ex, 1.0)
+    if not near > 0:
+        raise _Undecided
+    return 1 / (near * near)
+
+
+def _slope_exp(x: Any, ex: float) -> float:
+    return math.exp(x + ex)
+
+
+def _slope_cosh(x: Any, ex: float) -> float:
+    return math.cosh(abs(x) + ex)
+
+
+# Bound of |f'| near x, given x and its error, for the built-in functions;
+# the propagated error is twice the bound times the error of x
+_DERIVATIVES: Dict[str, Callable[[Any, float], float]] = {
+    'sin': lambda x, ex: 1.0,
+    'cos': lambda x, ex: 1.0,
+    'tan': _slope_tan,
+    'asin': _slope_arcsine,
+    'acos': _slope_arcsine,
+    'atan': lambda x, ex: 1.0,
+    'sinh': _slope_cosh,
+    'cosh': _slope_cosh,
+    'tanh': lambda x, ex: 1.0,
+    'sqrt': _slope_sqrt,
+    'exp': _slope_exp,
+    'ln': _slope_log,
+    'log': lambda x, ex: _slope_log(x, ex) / math.log(10),
+    'log10': lambda x, ex: _slope_log(x, ex) / math.log(10),
+    'abs': lambda x, ex: 1.0,
+    'degrees': lambda x, ex: 180 / math.pi,
+    'radians': lambda x, ex: math.pi / 180,
+}
+
+# Functions constant between steps
+_STEPS = frozenset(('floor', 'ceil', 'round', 'factorial'))
+
+_BINARY = {
+    '+': lambda a, b: a + b,
+    '-': lambda a, b: a - b,
+    '*': lambda a, b: a * b,
+    '/': lambda a, b: a / b,
+    '//': lambda a, b: a // b,
+    '%': lambda a, b: a % b,
+    '**': lambda a, b: a ** b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+}
+
+
+def accurate(bounded: Optional[_Bounded], digits: int) -> bool:
+    """
+    Check whether a bounded float result is correct to ``digits`` significant digits.
+
+    The error must be below a tenth of a unit in the last requested digit,
+    so that rounding the float to ``digits`` digits gives the correctly
+    rounded result except within that tenth of a tie.
+
+    Args:
+        bounded: The result of :func:`bound_float`
+        digits: Significant digits required
+
+    Returns:
+        True if the float result can be used
+    """
+    if bounded is None:
+        return False
+    value, error = bounded
+    if isinstance(value, int):
+        return error == 0
+    return math.isfinite(value) and error <= abs(value) * 10.0 ** -digits
+
+
+def round_digits(value: Any, digits: int) -> Any:
+    """
+    Round a result to ``digits`` significant digits.
+
+    Args:
+        value: An int, bool, float or Decimal
+        digits: Significant digits to keep
+
+    Returns:
+        Ints and bools unchanged, other numbers as a rounded Decimal
+    """
+    if isinstance(value, int):
+        return value
+    with decimal.localcontext(decimal.Context(prec=digits)):
+        return +_decimal(value)
+
+
+def converge(compute: Callable[[], Any], digits: int) -> Any:
+    """
+    Compute a result with Decimals until it is stable to ``digits`` digits.
+
+    ``compute`` runs in a local context of ``digits`` plus guard digits,
+    and again at twice the precision until two consecutive results agree
+    once rounded, so errors in the last guard digits do not show. A
+    result that never agrees but shrinks with the working precision, such
+    as ``sin(pi)``, is zero to within that precision and gives zero.
+
+    Args:
+        compute: Evaluates with the precision of the current decimal context
+        digits: Significant digits required
+
+    Returns:
+        The result rounded with :func:`round_digits`; the last one computed
+        if no two results agree within the retries
+    """
+    working = digits + GUARD_DIGITS
+    previous = None
+    for _ in range(_MAX_RETRIES):
+        with decimal.localcontext(decimal.Context(prec=working)):
+            result = round_digits(compute(), digits)
+        if result == previous and type(result) is type(previous):
+            return result
+        previous = result
+        working *= 2
+    if isinstance(result, Decimal) and result.adjusted() < -working // 4:
+        return Decimal(0)
+    return result
+
+
+def decimal_constants(constants: Mapping[str, Any]) -> Dict[str, Decimal]:
+    """
+    Get the constants as Decimals at the precision of the current context.
+
+    Floats equal to pi, e, tau or the golden ratio are recomputed to the
+    full precision; other constants are converted exactly.
+
+    Args:
+        constants: Mapping of constant names to float values
+
+    Returns:
+        Mapping of the same names to Decimal values
+    """
+    pi = decimal_pi()
+    known = {
+        math.pi: pi,
+        math.e: Decimal(1).exp(),
+        math.tau: 2 * pi,
+        (1 + math.sqrt(5)) / 2: (1 + Decimal(5).sqrt()) / 2,
+    }
+    return {name: known.get(value, _decimal(value)) for name, value in constants.items()}
+
+
+def evaluate_decimal(node: Node) -> Any:
+    """
+    Evaluate a tree with Decimal arithmetic in the current context.
+
+    Literals should be Decimals (see the ``real`` argument of
+    :func:`src.lexer.tokenize`) and constants from :func:`decimal_constants`.
+    Integer arithmetic stays exact, divisions and powers of integers give
+    Decimals, and ``//`` and ``%`` round towards negative infinity as for
+    floats. The built-in functions are computed to the context precision;
+    other functions are called with the Decimal arguments and float
+    results are converted.
+
+    Args:
+        node: The root of the expression tree or script
+
+    Returns:
+        An int, bool or Decimal
+
+    Raises:
+        ValueError: For arguments outside a function's domain
+        ZeroDivisionError: For a division by zero
+    """
+    if isinstance(node, Script):
+        return node.execute(None, _apply_decimal)[-1]
+    return evaluate(node, None, _apply_decimal)
+
+
+def _apply_decimal(node: Node, args: List[Any]) -> Any:
+    """Compute one operation with Decimals."""
+    try:
+        if isinstance(node, BinaryOp):
+            return _binary_decimal(node, *args)
+        if isinstance(node, UnaryOp):
+            return node.func(*args)
+        func = node.func
+        if isinstance(func, UserFunction):
+            return evaluate(func.body, dict(zip(func.parameters, args)), _apply_decimal)
+        implementation = DECIMAL_FUNCTIONS.get(node.name)
+        if implementation is not None:
+            return implementation(*args)
+        result = func(*args)
+        return _decimal(result) if isinstance(result, float) else result
+    except decimal.Overflow:
+        raise OverflowError("math range error") from None
+    except decimal.InvalidOperation:
+        raise ValueError("math domain error") from None
+
+
+def _binary_decimal(node: BinaryOp, left: Any, right: Any) -> Any:
+    """Compute a binary operation, keeping ints exact and the float semantics of division."""
+    op = node.op
+    if op in ('/', '//', '%') and not right:
+        raise ZeroDivisionError("division by zero")
+    if op == '/':
+        return _decimal(left) / right
+    if op == '**':
+        if isinstance(right, int) and right >= 0:
+            return left ** right
+        if not left and right < 0:
+            raise ZeroDivisionError("0.0 cannot be raised to a negative power")
+        return _decimal(left) ** right
+    if op in ('//', '%') and (isinstance(left, Decimal) or isinstance(right, Decimal)):
+        # Decimal division truncates towards zero
+        left = _decimal(left)
+        quotient, remainder = divmod(left, right)
+        if remainder and (remainder < 0) != (right < 0):
+            quotient -= 1
+            remainder += right
+        return quotient if op == '//' else remainder
+    return node.func(left, right)
+
+
+def _decimal(value: Any) -> Decimal:
+    """Convert a number to a Decimal exactly."""
+    return value if isinstance(value, Decimal) else Decimal(value)
+
+
+# pi by working precision
+_PI: Dict[int, Decimal] = {}
+
+
+def decimal_pi() -> Decimal:
+    """Compute pi to the precision of the current context."""
+    precision = decimal.getcontext().prec
+    pi = _PI.get(precision)
+    if pi is None:
+        # The series of the decimal module documentation
+        with decimal.localcontext() as context:
+            context.prec = precision + 2
+            three = Decimal(3)
+            last, t, s, n, na, d, da = 0, three, three, 1, 0, 0, 24
+            while s != last:
+                last = s
+                n, na = n + na, na + 8
+                d, da = d + da, da + 32
+                t = (t * n) / d
+                s += t
+        pi = _PI[precision] = +s
+    return pi
+
+
+def _sin(x: Any) -> Decimal:
+    x = _decimal(x)
+    with decimal.localcontext() as context:
+        # Reducing a large argument cancels its integer digits
+        context.prec += max(x.adjusted(), 0) + 2
+        x = x.remainder_near(2 * decimal_pi())
+        total = _series(x, x, 1)
+    return +total
+
+
+def _cos(x: Any) -> Decimal:
+    x = _decimal(x)
+    with decimal.localcontext() as context:
+        context.prec += max(x.adjusted(), 0) + 2
+        x = x.remainder_near(2 * decimal_pi())
+        total = _series(Decimal(1), x, 0)
+    return +total
+
+
+def _series(term: Decimal, x: Decimal, n: int) -> Decimal:
+    """Sum the alternating Taylor series of sin (n=1) or cos (n=0) until it converges."""
+    square = x * x
+    total = term
+    while True:
+        n += 2
+        term = -term * square / (n * (n - 1))
+        following = total + term
+        if following == total:
+            return total
+        total = following
+
+
+def _tan(x: Any) -> Decimal:
+    with decimal.localcontext() as context:
+        context.prec += 2
+        result = _sin(x) / _cos(x)
+    return +result
+
+
+def _atan(x: Any) -> Decimal:
+    x = _decimal(x)
+    with decimal.localcontext() as context:
+        context.prec += 5
+        # atan(x) = 2 atan(x / (1 + sqrt(1 + x^2))) until the series converges fast
+        halvings = 0
+        while abs(x) > Decimal('0.1'):
+            x = x / (1 + (1 + x * x).sqrt())
+            halvings += 1
+        square = x * x
+        term = total = x
+        n = 1
+        while True:
+            term = -term * square
+            n += 2
+            following = total + term / n
+            if following == total:
+                break
+            total = following
+        total *= 2 ** halvings
+    return +total
+
+
+def _asin(x: Any) -> Decimal:
+    x = _decimal(x)
+    if abs(x) > 1:
+        raise ValueError("math domain error")
+    with decimal.localcontext() as context:
+        context.prec += 5
+        if abs(x) == 1:
+            result = decimal_pi() / 2 * x
+        else:
+            result = _atan(x / (1 - x * x).sqrt())
+    return +result
+
+
+def _acos(x: Any) -> Decimal:
+    with decimal.localcontext() as context:
+        context.prec += 5
+        result = decimal_pi() / 2 - _asin(x)
+    return +result
+
+
+def _hyperbolic(x: Any, sign: int) -> Decimal:
+    """Compute ``(exp(x) + sign * exp(-x)) / 2``."""
+    x = _decimal(x)
+    with decimal.localcontext() as context:
+        # Near zero, exp(x) - exp(-x) cancels the leading digits
+        context.prec += max(-x.adjusted(), 0) + 3
+        grown = x.exp()
+        result = (grown + sign / grown) / 2
+    return +result
+
+
+def _tanh(x: Any) -> Decimal:
+    x = _decimal(x)
+    precision = decimal.getcontext().prec
+    if abs(x) > 2 * precision:
+        # Within 10**-precision of its limit
+        return Decimal(1).copy_sign(x)
+    with decimal.localcontext() as context:
+        context.prec += max(-x.adjusted(), 0) + 3
+        grown = (2 * x).exp()
+        result = (grown - 1) / (grown + 1)
+    return +result
+
+
+def _positive(x: Any) -> Decimal:
+    x = _decimal(x)
+    if not x > 0:
+        raise ValueError("math domain error")
+    return x
+
+
+def _ln(x: Any, base: Any = None) -> Decimal:
+    if base is None:
+        return _positive(x).ln()
+    with decimal.localcontext() as context:
+        context.prec += 2
+        result = _positive(x).ln() / _positive(base).ln()
+    return +result
+
+
+def _log10(x: Any) -> Decimal:
+    return _positive(x).log10()
+
+
+def _round(x: Any, ndigits: Any = None) -> Any:
+    if ndigits is None:
+        return round(x)
+    if isinstance(ndigits, Decimal) and ndigits == ndigits.to_integral_value():
+        ndigits = int(ndigits)
+    return round(x, ndigits)
+
+
+def _degrees(x: Any) -> Decimal:
+    with decimal.localcontext() as context:
+        context.prec += 2
+        result = _decimal(x) * 180 / decimal_pi()
+    return +result
+
+
+def _radians(x: Any) -> Decimal:
+    with decimal.localcontext() as context:
+        context.prec += 2
+        result = _decimal(x) * decimal_pi() / 180
+    return +result
+
+
+# Decimal implementations of the built-in functions, correct to the
+# precision of the current context
+DECIMAL_FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    'sin': _sin,
+    'cos': _cos,
+    'tan': _tan,
+    'asin': _asin,
+    'acos': _acos,
+    'atan': _atan,
+    'sinh': lambda x: _hyperbolic(x, -1),
+    'cosh': lambda x: _hyperbolic(x, 1),
+    'tanh': _tanh,
+    'sqrt': lambda x: _decimal(x).sqrt(),
+    'exp': lambda x: _decimal(x).exp(),
+    'log': _log10,
+    'log10': _log10,
+    'ln': _ln,
+    'abs': abs,
+    'floor': math.floor,
+    'ceil': math.ceil,
+    'round': _round,
+    'degrees': _degrees,
+    'radians': _radians,
+    'factorial': factorial,
+}
@@ -0,0 +1,110 @@
+"""Exact rational arithmetic with fractions.Fraction."""
+
+import math
+from fractions import Fraction
+from typing import Any, Callable, Dict, List
+
+from .functions import UserFunction
+from .integers import factorial
+from .nodes import BinaryOp, Node, Script, UnaryOp, evaluate
+
+
+def rational_literal(text: str) -> Any:
+    """
+    Convert the text of a literal with a decimal point exactly.
+
+    Used as the ``real`` argument of :func:`src.lexer.tokenize`.
+
+    Args:
+        text: The literal, e.g. ``'0.1'``
+
+    Returns:
+        An int for integral literals such as ``'2.0'``, otherwise a Fraction
+    """
+    return _normalize(Fraction(text))
+
+
+def evaluate_exact(node: Node) -> Any:
+    """
+    Evaluate a tree with exact rational arithmetic.
+
+    Ints stay native ints as long as the results are integers, e.g. for
+    ``+ - *`` and exact divisions; other quotients and negative powers
+    become Fractions, and Fractions that are integers become ints again.
+    ``abs``, ``floor``, ``ceil``, ``round``, ``factorial`` and ``sqrt`` of
+    perfect squares are exact; other functions and the irrational constants
+    give floats, which the rest of the expression then computes with.
+
+    The tree should be parsed without constant folding, which computes in
+    floats, and with literals from :func:`rational_literal`.
+
+    Args:
+        node: The root of the expression tree or script
+
+    Returns:
+        An int, Fraction, bool or float
+
+    Raises:
+        ZeroDivisionError: For a division by zero
+    """
+    if isinstance(node, Script):
+        return node.execute(None, _apply)[-1]
+    return evaluate(node, None, _apply)
+
+
+def _apply(node: Node, args: List[Any]) -> Any:
+    """Compute one operation, exactly when the operands are rational."""
+    kind = type(node)
+    if kind is BinaryOp:
+        left, right = args
+        op = node.op
+        if op in ('/', '//', '%') and not right:
+            raise ZeroDivisionError("division by zero")
+        if type(left) is int and type(right) is int:
+            # Native ints, without Fraction overhead
+            if op == '/':
+                quotient, remainder = divmod(left, right)
+                return Fraction(left, right) if remainder else quotient
+            if op == '**' and right < 0:
+                if not left:
+                    raise ZeroDivisionError("0.0 cannot be raised to a negative power")
+                return _normalize(Fraction(1, left ** -right))
+            return node.func(left, right)
+        return _normalize(node.func(left, right))
+    if kind is UnaryOp:
+        return node.func(args[0])
+    func = node.func
+    if isinstance(func, UserFunction):
+        return evaluate(func.body, dict(zip(func.parameters, args)), _apply)
+    exact = EXACT_FUNCTIONS.get(node.name)
+    if exact is not None:
+        return _normalize(exact(*args))
+    return func(*args)
+
+
+def _normalize(value: Any) -> Any:
+    """Turn a Fraction that is an integer into an int."""
+    if type(value) is Fraction and value.denominator == 1:
+        return value.numerator
+    return value
+
+
+def _sqrt(x: Any) -> Any:
+    """Get the exact square root of a perfect square, or the float square root."""
+    if isinstance(x, (int, Fraction)) and x >= 0:
+        numerator, denominator = x.numerator, x.denominator
+        root, denominator_root = math.isqrt(numerator), math.isqrt(denominator)
+        if root * root == numerator and denominator_root * denominator_root == denominator:
+            return Fraction(root, denominator_root)
+    return math.sqrt(x)
+
+
+# Functions with an exact result for rational arguments
+EXACT_FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    'abs': abs,
+    'floor': math.floor,
+    'ceil': math.ceil,
+    'round': round,
+    'factorial': factorial,
+    'sqrt': _sqrt,
+}
@@ -0,0 +1,194 @@
+"""Registry of the functions callable from expressions, with their metadata."""
+
+import inspect
+from collections import ChainMap
+from typing import (
+    Any, Callable, Dict, Iterator, Mapping, MutableMapping, NamedTuple, Optional, Union
+)
+
+from .functions import UserFunction
+
+
+class FunctionSpec(NamedTuple):
+    """
+    A function callable from expressions and what the compilers may assume about it.
+
+    Attributes:
+        function: The scalar implementation
+        arity: Number of arguments, checked while parsing; None accepts any number
+        pure: True if the result depends only on the arguments and calling has
+            no side effects, so calls may be folded, shared and memoized
+        vectorized: Element-wise implementation over NumPy arrays, or the
+            name of a function of the ``numpy`` module; None if there is none
+        cost: Work of one call relative to an arithmetic operation
+    """
+
+    function: Callable[..., Any]
+    arity: Optional[int] = 1
+    pure: bool = True
+    vectorized: Union[str, Callable[..., Any], None] = None
+    cost: int = 1
+
+
+class FunctionRegistry(MutableMapping[str, Callable[..., Any]]):
+    """
+    A mapping of function names to functions that also holds their FunctionSpec.
+
+    It behaves as a plain ``name -> callable`` dictionary, so existing code
+    reading or assigning ``Calculator.FUNCTIONS[name]`` keeps working;
+    functions assigned that way get default metadata. :meth:`register`
+    declares the metadata explicitly.
+
+    Example:
+        >>> @Calculator.FUNCTIONS.register("sinc", cost=4, vectorized="sinc")
+        ... def sinc(x):
+        ...     return math.sin(math.pi * x) / (math.pi * x) if x else 1.0
+        >>> Calculator.FUNCTIONS.spec("sinc").arity
+        1
+    """
+
+    def __init__(self, functions: Optional[Mapping[str, Any]] = None):
+        """
+        Initialize the registry.
+
+        Args:
+            functions: Mapping of names to FunctionSpecs or plain functions
+        """
+        self._specs: Dict[str, FunctionSpec] = {}
+        if functions:
+            self.update(functions)
+
+    def register(
+        self,
+        name: str,
+        function: Optional[Callable[..., Any]] = None,
+        arity: Optional[int] = None,
+        pure: bool = True,
+        vectorized: Union[str, Callable[..., Any], None] = None,
+        cost: int = 1,
+    ) -> Any:
+        """
+        Register a function with its metadata.
+
+        Without ``function`` this returns a decorator registering the
+        decorated function.
+
+        Args:
+            name: The name expressions call the function by
+            function: The scalar implementation
+            arity: Number of arguments; inferred from the signature if None
+            pure: Whether the function is free of side effects and deterministic
+            vectorized: Element-wise NumPy implementation, or the name of a
+                ``numpy`` function
+            cost: Work of one call relative to an arithmetic operation
+
+        Returns:
+            The FunctionSpec registered, or a decorator
+        """
+        if function is None:
+            def decorator(function: Callable[..., Any]) -> Callable[..., Any]:
+                self.register(name, function, arity, pure, vectorized, cost)
+                return function
+            return decorator
+        if arity is None:
+            arity = infer_arity(function)
+        spec = FunctionSpec(function, arity, pure, vectorized, cost)
+        self._specs[name] = spec
+        return spec
+
+    def spec(self, name: str) -> FunctionSpec:
+        """
+        Get the metadata of a function.
+
+        Args:
+            name: The function name
+
+        Returns:
+            The FunctionSpec of the function
+
+        Raises:
+            KeyError: If no function has that name
+        """
+        return self._specs[name]
+
+    def __getitem__(self, name: str) -> Callable[..., Any]:
+        return self._specs[name].function
+
+    def __setitem__(self, name: str, function: Any):
+        if isinstance(function, FunctionSpec):
+            self._specs[name] = function
+        else:
+            self.register(name, function)
+
+    def __delitem__(self, name: str):
+        del self._specs[name]
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._specs
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._specs)
+
+    def __len__(self) -> int:
+        return len(self._specs)
+
+    def __repr__(self) -> str:
+        return f"FunctionRegistry({sorted(self._specs)!r})"
+
+
+def describe(functions: Mapping[str, Callable[..., Any]], name: str) -> FunctionSpec:
+    """
+    Get the metadata of a function in any mapping of functions.
+
+    Registries and ChainMaps of them report the declared FunctionSpec; plain
+    dictionaries get a spec inferred from the function. User functions are
+    pure when their body is.
+
+    Args:
+        functions: A registry, a ChainMap of mappings or a plain mapping
+        name: The function name
+
+    Returns:
+        The FunctionSpec of the function
+
+    Raises:
+        KeyError: If no function has that name
+    """
+    maps = functions.maps if isinstance(functions, ChainMap) else (functions,)
+    for mapping in maps:
+        if name not in mapping:
+            continue
+        if isinstance(mapping, ChainMap):
+            return describe(mapping, name)
+        if isinstance(mapping, FunctionRegistry):
+            return mapping.spec(name)
+        function = mapping[name]
+        if isinstance(function, UserFunction):
+            return FunctionSpec(function, len(function.parameters), function.pure,
+                                cost=function.size)
+        return FunctionSpec(function, infer_arity(function))
+    raise KeyError(name)
+
+
+def infer_arity(function: Callable[..., Any]) -> Optional[int]:
+    """
+    Get the number of arguments a function requires, if it is fixed.
+
+    Args:
+        function: Any callable
+
+    Returns:
+        The number of positional parameters, or None when the signature is
+        unknown or takes optional or variable arguments
+    """
+    try:
+        parameters = inspect.signature(function).parameters.values()
+    except (TypeError, ValueError):
+        return None
+    arity = 0
+    for parameter in parameters:
+        if (parameter.kind not in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD)
+                or parameter.default is not parameter.empty):
+            return None
+        arity += 1
+    return arity
@@ -0,0 +1,486 @@
+"""NumPy-vectorized evaluation of compiled expressions (optional dependency)."""
+
+import math
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .cache import MemoizedFunction
+from .codegen import specialize
+from .functions import UserFunction
+from .nodes import (
+    BinaryOp, Call, Conditional, Local, Node, Number, Script, UnaryOp, Variable, references, walk
+)
+from .registry import describe
+
+
+# True when NumPy is installed and whole-array evaluation is available
+HAS_NUMPY = np is not None
+
+# Elements per block of the blocked kernel: 8192 float64 values (64 KiB) per
+# scratch buffer keep the working set of typical expressions in L2 cache
+DEFAULT_BLOCK_SIZE = 8192
+
+# Vectorized equivalents of the operators, built on first use
+_UNARY_UFUNCS: Dict[str, Callable[..., Any]] = {}
+_BINARY_UFUNCS: Dict[str, Callable[..., Any]] = {}
+_factorials: Optional[Any] = None
+
+# Largest n whose factorial is a finite float64
+_MAX_FACTORIAL = 170
+
+
+def array_factorial(values):
+    """
+    Element-wise factorial; inf above 170, NaN for negative or non-integral inputs.
+
+    The 171 finite results are looked up in a precomputed table, so there
+    is no Python-level loop over the elements.
+    """
+    global _factorials
+    if _factorials is None:
+        _factorials = np.array([math.factorial(n) for n in range(_MAX_FACTORIAL + 1)],
+                               dtype=float)
+    values = np.asarray(values, dtype=float)
+    valid = (values >= 0) & (values == np.floor(values))
+    index = np.where(valid & (values <= _MAX_FACTORIAL), values, 0).astype(np.intp)
+    result = np.where(valid, np.where(values <= _MAX_FACTORIAL, _factorials[index], np.inf),
+                      np.nan)
+    return result[()] if result.ndim == 0 else result
+
+
+def numpy_functions() -> Dict[str, Callable[..., Any]]:
+    """
+    Get the NumPy implementation of each function in Calculator.FUNCTIONS.
+
+    The implementations are the ``vectorized`` counterparts declared in the
+    function registry; functions without one are left out.
+
+    Returns:
+        Mapping of function names to ufuncs or vectorized equivalents
+
+    Raises:
+        ImportError: If NumPy is not installed
+    """
+    from .calculator import Calculator
+    if np is None:
+        raise ImportError("NumPy is required for vectorized evaluation. "
+                          "Install it with: pip install numpy")
+    if not _BINARY_UFUNCS:
+        _UNARY_UFUNCS.update({'-': np.negative, '+': np.positive})
+        _BINARY_UFUNCS.update({
+            '+': np.add,
+            '-': np.subtract,
+            '*': np.multiply,
+            '/': np.true_divide,
+            '//': np.floor_divide,
+            '%': np.remainder,
+            '**': np.power,
+            '<': np.less,
+            '<=': np.less_equal,
+            '>': np.greater,
+            '>=': np.greater_equal,
+            '==': np.equal,
+            '!=': np.not_equal,
+        })
+    functions = {}
+    for name in Calculator.FUNCTIONS:
+        vectorized = describe(Calculator.FUNCTIONS, name).vectorized
+        if isinstance(vectorized, str):
+            vectorized = getattr(np, vectorized)
+        if vectorized is not None:
+            functions[name] = vectorized
+    return functions
+
+
+def vectorize(node: Node) -> Callable[..., Any]:
+    """
+    Compile an expression tree into a function over whole NumPy arrays.
+
+    Calls are bound to their ufunc; functions without a vectorized
+    equivalent are wrapped with ``numpy.vectorize``. Each branch of a
+    conditional is only evaluated on the elements selecting it (see
+    :func:`masked_select`).
+
+    Args:
+        node: The root of the expression tree
+
+    Returns:
+        The vectorized function, taking variables positionally like
+        :func:`src.codegen.specialize`
+    """
+    return specialize(node, _vectorized_functions(node), select=masked_select)
+
+
+def masked_select(condition: Any, then: Callable[..., Any], otherwise: Callable[..., Any],
+                  *values: Any) -> Any:
+    """
+    Evaluate a conditional element-wise, each branch on its elements only.
+
+    Unlike ``numpy.where``, a branch is not computed for the elements the
+    other branch selects, which saves its work and keeps its errors (e.g.
+    ``log`` of negative numbers) out of the result.
+
+    Args:
+        condition: Array or scalar; elements that are true select ``then``
+        then: Function of ``values`` computing the first branch
+        otherwise: Function of ``values`` computing the second branch
+        *values: The arrays and scalars the branches read
+
+    Returns:
+        A float64 array of the broadcast shape, or the selected branch's
+        value for a scalar condition
+
+    Example:
+        >>> masked_select(x > 0, lambda x: numpy.log(x), lambda x: 0.0, x)
+    """
+    condition = np.asarray(condition)
+    if condition.ndim == 0:
+        return then(*values) if condition else otherwise(*values)
+    shape = np.broadcast(condition, *values).shape
+    mask = np.broadcast_to(condition, shape).astype(bool)
+    result = np.empty(shape, dtype=float)
+    for selected, branch in ((mask, then), (~mask, otherwise)):
+        if selected.any():
+            result[selected] = branch(*[np.broadcast_to(value, shape)[selected]
+                                        if np.ndim(value) else value for value in values])
+    return result
+
+
+# Kinds of instruction operands in the blocked kernel
+_CONSTANT, _INPUT, _REGISTER = range(3)
+
+# Register index meaning "write to the output slice"
+_OUTPUT = -1
+
+# One blocked kernel instruction: (function, whether it takes ``out=``,
+# (operand kind, value) pairs, destination register)
+_Instruction = Tuple[Callable[..., Any], bool, Tuple[Tuple[int, Any], ...], int]
+
+
+class BlockedKernel:
+    """
+    Memory-bounded evaluation of an expression over long 1-D arrays.
+
+    The tree is lowered to a list of ufunc instructions over a small set of
+    registers, each a preallocated scratch buffer of ``block_size`` elements.
+    Inputs are processed one block at a time and every instruction writes
+    into its register through the ufunc ``out=`` argument, so peak memory is
+    a few block-sized buffers whatever the input length. Inputs may be
+    ``numpy.memmap`` arrays and so may ``out``, which lets data larger than
+    RAM stream through.
+
+    Example:
+        >>> kernel = BlockedKernel(Calculator().parse("sqrt(x^2 + y^2)"))
+        >>> x = numpy.memmap("x.f64", dtype=float, mode="r")
+        >>> kernel([x, 2.0])
+    """
+
+    def __init__(self, node: Node, functions: Optional[Dict[str, Callable[..., Any]]] = None,
+                 block_size: int = DEFAULT_BLOCK_SIZE):
+        """
+        Initialize the kernel.
+
+        Args:
+            node: The root of the expression tree
+            functions: Vectorized implementations by function name; defaults
+                to those chosen by :func:`vectorize`
+            block_size: Number of elements processed per block
+        """
+        if block_size < 1:
+            raise ValueError("block_size must be positive.")
+        numpy_functions()
+        self.block_size = block_size
+        self.functions = functions if functions is not None else _vectorized_functions(node)
+        self.variables: Tuple[str, ...] = ()
+        self.instructions: List[_Instruction] = []
+        self.registers = 0
+        if any(isinstance(child, Conditional) for child in walk(node)):
+            # Registers cannot hold subsets of a block, so conditionals run
+            # the masked vectorized function block by block
+            function = specialize(node, self.functions, select=masked_select)
+            self.variables = function.variables
+            inputs = tuple((_INPUT, index) for index in range(len(self.variables)))
+            self.instructions.append((function, False, inputs, _OUTPUT))
+            self._root = (_REGISTER, _OUTPUT)
+            return
+
+        self._inputs: Dict[str, int] = {}
+        self._free: List[int] = []
+        # Script slot -> operand holding its value, and the number of slots
+        # or pending reads pinning each register so that it is not freed
+        self._locals: Dict[int, Tuple[int, Any]] = {}
+        self._pinned: Dict[int, int] = {}
+        # Shared subexpressions already computed, with their pending reads
+        self._references = references(node)
+        self._shared: Dict[int, Tuple[int, Any]] = {}
+        root = self._emit(node)
+        if self.instructions and root == (_REGISTER, self.instructions[-1][3]):
+            # The last instruction writes straight into the output
+            func, has_out, operands, register = self.instructions[-1]
+            self.instructions[-1] = (func, has_out, operands, _OUTPUT)
+            self._root = (_REGISTER, _OUTPUT)
+        else:
+            self._root = root
+        self.variables = tuple(self._inputs)
+
+    def __call__(self, columns: Sequence[Any], out: Optional[Any] = None) -> Any:
+        """
+        Evaluate the kernel block by block.
+
+        Args:
+            columns: One 1-D array or scalar per variable, in ``self.variables`` order
+            out: Optional preallocated float64 output array (e.g. a memmap)
+
+        Returns:
+            The output array
+        """
+        arrays = [column if np.ndim(column) else None for column in columns]
+        lengths = {len(array) for array in arrays if array is not None}
+        if len(lengths) > 1:
+            raise ValueError("All variable columns must have the same length.")
+        if not lengths:
+            raise ValueError("Blocked evaluation needs at least one array column.")
+        length = lengths.pop()
+        if out is None:
+            out = np.empty(length, dtype=float)
+        elif len(out) != length:
+            raise ValueError("out must have the same length as the inputs.")
+
+        block_size = self.block_size
+        buffers = [np.empty(block_size, dtype=float) for _ in range(self.registers)]
+        scalars = [float(column) if array is None else None
+                   for column, array in zip(columns, arrays)]
+
+        for start in range(0, length, block_size):
+            stop = min(start + block_size, length)
+            size = stop - start
+            inputs = [scalar if array is None else np.asarray(array[start:stop], dtype=float)
+                      for array, scalar in zip(arrays, scalars)]
+            registers = buffers if size == block_size else [buffer[:size] for buffer in buffers]
+            target = out[start:stop]
+
+            for func, has_out, operands, register in self.instructions:
+                args = [value if kind == _CONSTANT
+                        else inputs[value] if kind == _INPUT
+                        else registers[value]
+                        for kind, value in operands]
+                dest = target if register == _OUTPUT else registers[register]
+                if has_out:
+                    func(*args, out=dest)
+                else:
+                    dest[...] = func(*args)
+
+            kind, value = self._root
+            if kind == _CONSTANT:
+                target[...] = value
+            elif kind == _INPUT:
+                target[...] = inputs[value]
+            elif value != _OUTPUT:
+                target[...] = registers[value]
+
+        return out
+
+    def _emit(self, root: Node) -> Tuple[int, Any]:
+        """Emit the instructions computing ``root`` without recursion and return its operand."""
+        if isinstance(root, Script):
+            return self._emit_script(root)
+        operands: List[Tuple[int, Any]] = []
+        stack: List[Any] = [root]
+        while stack:
+            node = stack.pop()
+            if type(node) is tuple:
+                _, node, func = node
+                count = len(node.children())
+                args = tuple(operands[len(operands) - count:])
+                del operands[len(operands) - count:]
+                operand = self._instruction(func, args)
+                uses = self._references.get(id(node), 1)
+                if uses > 1:
+                    # Keep the register until the other references have read it
+                    self._shared[id(node)] = operand
+                    self._pin(operand, uses - 1)
+                operands.append(operand)
+                continue
+            shared = self._shared.get(id(node))
+            if shared is not None:
+                self._pin(shared, -1)
+                operands.append(shared)
+            elif isinstance(node, Number):
+                operands.append((_CONSTANT, node.value))
+            elif isinstance(node, Variable):
+                operands.append((_INPUT, self._inputs.setdefault(node.name, len(self._inputs))))
+            elif isinstance(node, Local):
+                operands.append(self._locals[node.index])
+            else:
+                if isinstance(node, UnaryOp):
+                    func = _UNARY_UFUNCS[node.op]
+                elif isinstance(node, BinaryOp):
+                    func = _BINARY_UFUNCS[node.op]
+                elif isinstance(node, Call):
+                    func = self.functions[node.name]
+                else:
+                    raise TypeError(f"Cannot vectorize {type(node).__name__}.")
+                stack.append((None, node, func))
+                stack.extend(reversed(node.children()))
+        return operands[-1]
+
+    def _instruction(self, func: Callable[..., Any], operands: Tuple[Tuple[int, Any], ...]
+                     ) -> Tuple[int, Any]:
+        """Append an instruction writing to a free register and return its operand."""
+        # Operand registers are dead once read, so the result may reuse them
+        for operand in operands:
+            self._release(operand)
+        if self._free:
+            register = self._free.pop()
+        else:
+            register = self.registers
+            self.registers += 1
+        has_out = isinstance(func, np.ufunc)
+        self.instructions.append((func, has_out, operands, register))
+        return (_REGISTER, register)
+
+    def _emit_script(self, script: Script) -> Tuple[int, Any]:
+        """Emit every statement of a script, keeping assigned values in registers."""
+        for name, index in script.free:
+            self._locals[index] = (_INPUT, self._inputs.setdefault(name, len(self._inputs)))
+        last = len(script.statements) - 1
+        for position, (index, statement) in enumerate(script.statements):
+            # Statements do not share subexpressions, as locals change between them
+            self._shared.clear()
+            operand = self._emit(statement)
+            if position == last:
+                return operand
+            if index is None:
+                self._release(operand)
+                continue
+            previous = self._locals.get(index)
+            self._locals[index] = operand
+            self._pin(operand, 1)
+            if previous is not None:
+                self._pin(previous, -1)
+                self._release(previous)
+        raise ValueError("Cannot vectorize an empty script.")
+
+    def _pin(self, operand: Tuple[int, Any], count: int):
+        """Add ``count`` pins to the register of an operand."""
+        kind, value = operand
+        if kind == _REGISTER:
+            self._pinned[value] = self._pinned.get(value, 0) + count
+
+    def _release(self, operand: Tuple[int, Any]):
+        """Return the register of a dead operand to the free list."""
+        kind, value = operand
+        if kind == _REGISTER and not self._pinned.get(value) and value not in self._free:
+            self._free.append(value)
+
+
+def evaluate_arrays(
+    function: Callable[..., Any],
+    scalar_function: Callable[..., Any],
+    columns: Sequence[Any],
+) -> Any:
+    """
+    Evaluate a compiled expression over columns of variable values.
+
+    Args:
+        function: The vectorized function, or None when NumPy is absent
+        scalar_function: The scalar function used as a fallback
+        columns: One array-like (or scalar) per variable, in parameter order
+
+    Returns:
+        A NumPy array when NumPy is installed, else a list
+    """
+    if function is None:
+        return evaluate_scalar(scalar_function, columns)
+
+    arrays = [np.asarray(column, dtype=float) for column in columns]
+    result = function(*arrays)
+    shape = np.broadcast_shapes(*(array.shape for array in arrays)) if arrays else ()
+    if np.shape(result) != shape:
+        # Expressions that ignore their variables still yield one value per row
+        result = np.broadcast_to(result, shape).copy()
+    return result
+
+
+def use_blocked(columns: Sequence[Any], block_size: int = DEFAULT_BLOCK_SIZE) -> bool:
+    """
+    Check whether columns are better evaluated by the blocked kernel.
+
+    Args:
+        columns: One array-like or scalar per variable
+
+    Returns:
+        True when every array column is 1-D and longer than one block
+    """
+    if np is None:
+        return False
+    lengths = set()
+    for column in columns:
+        ndim = np.ndim(column)
+        if ndim > 1:
+            return False
+        if ndim == 1:
+            lengths.add(len(column))
+    return len(lengths) == 1 and lengths.pop() > block_size
+
+
+def _vectorized_functions(node: Node) -> Dict[str, Callable[..., Any]]:
+    """Choose the vectorized implementation of every function called in a tree."""
+    ufuncs = numpy_functions()
+    functions: Dict[str, Callable[..., Any]] = {}
+    for child in walk(node):
+        if isinstance(child, Call) and child.name not in functions:
+            # Only use the ufunc when the call still refers to the built-in
+            # implementation it replaces
+            builtin = ufuncs.get(child.name)
+            if builtin is not None and _is_builtin(child.name, child.func):
+                functions[child.name] = builtin
+            elif isinstance(child.func, UserFunction):
+                # User functions are vectorized through their body
+                body = child.func.body
+                functions[child.name] = specialize(body, _vectorized_functions(body),
+                                                   parameters=child.func.parameters,
+                                                   select=masked_select)
+            else:
+                functions[child.name] = np.vectorize(child.func, otypes=[float])
+    return functions
+
+
+def evaluate_scalar(function: Callable[..., Any], columns: Sequence[Any]) -> List[Any]:
+    """
+    Evaluate a scalar function row by row, repeating scalar columns.
+
+    Args:
+        function: The scalar function
+        columns: One sequence or scalar per variable, in parameter order
+
+    Returns:
+        The list of results
+    """
+    if not columns:
+        return function()
+    lengths = {len(column) for column in columns if _is_sequence(column)}
+    if len(lengths) > 1:
+        raise ValueError("All variable columns must have the same length.")
+    length = lengths.pop() if lengths else 1
+    rows = zip(*[column if _is_sequence(column) else [column] * length
+                 for column in columns])
+    return [function(*row) for row in rows]
+
+
+def _is_sequence(value: Any) -> bool:
+    """Check whether a binding is a column of values rather than a scalar."""
+    return hasattr(value, '__len__') and not isinstance(value, str)
+
+
+def _is_builtin(name: str, func: Callable[..., Any]) -> bool:
+    """Check whether ``func`` is the stock implementation of ``name``."""
+    from .calculator import Calculator
+    if isinstance(func, MemoizedFunction):
+        # Memoizing single elements does not pay off against the ufunc
+        func = func.function
+    return Calculator.FUNCTIONS.get(name) is func
@@ -0,0 +1,142 @@
+"""Unit tests for evaluation within resource budgets."""
+
+import threading
+import time
+import unittest
+from unittest import mock
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.budget import Budget, _start_method, evaluate_within
+from src.calculator import Calculator
+from src.errors import BudgetError, BudgetExceeded, EvaluationCancelled
+from src.lexer import tokenize
+from src.parser import parse
+
+
+class TestBudget(unittest.TestCase):
+    """Test cases for budgeted evaluation in process."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.calc = Calculator(budget=Budget(time=2.0, bits=1 << 16))
+    
+    def test_refused_before_computing(self):
+        """Test that oversized integer operations fail at once."""
+        for expression, name in (("9^9^9", "'**'"), ("factorial(100000)", "'factorial'"),
+                                 ("factorial(10^6/1) % 7", "'factorial'"),
+                                 ("binom(10^6/1, 10^5/1)", "'binom'"),
+                                 ("a = 2^1000; b = a^a", "'**'"), ("(2^40000)*(2^40000)", "'*'")):
+            started = time.perf_counter()
+            with self.assertRaises(BudgetExceeded) as ctx:
+                self.calc.evaluate_budgeted(expression)
+            self.assertLess(time.perf_counter() - started, 0.5)
+            self.assertEqual((ctx.exception.resource, ctx.exception.limit), ('bits', 1 << 16))
+            self.assertIn(name, str(ctx.exception))
+    
+    def test_results_within_budget(self):
+        """Test that expressions within the budget give their usual results."""
+        for expression in ("factorial(1000) % 7", "factorial(1000/1) % 7", "2^100 + 1",
+                           "sin(1) * 3", "7 // 2", "a = 3; b = a^2; b - a"):
+            self.assertEqual(self.calc.calculate(expression), Calculator().calculate(expression))
+        # Only the selected branch is computed
+        self.assertEqual(self.calc.calculate("if(1 < 2, 3, 9^9^9)"), 3)
+    
+    def test_calculate_error_message(self):
+        """Test the error string returned by calculate()."""
+        self.assertEqual(
+            self.calc.calculate("9^9^9"),
+            "Error: Budget exceeded - bits limit of 65536 exceeded: "
+            "the result of '**' may need 1549681957 bits")
+        self.assertEqual(self.calc.calculate("1/0"), "Error: Division by zero.")
+    
+    def test_memory_limits_integers(self):
+        """Test that in process the memory limit bounds the size of integers."""
+        with self.assertRaises(BudgetExceeded) as ctx:
+            self.calc.evaluate_budgeted("3^100000", Budget(memory=4096))
+        self.assertEqual(ctx.exception.resource, 'memory')
+    
+    def test_user_functions_are_limited(self):
+        """Test that the bodies of user functions are evaluated within the budget."""
+        self.calc.define("tower(n) = n^n^n + n + n + n + n + n + n + n + n + n + n + n + n + "
+                         "n + n + n + n + n + n + n + n + n + n + n + n + n + n + n")
+        self.assertEqual(self.calc.calculate("tower(2)"), 70)
+        self.assertIn("Budget exceeded", self.calc.calculate("tower(9)"))
+    
+    def test_time_limit(self):
+        """Test that the deadline is checked between operations."""
+        tree = parse(tokenize("+".join(["factorial(2000)"] * 20000), {}), self.calc.functions,
+                     fold=False)
+        started = time.perf_counter()
+        with self.assertRaises(BudgetExceeded) as ctx:
+            evaluate_within(tree, Budget(time=0.05))
+        self.assertEqual(ctx.exception.resource, 'time')
+        self.assertLess(time.perf_counter() - started, 1.0)
+    
+    def test_cancel(self):
+        """Test that setting the cancel event stops the evaluation."""
+        tree = parse(tokenize("+".join(["factorial(2000)"] * 20000), {}), self.calc.functions,
+                     fold=False)
+        cancel = threading.Event()
+        cancel.set()
+        with self.assertRaises(EvaluationCancelled):
+            evaluate_within(tree, Budget(), cancel)
+
+
+class TestSandbox(unittest.TestCase):
+    """Test cases for the sandboxed worker."""
+    
+    def test_worker_is_killed_at_deadline(self):
+        """Test that a single huge operation is stopped by the deadline."""
+        calc = Calculator(budget=Budget(time=0.2, sandbox=True))
+        started = time.perf_counter()
+        self.assertEqual(calc.calculate("9^9^9"),
+                         "Error: Budget exceeded - time limit of 0.2 exceeded: "
+                         "evaluation did not complete")
+        self.assertLess(time.perf_counter() - started, 2.0)
+    
+    def test_results_and_errors(self):
+        """Test that values and errors come back from the worker."""
+        calc = Calculator(budget=Budget(time=5.0, memory=1 << 26, sandbox=True))
+        self.assertEqual(calc.calculate("2^100 + 1"), 2 ** 100 + 1)
+        self.assertEqual(calc.calculate("1/0"), "Error: Division by zero.")
+        self.assertEqual(calc.calculate("x + 1"), "Error: NameError - name 'x' is not defined")
+    
+    def test_cancel(self):
+        """Test that cancelling stops the worker."""
+        cancel = threading.Event()
+        timer = threading.Timer(0.1, cancel.set)
+        timer.start()
+        self.addCleanup(timer.join)
+        self.addCleanup(timer.cancel)
+        with self.assertRaises(EvaluationCancelled):
+            Calculator().evaluate_budgeted("9^9^9", Budget(sandbox=True), cancel)
+    
+    def test_no_fork_with_threads(self):
+        """Test that the worker is not forked while other threads run."""
+        stop = threading.Event()
+        thread = threading.Thread(target=stop.wait)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(stop.set)
+        self.assertNotEqual(_start_method(), 'fork')
+        calc = Calculator(budget=Budget(time=30.0, sandbox=True))
+        self.assertEqual(calc.calculate("2^100 + 1"), 2 ** 100 + 1)
+    
+    def test_start_methods(self):
+        """Test the fallbacks when fork is unavailable."""
+        with mock.patch('multiprocessing.get_all_start_methods', return_value=['spawn']):
+            self.assertEqual(_start_method(), 'spawn')
+            tree = parse(tokenize("double(2)", {}), {'double': lambda x: 2 * x}, fold=False)
+            with self.assertRaises(BudgetError):
+                evaluate_within(tree, Budget(sandbox=True))
+        with mock.patch('multiprocessing.get_all_start_methods', return_value=[]):
+            with self.assertRaises(BudgetError):
+                _start_method()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+"""Unit tests for the bytecode format and stack VM."""
+
+import unittest
+import math
+import pickle
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.bytecode import CALL, LOAD_VAR, STORE, Program
+from src.calculator import Calculator
+
+
+class TestBytecode(unittest.TestCase):
+    """Test cases for lowering expressions to bytecode and running them."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.calc = Calculator()
+    
+    def test_program_matches_tree(self):
+        """Test that programs compute the same values as the tree evaluator."""
+        env = {'x': 1.5, 'y': -2}
+        for expr in ["x^2 + 3x - 7", "sqrt(x^2 + y^2)", "-x ** 2 // y", "2^70 * x % 7"]:
+            program = self.calc.lower(expr)
+            self.assertEqual(program.run(env), self.calc.parse(expr).evaluate(env), expr)
+    
+    def test_operands_are_interned(self):
+        """Test that repeated variables and calls share table entries."""
+        program = Calculator(optimize=False).lower("sin(x) + sin(x) * x")
+        self.assertEqual(program.variables, ('x',))
+        self.assertEqual(program.functions, (('sin', 1),))
+        self.assertEqual(list(program.opcodes).count(LOAD_VAR), 3)
+        self.assertEqual(list(program.opcodes).count(CALL), 2)
+    
+    def test_common_subexpressions_are_stored(self):
+        """Test that a shared subexpression is computed once and reloaded."""
+        program = self.calc.lower("sin(x) + sin(x) * x")
+        self.assertEqual(list(program.opcodes).count(CALL), 1)
+        self.assertEqual(list(program.opcodes).count(STORE), 1)
+        self.assertEqual(program.run({'x': 2}), Calculator(optimize=False).lower(
+            "sin(x) + sin(x) * x").run({'x': 2}))
+    
+    def test_execute_with_positional_values(self):
+        """Test running a program with values in variable order."""
+        program = self.calc.lower("a - b")
+        self.assertEqual(program.variables, ('a', 'b'))
+        self.assertEqual(program.execute((10, 4)), 6)
+    
+    def test_missing_variable(self):
+        """Test that unbound variables raise NameError."""
+        with self.assertRaises(NameError):
+            self.calc.lower("x + 1").run({})
+    
+    def test_bytes_round_trip(self):
+        """Test serializing and loading programs, including big and complex constants."""
+        program = self.calc.lower("x * 2^100 + exp(x) + 0.25 + (-1)**0.5")
+        loaded = Program.from_bytes(program.to_bytes())
+        self.assertEqual(loaded.constants, program.constants)
+        self.assertEqual(loaded.run({'x': 2}), program.run({'x': 2}))
+    
+    def test_bool_constants_round_trip(self):
+        """Test that folded comparisons load back as bools, not ints."""
+        program = self.calc.lower("if(x > 0, 1 < 2, 1)")
+        loaded = Program.from_bytes(program.to_bytes())
+        self.assertEqual([type(value) for value in loaded.constants], [int, bool, int])
+        self.assertIs(loaded.run({'x': 1}), True)
+        self.assertIs(Program.from_bytes(self.calc.lower("1 < 2").to_bytes()).run({}), True)
+    
+    def test_pickle_round_trip(self):
+        """Test that programs pickle without function references."""
+        program = self.calc.lower("cos(x) * pi")
+        loaded = pickle.loads(pickle.dumps(program))
+        self.assertAlmostEqual(loaded.run({'x': 0}), math.pi)
+    
+    def test_rejects_foreign_data(self):
+        """Test that loading arbitrary bytes fails cleanly."""
+        with self.assertRaises(ValueError):
+            Program.from_bytes(b"not a program")
+        data = bytearray(self.calc.lower("x + 1").to_bytes())
+        data[4] += 1
+        with self.assertRaises(ValueError):
+            Program.from_bytes(bytes(data))
+    
+    def test_disassemble(self):
+        """Test the human-readable listing."""
+        listing = self.calc.lower("sqrt(x)").disassemble()
+        self.assertIn("LOAD_VAR", listing)
+        self.assertIn("sqrt/1", listing)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+"""Unit tests for the expression cache."""
+
+import math
+import unittest
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.cache import ExpressionCache, MemoizedFunction
+from src.calculator import Calculator
+from src.enums import EvictionPolicy
+
+
+class FakeClock:
+    """Manually advanced time source for TTL tests."""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+class TestExpressionCache(unittest.TestCase):
+    """Test cases for the ExpressionCache eviction policies."""
+    
+    def test_lru_evicts_least_recently_used(self):
+        """Test that LRU discards the entry that was touched last."""
+        cache = ExpressionCache(maxsize=2, policy=EvictionPolicy.LRU)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.stats().evictions, 1)
+    
+    def test_lfu_evicts_least_frequently_used(self):
+        """Test that LFU discards the entry with the fewest hits."""
+        cache = ExpressionCache(maxsize=2, policy=EvictionPolicy.LFU)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.get("a")
+        cache.get("b")
+        cache.put("c", 3)
+        
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.get("c"), 3)
+    
+    def test_ttl_expires_entries(self):
+        """Test that TTL entries expire after their lifetime."""
+        clock = FakeClock()
+        cache = ExpressionCache(maxsize=4, policy=EvictionPolicy.TTL, ttl=10, clock=clock)
+        cache.put("a", 1)
+        clock.now = 5
+        self.assertEqual(cache.get("a"), 1)
+        clock.now = 10
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats().evictions, 1)
+    
+    def test_ttl_requires_lifetime(self):
+        """Test that the TTL policy rejects a missing ttl."""
+        with self.assertRaises(ValueError):
+            ExpressionCache(policy=EvictionPolicy.TTL)
+    
+    def test_disabled_cache(self):
+        """Test that a zero-sized cache stores nothing."""
+        cache = ExpressionCache(maxsize=0)
+        cache.put("a", 1)
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(cache.get("a"))
+
+
+class TestMemoizedFunction(unittest.TestCase):
+    """Test cases for MemoizedFunction."""
+    
+    def test_results_are_reused(self):
+        """Test that repeated arguments are served from the cache."""
+        calls = []
+        square = MemoizedFunction(lambda x: calls.append(x) or x * x)
+        self.assertEqual([square(3), square(3), square(3.0)], [9, 9, 9.0])
+        self.assertIs(type(square(3.0)), float)
+        self.assertEqual(calls, [3, 3.0])
+        self.assertEqual(square.stats().hit_ratio, 0.5)
+    
+    def test_bounded_by_bytes(self):
+        """Test that least recently used results are evicted by total size."""
+        factorial = MemoizedFunction(math.factorial, max_bytes=1500)
+        factorial(500)
+        factorial(600)
+        factorial(500)
+        factorial(700)
+        self.assertLessEqual(factorial.nbytes, 1500)
+        self.assertEqual(factorial.evictions, 1)
+        factorial(500)
+        self.assertEqual(factorial.hits, 2)
+        
+        # Results larger than the bound are not cached
+        factorial(5000)
+        self.assertLessEqual(factorial.nbytes, 1500)
+    
+    def test_errors_and_unhashable_arguments_pass_through(self):
+        """Test that failing calls and unhashable arguments are not cached."""
+        sqrt = MemoizedFunction(math.sqrt)
+        self.assertRaises(ValueError, sqrt, -1)
+        self.assertRaises(ValueError, sqrt, -1)
+        self.assertEqual(MemoizedFunction(len)([1, 2]), 2)
+        self.assertEqual(len(sqrt), 0)
+
+
+class TestCalculatorCache(unittest.TestCase):
+    """Test cases for the Calculator's use of the expression cache."""
+    
+    def test_repeated_expression_hits_cache(self):
+        """Test that repeating an expression is served from the cache."""
+        calc = Calculator()
+        self.assertEqual(calc.calculate("2 + 3"), 5)
+        self.assertEqual(calc.calculate("2 + 3"), 5)
+        
+        stats = calc.cache_info()
+        self.assertEqual(stats.hits, 1)
+        self.assertEqual(stats.misses, 1)
+        self.assertEqual(len(calc.get_history()), 2)
+    
+    def test_errors_are_reported_on_every_call(self):
+        """Test that cached expressions that fail keep reporting errors."""
+        calc = Calculator()
+        self.assertIn("Division by zero", calc.calculate("1 / 0"))
+        self.assertIn("Division by zero", calc.calculate("1 / 0"))
+        self.assertEqual(calc.cache_info().hits, 1)
+    
+    def test_memoize(self):
+        """Test memoizing a built-in function on a calculator."""
+        calc = Calculator()
+        calc.memoize("factorial")
+        self.assertEqual(calc.calculate("factorial(2000) % 7"), 0)
+        self.assertEqual(calc.calculate("factorial(2000) % 11"), 0)
+        self.assertIn("Invalid", calc.calculate("factorial(-1)"))
+        stats = calc.memo_info()["factorial"]
+        self.assertEqual((stats.hits, stats.misses), (1, 3))
+        self.assertRaises(ValueError, calc.memoize, "nope")
+        self.assertEqual(Calculator().memo_info(), {})
+    
+    def test_clear_cache(self):
+        """Test clearing the expression cache."""
+        calc = Calculator(cache_size=8, cache_policy=EvictionPolicy.LFU)
+        calc.calculate("sqrt(16)")
+        calc.clear_cache()
+        self.assertEqual(calc.cache_info().size, 0)
+        self.assertEqual(calc.template_cache_info().size, 0)
+    
+    def test_expressions_differing_in_numbers_share_a_template(self):
+        """Test that expressions of the same shape reuse one compiled template."""
+        calc = Calculator()
+        uncached = Calculator(cache_size=0)
+        expressions = ["0.5 * 1000 * 20^2", "0.5 * 1200 * 25^2", "0.5 * 7 * 3^2",
+                       "1 / 2", "4 / 0", "6 / 3", "sqrt(4)", "sqrt(0.25)", "sqrt(9)"]
+        for expression in expressions:
+            result = calc.calculate(expression)
+            expected = uncached.calculate(expression)
+            self.assertEqual(result, expected)
+            self.assertIs(type(result), type(expected))
+        
+        # Each shape is parsed twice: once when seen, once to build the template
+        stats = calc.template_cache_info()
+        self.assertEqual(stats.size, 3)
+        self.assertEqual(stats.hits, 6)
+    
+    def test_templates_skip_variables_and_syntax_errors(self):
+        """Test that shapes that cannot be templated are parsed every time."""
+        calc = Calculator()
+        for value in range(3):
+            self.assertIn("not defined", calc.calculate(f"x + {value}"))
+            self.assertEqual(calc.calculate(f"{value} +"),
+                             "Error: Unexpected end of expression at position "
+                             f"{len(str(value)) + 2}.")
+        self.assertEqual(calc.template_cache_info().size, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,7 @@
 """Unit tests for the calculator module."""
 
+import contextlib
+import io
 import unittest
 import math
 import sys
@@ -121,6 +123,51 @@ class TestCalculator(unittest.TestCase):
         self.assertEqual(results[1], 20.0)
         self.assertEqual(results[2], 4.0)
     
+    def test_batch_matches_sequential_calculation(self):
+        """Test that a planned batch gives the results and history of calculate()."""
+        expressions = ["1000 * (1 + 0.05/12)^(12*10)", "2500 * (1 + 0.05/12)^(12*10)",
+                       "1 / 0", "x + 1", "2 +", "a = 2; a^2", "-0.0 * 1",
+                       "1000 * (1 + 0.05/12)^(12*10)"]
+        sequential = Calculator()
+        expected = [sequential.calculate(expr) for expr in expressions]
+        results = self.calc.calculate_batch(expressions)
+        
+        self.assertEqual([repr(result) for result in results],
+                         [repr(result) for result in expected])
+        self.assertEqual(self.calc.get_history(), sequential.get_history())
+        self.assertEqual(self.calc.last_result, sequential.last_result)
+    
+    def test_large_expressions(self):
+        """Test machine-sized expressions, including repeats of their shape."""
+        flat = "+".join(str(i) for i in range(1, 20001))
+        nested = "sqrt(" * 2000 + "4" + ")" * 2000
+        for _ in range(2):
+            self.assertEqual(self.calc.calculate(flat), 200010000)
+            self.assertEqual(self.calc.calculate("+".join(str(i) for i in range(2, 302))), 45450)
+            self.assertEqual(self.calc.calculate(nested), 1.0)
+    
+    def test_verbose_large_expressions(self):
+        """Test that verbose output shortens huge expressions instead of failing."""
+        calc = Calculator(verbose=True)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(calc.calculate("10^5000+0"), 10 ** 5000)
+            self.assertEqual(calc.calculate("x+" * 3000 + "1"),
+                             Calculator().calculate("x+" * 3000 + "1"))
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("(5001 characters)", lines[0])
+        self.assertLess(max(len(line) for line in lines), 300)
+    
+    def test_calculate_stream(self):
+        """Test expressions read from a file object in chunks."""
+        stream = io.StringIO("(" * 3000 + "+".join(["2pi"] * 1000) + ")" * 3000)
+        self.assertAlmostEqual(self.calc.calculate_stream(stream, chunk_size=64),
+                               2000 * math.pi)
+        self.assertEqual(self.calc.get_history()[-1][0], "<stream>")
+        self.assertEqual(self.calc.calculate_stream(io.StringIO("1 + (2 *)"), chunk_size=2),
+                         "Error: Unexpected ')' at position 8.")
+    
     def test_operation_type_detection(self):
         """Test operation type detection."""
         self.assertEqual(
@@ -160,6 +207,12 @@ class TestCalculatorValidation(unittest.TestCase):
         self.assertFalse(is_valid)
         self.assertIn("parentheses", error)
     
+    def test_misordered_parentheses(self):
+        """Test that balanced but mis-ordered parentheses are detected."""
+        is_valid, error = self.calc.validate_expression(")2 + 3(")
+        self.assertFalse(is_valid)
+        self.assertIn("parentheses at position 0", error)
+    
     def test_invalid_characters(self):
         """Test invalid character detection."""
         is_valid, error = self.calc.validate_expression("2 + 3 @")
@@ -0,0 +1,53 @@
+"""Unit tests for canonical forms and fingerprints."""
+
+import unittest
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.calculator import Calculator
+from src.canonical import canonicalize, fingerprint
+
+
+class TestCanonical(unittest.TestCase):
+    """Test cases for canonicalize() and fingerprint()."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.calc = Calculator()
+    
+    def test_equivalent_spellings(self):
+        """Test that whitespace, case and commutative order do not matter."""
+        expected = self.calc.canonical("2*x + 1")
+        for expression in ["1 + X*2", "2x+1", "x * 2 + 1", "1+(x*2)"]:
+            self.assertEqual(self.calc.canonical(expression), expected)
+            self.assertEqual(self.calc.fingerprint(expression), self.calc.fingerprint("2*x + 1"))
+    
+    def test_distinct_expressions(self):
+        """Test that grouping, non-commutative order and types are kept."""
+        self.assertNotEqual(self.calc.canonical("(a+b)+c"), self.calc.canonical("a+(b+c)"))
+        self.assertNotEqual(self.calc.canonical("x - 1"), self.calc.canonical("1 - x"))
+        self.assertNotEqual(self.calc.fingerprint("x + 2"), self.calc.fingerprint("x + 2.0"))
+        self.assertNotEqual(self.calc.fingerprint("10^5000 + x"),
+                            self.calc.fingerprint("x + 10^5000 + 1"))
+    
+    def test_big_ints(self):
+        """Test that ints of more than 4300 digits are written out in full."""
+        self.assertEqual(self.calc.canonical("x + 10^5000"), f"(1{'0' * 5000} + x)")
+        self.assertEqual(self.calc.fingerprint("10^5000 + x"), self.calc.fingerprint("x + 10^5000"))
+    
+    def test_canonical_tree_evaluates_the_same(self):
+        """Test that the canonical tree computes the same value."""
+        tree = self.calc.parse("sin(3) * 2 + cos(1) * 5")
+        self.assertEqual(canonicalize(tree).evaluate(), tree.evaluate())
+    
+    def test_fingerprint_is_stable(self):
+        """Test that fingerprints do not depend on the process or run."""
+        self.assertEqual(fingerprint(self.calc.parse("2x + 1")), 0x993e90612546e484)
+        self.assertLess(self.calc.fingerprint("sqrt(x) * y; 1"), 2 ** 64)
+
+
+if __name__ == "__main__":
+    unittest.main()
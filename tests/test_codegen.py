@@ -0,0 +1,57 @@
+"""Unit tests for specializing expressions into Python functions."""
+
+import unittest
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.calculator import Calculator
+
+
+class TestSpecialize(unittest.TestCase):
+    """Test cases for Calculator.specialize()."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.calc = Calculator()
+    
+    def test_matches_tree_evaluation(self):
+        """Test that specialized functions agree with the tree evaluator."""
+        env = {'x': 1.25, 'y': 3}
+        for expr in ["x^2 + 3x - 7", "sqrt(x^2 + y^2)", "-x ** 2 // y", "floor(x) % y"]:
+            function = self.calc.specialize(expr)
+            args = [env[name] for name in function.variables]
+            self.assertEqual(function(*args), self.calc.parse(expr).evaluate(env), expr)
+    
+    def test_functions_are_closure_locals(self):
+        """Test that the generated code reads functions from closure cells."""
+        function = self.calc.specialize("sin(x) + sin(x)")
+        self.assertNotIn("sin", function.source)
+        self.assertEqual(len(function.__closure__), 1)
+        self.assertIs(function.__closure__[0].cell_contents, Calculator.FUNCTIONS['sin'])
+    
+    def test_variable_names_cannot_clash_with_python(self):
+        """Test that variables named like Python keywords still work."""
+        function = self.calc.specialize("lambda + if")
+        self.assertEqual(function.variables, ('lambda', 'if'))
+        self.assertEqual(function(1, 2), 3)
+    
+    def test_non_literal_constants(self):
+        """Test that constants without a literal spelling are bound."""
+        function = self.calc.specialize("x + (-8)^(1/3)")
+        self.assertIn("_k", function.source)
+    
+    def test_big_int_constants(self):
+        """Test that ints too long to write as literals are bound."""
+        for expression, value in (("x + 10^5000", 10 ** 5000), ("x + factorial(2000)", None)):
+            function = self.calc.specialize(expression)
+            self.assertIn("_k", function.source)
+            self.assertEqual(function(1), self.calc.compile(expression).evaluate({'x': 1}))
+            if value is not None:
+                self.assertEqual(function(1), value + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""Unit tests for compiled expressions with variables."""
+
+import unittest
+import math
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.calculator import Calculator
+from src.errors import ExpressionSyntaxError
+
+
+class TestCompiledExpression(unittest.TestCase):
+    """Test cases for Calculator.compile()."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.calc = Calculator()
+    
+    def test_keyword_bindings(self):
+        """Test evaluating with keyword arguments."""
+        area = self.calc.compile("pi * r^2")
+        self.assertEqual(area.variables, ('r',))
+        self.assertAlmostEqual(area(r=2), 4 * math.pi)
+    
+    def test_evaluate_many(self):
+        """Test evaluating an iterable of binding dicts."""
+        energy = self.calc.compile("0.5 * m * v^2")
+        rows = ({'m': m, 'v': v, 'label': 'ignored'} for m, v in [(2, 3), (1, 4)])
+        self.assertEqual(energy.evaluate_many(rows), [9.0, 8.0])
+    
+    def test_constant_expression(self):
+        """Test that expressions without variables can be compiled too."""
+        compiled = self.calc.compile("2 + 3")
+        self.assertEqual(compiled.variables, ())
+        self.assertEqual(compiled(), 5)
+        self.assertEqual(compiled.evaluate_many([{}, {}]), [5, 5])
+    
+    def test_unbound_variable(self):
+        """Test that missing bindings raise NameError."""
+        compiled = self.calc.compile("x + y")
+        with self.assertRaises(NameError):
+            compiled(x=1)
+        with self.assertRaises(NameError):
+            compiled.evaluate_many([{'x': 1, 'y': 2}, {'x': 1}])
+    
+    def test_compile_does_not_touch_history(self):
+        """Test that compiled evaluations are not recorded as calculations."""
+        self.calc.compile("x * 2")(x=4)
+        self.assertEqual(self.calc.get_history(), [])
+    
+    def test_deep_expressions(self):
+        """Test compiling expressions nested far beyond the recursion limit."""
+        terms = 5 * sys.getrecursionlimit()
+        flat = "+".join(["x"] * terms)
+        nested = "sqrt(" * 300 + "x" + ")" * 300
+        shared = "sin(x) * (" + flat + " + sin(x))"
+        for calc in (self.calc, Calculator(algebraic=True), Calculator(optimize=False)):
+            self.assertEqual(calc.compile(flat)(x=2), 2 * terms)
+            self.assertEqual(calc.lower(flat).run({'x': 2}), 2 * terms)
+            self.assertEqual(calc.specialize(nested)(1.0), 1.0)
+            self.assertEqual(calc.lower(nested).run({'x': 1.0}), 1.0)
+            self.assertAlmostEqual(calc.compile(shared)(x=1.0),
+                                   math.sin(1.0) * (terms + math.sin(1.0)))
+            self.assertEqual(calc.compile("a = " + flat + "; a + 1").evaluate_all({'x': 1}),
+                             [terms, terms + 1])
+        self.assertEqual(self.calc.canonical(flat), self.calc.canonical(flat))
+    
+    def test_deep_conditional_branch(self):
+        """Test that branches too deep for one Python expression are reported."""
+        with self.assertRaises(ExpressionSyntaxError):
+            self.calc.compile("if(x > 0, " + "sqrt(" * 300 + "x" + ")" * 300 + ", 0)")
+        self.assertEqual(self.calc.lower("if(x > 0, " + "sqrt(" * 300 + "x" + ")" * 300
+                                         + ", 0)").run({'x': 1.0}), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
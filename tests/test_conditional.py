@@ -0,0 +1,109 @@
+"""Unit tests for comparisons, conditionals and piecewise expressions."""
+
+import unittest
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.bytecode import Program
+from src.calculator import Calculator
+from src.errors import ExpressionSyntaxError
+from src.vectorized import HAS_NUMPY
+
+if HAS_NUMPY:
+    import numpy as np
+
+
+class TestConditional(unittest.TestCase):
+    """Test cases for if(), piecewise() and comparison operators."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.calc = Calculator()
+    
+    def test_comparisons(self):
+        """Test comparison operators, which bind loosest."""
+        self.assertIs(self.calc.calculate("1 + 1 == 2"), True)
+        self.assertIs(self.calc.calculate("2 != 2.0"), False)
+        self.assertIs(self.calc.calculate("3 <= 2"), False)
+        self.assertEqual(self.calc.calculate("(2 > 1) + (1 >= 1)"), 2)
+        self.assertEqual(self.calc.calculate("a = 3; a == 3"), True)
+    
+    def test_comparisons_do_not_chain(self):
+        """Test that chained comparisons are rejected rather than left-associated."""
+        for expression in ("3 > 2 > 1", "1 < 2 < 3", "x < 1 + 2 <= y"):
+            with self.assertRaises(ExpressionSyntaxError, msg=expression):
+                self.calc.parse(expression)
+        self.assertIs(self.calc.calculate("(1 < 2) == (2 < 3)"), True)
+    
+    def test_only_selected_branch_is_evaluated(self):
+        """Test that the other branch may fail without affecting the result."""
+        self.assertEqual(self.calc.calculate("if(1 < 2, 3, 1/0)"), 3)
+        self.assertEqual(self.calc.calculate("if(1 > 2, sqrt(-1), 4)"), 4)
+        self.assertEqual(self.calc.calculate("if(1 > 2, 3, 1/0)"), "Error: Division by zero.")
+    
+    def test_piecewise(self):
+        """Test that piecewise takes the first condition that holds."""
+        sign = self.calc.compile("piecewise(x < 0, -1, x == 0, 0, 1)")
+        self.assertEqual([sign(x=value) for value in (-5, 0, 5)], [-1, 0, 1])
+        self.assertEqual(str(self.calc.parse("piecewise(x < 0, -x, x)")),
+                         "if((x < 0), (-x), x)")
+    
+    def test_constant_condition_keeps_selected_branch(self):
+        """Test that a constant condition is folded away while parsing."""
+        self.assertEqual(str(self.calc.parse("if(2 > 1, x, 1/0)")), "x")
+        self.calc.define("safe(c, a) = if(c > 0, a, 1/0)")
+        self.assertEqual(str(self.calc.parse("safe(1, x)")), "x")
+    
+    def test_argument_errors(self):
+        """Test the number of arguments of if and piecewise."""
+        self.assertEqual(self.calc.calculate("if(1, 2)"),
+                         "Error: Function 'if' expects 3 argument(s), got 2 at position 0.")
+        self.assertIn("condition/value pairs", self.calc.calculate("piecewise(1, 2)"))
+        self.assertIn("Cannot redefine", str(self._define_error("if(a) = a")))
+    
+    def _define_error(self, definition):
+        """Get the error raised by a definition."""
+        try:
+            self.calc.define(definition)
+        except Exception as e:
+            return e
+        return None
+    
+    def test_backends_agree(self):
+        """Test that every backend evaluates only the selected branch."""
+        expression = "if(x > 0, ln(x) + ln(x), sqrt(-x)) * ln(x + 3)"
+        tree = self.calc.parse(expression)
+        compiled = self.calc.compile(expression)
+        program = Program.from_bytes(self.calc.lower(expression).to_bytes())
+        for x in (-2, 0.5, 4):
+            expected = tree.evaluate({'x': x})
+            self.assertEqual(compiled(x=x), expected)
+            self.assertEqual(program.run({'x': x}), expected)
+    
+    def test_shared_subexpression_in_branch(self):
+        """Test values shared by a branch and later code are computed correctly."""
+        expression = "if(x > 0, sin(y) * sin(y), cos(y)) + sin(y)"
+        program = self.calc.lower(expression)
+        for x in (-1, 1):
+            expected = self.calc.parse(expression).evaluate({'x': x, 'y': 2})
+            self.assertEqual(self.calc.compile(expression)(x=x, y=2), expected)
+            self.assertEqual(program.run({'x': x, 'y': 2}), expected)
+    
+    @unittest.skipUnless(HAS_NUMPY, "NumPy is not installed")
+    def test_vectorized_branches_are_masked(self):
+        """Test that array branches only see the elements selecting them."""
+        x = np.linspace(-2, 2, 9)
+        compiled = self.calc.compile("if(x > 0, ln(x), -x)")
+        with np.errstate(all='raise'):
+            result = compiled.evaluate_array(x=x)
+            blocked = compiled.evaluate_blocked({'x': x}, block_size=4)
+        expected = [compiled(x=value) for value in x]
+        np.testing.assert_allclose(result, expected)
+        np.testing.assert_allclose(blocked, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""Unit tests for static cost estimates."""
+
+import math
+import unittest
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.calculator import Calculator
+from src.errors import ExpressionSyntaxError
+from src.estimate import FLOAT_BITS, estimate
+from src.lexer import tokenize
+from src.parser import parse
+
+
+class TestEstimate(unittest.TestCase):
+    """Test cases for estimate() and Calculator.estimate_cost()."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.calc = Calculator()
+    
+    def test_structure(self):
+        """Test the node count, depth and function mix."""
+        cost = self.calc.estimate_cost("sin(x)^2 + cos(x)^2 + sin(1)")
+        self.assertEqual(cost.functions, {'sin': 2, 'cos': 1})
+        self.assertEqual(cost.nodes, 12)
+        self.assertEqual(cost.depth, 5)
+    
+    def test_enormous_without_evaluating(self):
+        """Test that huge results are flagged before anything is computed."""
+        calls = []
+        self.calc.user_functions['probe'] = lambda n: calls.append(n) or n
+        for expression in ("factorial(10**6)", "2^2^2^30", "probe(9)^9^9^9",
+                           "a = 10; b = a^a; b^b"):
+            self.assertTrue(self.calc.estimate_cost(expression).enormous, expression)
+        self.assertEqual(calls, [])
+        self.assertEqual(self.calc.estimate_cost("2^2^2^30").digits, math.inf)
+    
+    def test_huge_literal_exponent(self):
+        """Test that exponents too large for a float give a bound, not an error."""
+        exponent = '9' * 400
+        self.assertEqual(self.calc.estimate_cost(f"2^{exponent}").bits, math.inf)
+        for expression in (f"2.0^{exponent}", f"x^{exponent}"):
+            self.assertTrue(math.isfinite(self.calc.estimate_cost(expression).bits))
+    
+    def test_bounds_hold(self):
+        """Test that the magnitude bound covers the actual result."""
+        for expression in ("2^100 * 3^50 - 7", "factorial(300) // 12", "(2^64)^3 % 1000",
+                           "if(2 > 1, 10^50, 1)", "sqrt(2^60) + floor(7.5)", "-(3^40)"):
+            cost = self.calc.estimate_cost(expression)
+            value = self.calc.calculate(expression)
+            self.assertFalse(cost.enormous)
+            self.assertLessEqual(math.log2(abs(value)), cost.bits, expression)
+    
+    def test_floats_are_bounded(self):
+        """Test that float results never exceed the float range."""
+        self.assertEqual(self.calc.estimate_cost("exp(x) / 0.5").bits, FLOAT_BITS)
+        self.assertEqual(self.calc.estimate_cost("sin(x) * cos(x)").bits, 0)
+    
+    def test_work_grows_with_size(self):
+        """Test that big-integer work grows with the size of the numbers."""
+        small = self.calc.estimate_cost("2^1000 * 3^1000")
+        large = self.calc.estimate_cost("2^100000 * 3^100000")
+        self.assertGreater(large.work, 1000 * small.work)
+        self.assertLess(self.calc.estimate_cost("x * y + 1").work, 10)
+    
+    def test_user_function_body(self):
+        """Test that calls of user functions are estimated through their body."""
+        self.calc.define("grow(n) = factorial(n) * factorial(n) * factorial(n) * n^n")
+        cost = self.calc.estimate_cost("grow(10^5)")
+        self.assertTrue(cost.enormous)
+        self.assertEqual(cost.functions, {'grow': 1, 'factorial': 3})
+    
+    def test_deep_expression(self):
+        """Test an expression nested far beyond the recursion limit."""
+        depth = 5 * sys.getrecursionlimit()
+        tree = parse(tokenize("(" * depth + "x" + ")" * depth + "+1", {}), {}, fold=False)
+        self.assertEqual(estimate(tree).depth, 2)
+        tree = parse(tokenize("abs(" * depth + "x" + ")" * depth, {}), self.calc.functions)
+        self.assertEqual(estimate(tree).depth, depth + 1)
+    
+    def test_errors(self):
+        """Test that malformed expressions raise instead of being estimated."""
+        with self.assertRaises(ExpressionSyntaxError):
+            self.calc.estimate_cost("2 +")
+        with self.assertRaises(NameError):
+            self.calc.estimate_cost("nope(2)")
+
+
+if __name__ == "__main__":
+    unittest.main()
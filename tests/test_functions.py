@@ -0,0 +1,113 @@
+"""Unit tests for user-defined functions."""
+
+import unittest
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.calculator import Calculator
+from src.errors import ExpressionSyntaxError
+from src.functions import INLINE_LIMIT
+from src.nodes import Call, walk
+from src.vectorized import HAS_NUMPY
+
+if HAS_NUMPY:
+    import numpy as np
+
+
+class TestUserFunctions(unittest.TestCase):
+    """Test cases for Calculator.define()."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.calc = Calculator()
+        self.calc.define("hyp(a, b) = sqrt(a^2 + b^2)")
+    
+    def test_define_and_call(self):
+        """Test that defined functions can be called from expressions."""
+        hyp = self.calc.user_functions['hyp']
+        self.assertEqual(hyp.parameters, ('a', 'b'))
+        self.assertEqual(hyp(3, 4), 5.0)
+        self.assertEqual(self.calc.calculate("hyp(3, 4)"), 5.0)
+        self.assertEqual(self.calc.compile("hyp(x, 4)")(x=3), 5.0)
+        self.assertNotIn('hyp', Calculator.FUNCTIONS)
+        self.assertEqual(Calculator().calculate("hyp(3, 4)"),
+                         "Error: NameError - name 'hyp' is not defined")
+    
+    def test_small_functions_are_inlined(self):
+        """Test that calls to small functions are replaced by their body."""
+        tree = self.calc.parse("hyp(x, y + 1)")
+        self.assertEqual(str(tree), "sqrt(((x ** 2) + ((y + 1) ** 2)))")
+        self.assertEqual(self.calc.calculate("hyp(3, 4) + hyp(6, 8)"), 15.0)
+    
+    def test_arguments_are_not_duplicated(self):
+        """Test that a call is kept when inlining would repeat an argument's work."""
+        self.calc.define("sq(t) = t*t")
+        self.assertEqual(str(self.calc.parse("sq(x)")), "(x * x)")
+        tree = self.calc.parse("sq(sin(x))")
+        self.assertIsInstance(tree, Call)
+        self.assertEqual(tree.evaluate({'x': 1}), self.calc.parse("sin(x)^2").evaluate({'x': 1}))
+    
+    def test_large_functions_are_called(self):
+        """Test that bodies above the inlining limit stay calls everywhere."""
+        self.calc.define("big(a) = " + " + ".join(["a"] * INLINE_LIMIT))
+        tree = self.calc.parse("big(x) + 1")
+        self.assertTrue(any(isinstance(node, Call) for node in walk(tree)))
+        self.assertEqual(self.calc.compile("big(x) + 1")(x=2), 2 * INLINE_LIMIT + 1)
+        self.assertEqual(self.calc.lower("big(x) + 1").run({'x': 2}), 2 * INLINE_LIMIT + 1)
+    
+    def test_redefinition_clears_cache(self):
+        """Test that redefining a function is seen by cached expressions."""
+        self.calc.define("f(x) = x + 1")
+        self.assertEqual(self.calc.calculate("f(1)"), 2)
+        self.calc.define("f(x) = x + 2")
+        self.assertEqual(self.calc.calculate("f(1)"), 3)
+    
+    def test_redefinition_updates_callers(self):
+        """Test that functions calling a redefined function use the new definition."""
+        self.calc.define("g(x) = x + 1")
+        self.calc.define("f(x) = g(x) * 2")
+        self.calc.define("k(x) = f(x) + g(x)")
+        self.calc.define("g(x) = x + 10")
+        self.assertEqual(self.calc.calculate("f(1)"), 22)
+        self.assertEqual(self.calc.calculate("k(1)"), 33)
+        self.assertEqual(self.calc.user_functions['f'](1), 22)
+        # A redefinition its callers cannot use changes nothing
+        with self.assertRaises(ExpressionSyntaxError):
+            self.calc.define("g(x, y) = x")
+        self.assertEqual(self.calc.calculate("f(1)"), 22)
+    
+    def test_arguments_are_evaluated(self):
+        """Test that inlining does not skip the evaluation of an argument."""
+        self.calc.define("h(x) = 1")
+        self.calc.define("s(c, x) = if(c, x, 0)")
+        self.assertEqual(self.calc.calculate("h(1/0)"), "Error: Division by zero.")
+        self.assertEqual(self.calc.calculate("s(0, 1/0)"), "Error: Division by zero.")
+        self.assertEqual(str(self.calc.parse("h(2) + s(y, x)")), "(1 + if(y, x, 0))")
+        self.assertIsInstance(self.calc.parse("s(y, sin(x))"), Call)
+    
+    def test_invalid_definitions(self):
+        """Test error reporting for malformed definitions and calls."""
+        with self.assertRaises(ExpressionSyntaxError):
+            self.calc.define("sin(x) = x")
+        with self.assertRaises(ExpressionSyntaxError):
+            self.calc.define("f(x, x) = x")
+        with self.assertRaises(NameError):
+            self.calc.define("f(x) = x + y")
+        self.assertEqual(self.calc.calculate("hyp(1)"),
+                         "Error: Function 'hyp' expects 2 argument(s), got 1 at position 0.")
+    
+    @unittest.skipUnless(HAS_NUMPY, "NumPy is not installed")
+    def test_vectorized(self):
+        """Test that called user functions are vectorized through their body."""
+        self.calc.define("big(a) = " + " + ".join(["sin(a)"] * INLINE_LIMIT))
+        compiled = self.calc.compile("big(x)")
+        x = np.linspace(0, 1, 5)
+        expected = [compiled(x=value) for value in x]
+        np.testing.assert_allclose(compiled.evaluate_array(x=x), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
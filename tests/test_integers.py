@@ -0,0 +1,80 @@
+"""Unit tests for the exact integer functions."""
+
+import math
+import unittest
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.budget import Budget
+from src.calculator import Calculator
+from src.integers import factorial_mod, format_integer, lcm
+
+
+class TestIntegers(unittest.TestCase):
+    """Test cases for powmod, binom, factorial_mod, gcd, lcm and integer formatting."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.calc = Calculator()
+    
+    def test_powmod(self):
+        """Test modular powers, including huge exponents and inverses."""
+        p = 10 ** 9 + 7
+        self.assertEqual(self.calc.calculate("powmod(2, 10^18, 10^9 + 7)"), pow(2, 10 ** 18, p))
+        self.assertEqual(self.calc.calculate("powmod(3, -1, 7)"), 5)
+        self.assertEqual(self.calc.calculate("powmod(2, 10, 0)"),
+                         "Error: Invalid mathematical operation - pow() 3rd argument cannot be 0")
+    
+    def test_binom_and_factorial(self):
+        """Test binomials and factorials, which accept integral floats."""
+        self.assertEqual(self.calc.calculate("binom(50, 25)"), math.comb(50, 25))
+        self.assertEqual(self.calc.calculate("binom(5, 7)"), 0)
+        self.assertEqual(self.calc.calculate("factorial(5.0)"), 120)
+        self.assertEqual(self.calc.calculate("factorial(2.5)"),
+                         "Error: Invalid mathematical operation - "
+                         "factorial() only accepts integral values")
+    
+    def test_factorial_mod(self):
+        """Test factorials modulo an integer against the full factorial."""
+        for n, m in ((0, 7), (1, 1), (10, 7), (200, 1009), (300, 1 << 61), (6, -7)):
+            self.assertEqual(factorial_mod(n, m), math.factorial(n) % m, (n, m))
+        with self.assertRaises(ValueError):
+            factorial_mod(-1, 7)
+    
+    def test_gcd_lcm(self):
+        """Test the variadic gcd and lcm."""
+        self.assertEqual(self.calc.calculate("gcd(12, 18, 27)"), 3)
+        self.assertEqual(self.calc.calculate("lcm(4, 6, 10)"), 60)
+        self.assertEqual(self.calc.calculate("lcm(-4, 6)"), 12)
+        self.assertEqual(lcm(3, 0, 5), 0)
+        self.assertEqual(lcm(), 1)
+    
+    def test_integer_results(self):
+        """Test that integer-only expressions give ints, formatted in full."""
+        result = self.calc.calculate("factorial(3000) // 7^100")
+        self.assertIs(type(result), int)
+        text = Calculator.format_result(result)
+        self.assertEqual(len(text), math.floor(math.log10(result)) + 1)
+        self.assertEqual(int(text[:50]), result // 10 ** (len(text) - 50))
+        huge = 7 ** 20000 - 1
+        text = format_integer(-huge)
+        self.assertEqual((text[0], len(text)), ('-', 16903))
+        self.assertEqual(int(text[1:1001]), huge // 10 ** 15902)
+        self.assertEqual(int(text[-1000:]), huge % 10 ** 1000)
+        self.assertEqual(Calculator.format_result(2.0 ** 80), str(2 ** 80))
+    
+    def test_bounds(self):
+        """Test that estimates and budgets know the size of integer results."""
+        self.assertEqual(self.calc.estimate_cost("powmod(2, 10^18, 1000)").bits, 72)
+        self.assertEqual(self.calc.estimate_cost("lcm(2^64, 3^40, 5)").bits, 240)
+        calc = Calculator(budget=Budget(bits=1000))
+        self.assertIn("the result of 'binom'", calc.calculate("binom(10^6, 5*10^5)"))
+        self.assertEqual(calc.calculate("powmod(2, 10^18, 10^9 + 7)"),
+                         pow(2, 10 ** 18, 10 ** 9 + 7))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+"""Unit tests for the expression tokenizer."""
+
+import io
+import unittest
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.calculator import Calculator
+from src.errors import ExpressionSyntaxError
+from src.lexer import NAME, NUMBER, OP, tokenize, tokenize_stream, to_source
+
+
+class TestTokenize(unittest.TestCase):
+    """Test cases for tokenize()."""
+    
+    def tokens(self, expression):
+        """Tokenize with the calculator's constants and drop positions."""
+        return [(kind, value) for kind, value, _ in tokenize(expression, Calculator.CONSTANTS)]
+    
+    def test_numbers_and_operators(self):
+        """Test numbers, operators and the ^ to ** translation."""
+        self.assertEqual(
+            self.tokens("2.5 ^ 3 // 2"),
+            [(NUMBER, 2.5), (OP, '**'), (NUMBER, 3), (OP, '//'), (NUMBER, 2)]
+        )
+    
+    def test_constants_are_resolved(self):
+        """Test that constants become numbers and names are lowercased."""
+        self.assertEqual(self.tokens("PI"), [(NUMBER, Calculator.CONSTANTS['pi'])])
+        self.assertEqual(self.tokens("Sin"), [(NAME, 'sin')])
+    
+    def test_implicit_multiplication(self):
+        """Test that implicit multiplication is made explicit."""
+        self.assertEqual(to_source(tokenize("2x", {})), "2 * x")
+        self.assertEqual(to_source(tokenize("3(1)", {})), "3 * ( 1 )")
+        self.assertEqual(to_source(tokenize("(1)(2)", {})), "( 1 ) * ( 2 )")
+        self.assertEqual(to_source(tokenize("(1)2", {})), "( 1 ) * 2")
+        self.assertEqual(to_source(tokenize("sin(1)", {})), "sin ( 1 )")
+    
+    def test_no_implicit_multiplication_across_whitespace(self):
+        """Test that operands separated by whitespace are not multiplied."""
+        self.assertEqual(to_source(tokenize("2 x", {})), "2 x")
+        self.assertEqual(to_source(tokenize("(1) (2)", {})), "( 1 ) ( 2 )")
+        calc = Calculator()
+        for expression in ("2 pi", "pi e", "2 3", "2 (3)", "(2) 3", "(1) (2)"):
+            with self.assertRaises(ExpressionSyntaxError, msg=expression):
+                calc.parse(expression)
+        self.assertAlmostEqual(calc.calculate("2pi"), 2 * Calculator.CONSTANTS['pi'])
+        self.assertEqual(calc.calculate("sin (0)"), 0)
+    
+    def test_invalid_character_position(self):
+        """Test that the offending character's position is reported."""
+        with self.assertRaises(ExpressionSyntaxError) as ctx:
+            tokenize("1 + 2 $ 3", {})
+        self.assertEqual(ctx.exception.position, 6)
+    
+    def test_misordered_parentheses(self):
+        """Test that a closing parenthesis before its opening one is caught."""
+        with self.assertRaises(ExpressionSyntaxError) as ctx:
+            tokenize(")1 + 2(", {})
+        self.assertEqual(ctx.exception.position, 0)
+    
+    def test_unclosed_parenthesis_position(self):
+        """Test that the innermost unclosed parenthesis is reported."""
+        with self.assertRaises(ExpressionSyntaxError) as ctx:
+            tokenize("(1 + (2", {})
+        self.assertEqual(ctx.exception.position, 5)
+    
+    def test_malformed_number(self):
+        """Test that numbers with several decimal points are rejected."""
+        with self.assertRaises(ExpressionSyntaxError):
+            tokenize("1.2.3", {})
+    
+    def test_stream_matches_string(self):
+        """Test that tokenizing in small chunks never splits a token."""
+        expression = "12.5*(x1 + 2pi)^2 <= 300 ;  b=sqrt( 144 )//7 ** 2"
+        expected = tokenize(expression, Calculator.CONSTANTS)
+        for chunk_size in (1, 2, 3, 7, 1000):
+            tokens, length = tokenize_stream(io.StringIO(expression), Calculator.CONSTANTS,
+                                             chunk_size)
+            self.assertEqual(tokens, expected)
+            self.assertEqual(length, len(expression))
+    
+    def test_stream_error_position(self):
+        """Test that error positions count from the start of the stream."""
+        with self.assertRaises(ExpressionSyntaxError) as ctx:
+            tokenize_stream(io.StringIO("1 + 2 + (3 $ 4)"), {}, chunk_size=4)
+        self.assertEqual(ctx.exception.position, 11)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+"""Unit tests for the algebraic optimizer."""
+
+import unittest
+import math
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.calculator import Calculator
+from src.optimizer import cost, optimize, share, shared_nodes
+from src.vectorized import HAS_NUMPY, BlockedKernel
+
+if HAS_NUMPY:
+    import numpy as np
+
+
+class TestOptimizer(unittest.TestCase):
+    """Test cases for optimize()."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.calc = Calculator()
+    
+    def optimized(self, expression, algebraic=True):
+        """Get the optimized tree of an expression as a string."""
+        return str(optimize(self.calc.parse(expression), algebraic))
+    
+    def test_strength_reduction(self):
+        """Test that squares of variables become products."""
+        self.assertEqual(self.optimized("x^2 + y^2"), "((x * x) + (y * y))")
+        self.assertEqual(self.optimized("x^2.0"), "(x ** 2.0)")
+        self.assertEqual(self.optimized("x^2 + y^2", algebraic=False), "((x ** 2) + (y ** 2))")
+    
+    def test_identities(self):
+        """Test that integer identities are dropped and float ones kept."""
+        self.assertEqual(self.optimized("1*sin(x)^1 + 0"), "sin(x)")
+        self.assertEqual(self.optimized("--x"), "x")
+        self.assertEqual(self.optimized("0 - sin(x)"), "(-sin(x))")
+        self.assertEqual(self.optimized("x * 1.0"), "(x * 1.0)")
+    
+    def test_horner_form(self):
+        """Test that polynomials are rewritten as nested products."""
+        self.assertEqual(self.optimized("3x^3 + 2x^2 + x"), "(((((3 * x) + 2) * x) + 1) * x)")
+        self.assertEqual(self.optimized("x^2 - 2x + 1 + y"), "((((x - 2) * x) + 1) + y)")
+        self.assertEqual(self.optimized("2 * x * pi"), "(6.283185307179586 * x)")
+        # Expanding would cost more than it saves
+        self.assertEqual(self.optimized("(x + 1)^10"), "((x + 1) ** 10)")
+        # Cancelled variables are still required
+        self.assertEqual(self.optimized("x * 0 + 1"), "((x * 0) + 1)")
+        self.assertEqual(self.optimized("3x^3 + x", algebraic=False), "((3 * (x ** 3)) + x)")
+    
+    def test_default_passes_keep_float_values(self):
+        """Test that only the algebraic passes change float results."""
+        cases = [("(x+1)^2 - x^2", 1e17), ("2x - x", math.inf), ("x^2", 1e200)]
+        for expression, x in cases:
+            tree = self.calc.parse(expression)
+            try:
+                expected = tree.evaluate({'x': x})
+            except OverflowError:
+                with self.assertRaises(OverflowError):
+                    optimize(tree).evaluate({'x': x})
+                continue
+            self.assertEqual(repr(optimize(tree).evaluate({'x': x})), repr(expected), expression)
+            self.assertEqual(repr(self.calc.compile(expression)(x=x)), repr(expected), expression)
+    
+    def test_results_are_unchanged(self):
+        """Test that optimized trees evaluate to the original values."""
+        expressions = ["3x^3 + 2x^2 + x - 7", "x^2 * y^1 + 0", "-x^2 + x", "(x - y)^3",
+                       "a = x^2 + 2x; a^2 + y"]
+        for expression in expressions:
+            tree = self.calc.parse(expression)
+            optimized = optimize(tree, algebraic=True)
+            self.assertLessEqual(cost(optimized), cost(tree), expression)
+            for x, y in [(2, 3), (-1, 5), (0, 0)]:
+                env = {'x': x, 'y': y}
+                self.assertEqual(optimized.evaluate(env), tree.evaluate(env), expression)
+    
+    def test_calculator_compiles_optimized_trees(self):
+        """Test that compilation optimizes unless disabled."""
+        self.assertEqual(str(self.calc.compile("x^2 + x").tree), "((x ** 2) + x)")
+        algebraic = Calculator(algebraic=True)
+        self.assertEqual(str(algebraic.compile("x^2 + x").tree), "((x + 1) * x)")
+        self.assertEqual(algebraic.specialize("x^2 + x")(3), 12)
+        plain = Calculator(optimize=False)
+        self.assertEqual(str(plain.compile("x^2 + 0").tree), "((x ** 2) + 0)")
+
+
+class TestCommonSubexpressions(unittest.TestCase):
+    """Test cases for sharing identical subtrees."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.calc = Calculator()
+        self.expression = "sin(x)^2 + cos(x)^2 + sin(x)*cos(x)"
+    
+    def test_identical_subtrees_are_one_node(self):
+        """Test that hash-consing merges structurally equal subtrees."""
+        tree = share(self.calc.parse("(x + y) * (x + y) + sin(x + y)"))
+        self.assertIs(tree.left.left, tree.left.right)
+        self.assertIs(tree.right.args[0], tree.left.left)
+        self.assertEqual(shared_nodes(tree), 1)
+        self.assertEqual(shared_nodes(self.calc.parse("x + 0.0 + -0.0")), 0)
+    
+    def test_compiled_code_computes_once(self):
+        """Test that generated code evaluates each shared subtree once."""
+        compiled = self.calc.compile(self.expression)
+        self.assertEqual(compiled.shared, 2)
+        source = compiled._function.source
+        self.assertEqual(source.count("_f0("), 1)
+        self.assertEqual(source.count("_f1("), 1)
+        self.assertAlmostEqual(compiled(x=0.3), Calculator(optimize=False).compile(
+            self.expression)(x=0.3))
+    
+    def test_statements_are_shared_separately(self):
+        """Test that subtrees reading a reassigned local are not reused."""
+        compiled = self.calc.compile("a = x; b = sin(a); a = a + 1; b + sin(a)")
+        self.assertEqual(compiled(x=1), self.calc.parse(
+            "a = x; b = sin(a); a = a + 1; b + sin(a)").evaluate({'x': 1}))
+        self.assertEqual(self.calc.lower("a = x; b = sin(a); a = a + 1; b + sin(a)").run(
+            {'x': 1}), compiled(x=1))
+    
+    @unittest.skipUnless(HAS_NUMPY, "NumPy is not installed")
+    def test_blocked_kernel_reuses_registers(self):
+        """Test that the blocked kernel computes shared subtrees once."""
+        kernel = BlockedKernel(self.calc.optimized(self.expression), block_size=100)
+        self.assertEqual(len(kernel.instructions), 7)
+        x = np.linspace(0, 3, 1001)
+        expected = np.sin(x) ** 2 + np.cos(x) ** 2 + np.sin(x) * np.cos(x)
+        np.testing.assert_allclose(kernel([x]), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
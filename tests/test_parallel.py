@@ -0,0 +1,112 @@
+"""Unit tests for the multi-process product kernel."""
+
+import math
+import os
+import threading
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src import parallel
+from src.budget import Budget
+from src.calculator import Calculator
+from src.parallel import ProductKernel
+
+
+class TestProductKernel(unittest.TestCase):
+    """Test cases for ProductKernel and Calculator.parallelize()."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.kernel = ProductKernel(workers=3, threshold=1000)
+        self.addCleanup(self.kernel.close)
+    
+    def test_factorial(self):
+        """Test factorials across the workers against math.factorial."""
+        for n in (0, 1, 10, 300, 5000):
+            self.assertEqual(self.kernel.factorial(n), math.factorial(n), n)
+        self.assertEqual(self.kernel.factorial(20.0), math.factorial(20))
+        with self.assertRaises(ValueError):
+            self.kernel.factorial(-1)
+    
+    def test_prod(self):
+        """Test products of ints of mixed signs, and of floats."""
+        values = [(-1) ** i * (7919 * i + 3) ** 20 for i in range(500)]
+        self.assertEqual(self.kernel.prod(*values), math.prod(values))
+        self.assertEqual(self.kernel.prod(2, 3, 4.5), 27.0)
+        self.assertEqual(self.kernel.prod(), 1)
+    
+    def test_split_multiplication(self):
+        """Test the merge multiplying large partial products on the workers."""
+        values = [(-1) ** i * (7919 * i + 3) ** 20 for i in range(500)]
+        with mock.patch.object(parallel, '_SPLIT_BITS', 1000):
+            self.assertEqual(self.kernel.factorial(5000), math.factorial(5000))
+            self.assertEqual(self.kernel.prod(*values), math.prod(values))
+    
+    def test_threshold(self):
+        """Test that small products never start the pool."""
+        kernel = ProductKernel(workers=4)
+        self.assertEqual(kernel.factorial(1000), math.factorial(1000))
+        self.assertEqual(kernel.prod(*range(1, 1001)), math.factorial(1000))
+        self.assertIsNone(kernel._pool)
+    
+    def test_balanced_ranges(self):
+        """Test that ranges cover the factors once, with products of similar size."""
+        ranges = parallel._balanced_ranges(2, 100001, 4)
+        self.assertEqual([low for low, _ in ranges[1:]], [high for _, high in ranges[:-1]])
+        self.assertEqual((ranges[0][0], ranges[-1][1]), (2, 100001))
+        sizes = [sum(math.log2(k) for k in range(low, high)) for low, high in ranges]
+        self.assertLess(max(sizes) / min(sizes), 1.01)
+    
+    def test_calculator(self):
+        """Test that the calculator uses the kernel for factorial and prod."""
+        calc = Calculator()
+        kernel = calc.parallelize(workers=2, threshold=1000)
+        self.addCleanup(kernel.close)
+        self.assertEqual(calc.calculate("factorial(3000) % 1000003"),
+                         math.factorial(3000) % 1000003)
+        self.assertIs(calc.calculate("prod(2^100, 3^100) == 6^100"), True)
+        self.assertIsNotNone(kernel._pool)
+        calc.memoize("factorial")
+        self.assertEqual(calc.calculate("factorial(10)"), 3628800)
+    
+    def test_memoized_before_parallelize(self):
+        """Test that a function memoized first still uses the kernel."""
+        calc = Calculator()
+        memo = calc.memoize("factorial")
+        self.assertEqual(calc.calculate("factorial(10)"), 3628800)
+        kernel = calc.parallelize(workers=2, threshold=1000)
+        self.addCleanup(kernel.close)
+        self.assertEqual(memo.function, kernel.factorial)
+        self.assertEqual(calc.calculate("factorial(3000) % 1000003"),
+                         math.factorial(3000) % 1000003)
+        self.assertIsNotNone(kernel._pool)
+        self.assertEqual(calc.memo_info()["factorial"].hits, 0)
+        self.assertEqual(calc.calculate("factorial(10)"), 3628800)
+        self.assertEqual(calc.memo_info()["factorial"].hits, 1)
+    
+    def test_no_fork_with_threads(self):
+        """Test that the pool is not forked while other threads run."""
+        stop = threading.Event()
+        thread = threading.Thread(target=stop.wait)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(stop.set)
+        self.assertNotEqual(parallel._context().get_start_method(), 'fork')
+        self.assertEqual(self.kernel.factorial(3000), math.factorial(3000))
+    
+    @unittest.skipUnless(hasattr(os, 'fork'), "the sandbox needs fork()")
+    def test_in_sandbox(self):
+        """Test that a sandboxed worker, which cannot have children, computes in process."""
+        calc = Calculator(budget=Budget(time=10.0, sandbox=True))
+        self.addCleanup(calc.parallelize(workers=2, threshold=1000).close)
+        self.assertEqual(calc.calculate("factorial(3000) % 1000003"),
+                         math.factorial(3000) % 1000003)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+"""Unit tests for the expression parser and tree evaluator."""
+
+import unittest
+import math
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.calculator import Calculator
+from src.errors import ExpressionSyntaxError
+from src.lexer import tokenize
+from src.nodes import BinaryOp, Number, Variable, evaluate
+from src.parser import parse
+
+
+class TestParser(unittest.TestCase):
+    """Test cases for parsing and evaluating expression trees."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.calc = Calculator()
+    
+    def test_precedence_matches_python(self):
+        """Test that operator precedence and associativity follow Python."""
+        for expr in ["-2**2", "2**-1", "2**3**2", "10 - 4 - 3", "7 // 2 * 3 % 4", "2 * -3"]:
+            self.assertEqual(self.calc.parse(expr).evaluate(), eval(expr), expr)
+    
+    def test_constant_folding(self):
+        """Test that constant subexpressions are folded while parsing."""
+        node = self.calc.parse("sin(pi/2) + 2^3")
+        self.assertIsInstance(node, Number)
+        self.assertEqual(node.value, 9.0)
+    
+    def test_partial_folding(self):
+        """Test that only the constant side of an operation is folded."""
+        node = self.calc.parse("x * (2 + 3)")
+        self.assertIsInstance(node, BinaryOp)
+        self.assertIsInstance(node.left, Variable)
+        self.assertEqual(node.right.value, 5)
+    
+    def test_evaluate_with_variables(self):
+        """Test evaluating a tree against variable bindings."""
+        node = self.calc.parse("sqrt(x^2 + y^2)")
+        self.assertAlmostEqual(node.evaluate({'x': 3, 'y': 4}), 5.0)
+        with self.assertRaises(NameError):
+            node.evaluate({'x': 3})
+    
+    def test_failing_constants_are_not_folded(self):
+        """Test that errors in constant subtrees surface at evaluation."""
+        node = self.calc.parse("1 / 0")
+        self.assertIsInstance(node, BinaryOp)
+        with self.assertRaises(ZeroDivisionError):
+            node.evaluate()
+    
+    def test_syntax_error_positions(self):
+        """Test that syntax errors report the offending position."""
+        with self.assertRaises(ExpressionSyntaxError) as ctx:
+            self.calc.parse("2 + * 3")
+        self.assertEqual(ctx.exception.position, 4)
+        
+        with self.assertRaises(ExpressionSyntaxError) as ctx:
+            self.calc.parse("2 +")
+        self.assertEqual(ctx.exception.position, 3)
+    
+    def test_unknown_function(self):
+        """Test that calling an unknown function raises NameError."""
+        with self.assertRaises(NameError):
+            self.calc.parse("foo(1)")
+    
+    def test_calculate_uses_parser(self):
+        """Test calculate() results and error messages from the parser."""
+        self.assertAlmostEqual(self.calc.calculate("sqrt(2) * sqrt(2)"), 2.0)
+        self.assertEqual(self.calc.calculate("2 3"), "Error: Unexpected '3' at position 2.")
+        self.assertIn("not defined", self.calc.calculate("x + 1"))
+        self.assertAlmostEqual(self.calc.calculate("exp(1)"), math.e)
+    
+    def test_shared_fold_memo(self):
+        """Test that parsers sharing a memo fold each distinct subtree once."""
+        calls = []
+        
+        def growth(value):
+            calls.append(value)
+            return value * 2
+        
+        functions = {'growth': growth}
+        memo = {}
+        first = parse(tokenize("3 * growth(1.5)", {}), functions, memo=memo)
+        second = parse(tokenize("growth(1.5) + 1", {}), functions, memo=memo)
+        self.assertEqual((first.value, second.value), (9.0, 4.0))
+        self.assertEqual(calls, [1.5])
+        # Equal values of different types or signs are folded separately
+        parse(tokenize("growth(2) + growth(2.0) + growth(-0.0) + growth(0.0)", {}), functions,
+              memo=memo)
+        self.assertEqual(len(calls), 5)
+    
+    def test_deep_nesting(self):
+        """Test that nesting far beyond the recursion limit parses and evaluates."""
+        depth = 5 * sys.getrecursionlimit()
+        cases = [
+            ("(" * depth + "x" + ")" * depth, 3),
+            ("-" * depth + "x", -3 if depth % 2 else 3),
+            ("**".join(["1"] * depth) + "**x", 1),
+            ("abs(" * depth + "x" + ")" * depth, 3),
+            ("if(x > 1, " * depth + "x" + ", 0)" * depth, 3),
+        ]
+        for expression, expected in cases:
+            tree = parse(tokenize(expression, {}), self.calc.functions)
+            self.assertEqual(evaluate(tree, {'x': 3}), expected)
+    
+    def test_long_left_chain(self):
+        """Test a flat sum deeper than the recursion limit as a tree."""
+        terms = 5 * sys.getrecursionlimit()
+        tree = parse(tokenize("+".join(["x"] * terms), {}), self.calc.functions)
+        self.assertEqual(evaluate(tree, {'x': 2}), 2 * terms)
+        with self.assertRaises(RecursionError):
+            tree.evaluate({'x': 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
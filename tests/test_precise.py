@@ -0,0 +1,106 @@
+"""Unit tests for high-precision evaluation."""
+
+import decimal
+import unittest
+import sys
+from decimal import Decimal
+from pathlib import Path
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.budget import Budget
+from src.calculator import Calculator
+from src.lexer import tokenize
+from src.parser import parse
+from src.precise import accurate, bound_float, decimal_pi
+
+
+class TestPrecise(unittest.TestCase):
+    """Test cases for Calculator.evaluate_precise() and the precision option."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.calc = Calculator()
+    
+    def bounded(self, expression):
+        """Evaluate in floats with an error bound."""
+        tokens = tokenize(expression, Calculator.CONSTANTS)
+        return bound_float(parse(tokens, Calculator.FUNCTIONS, fold=False))
+    
+    def test_float_bounds(self):
+        """Test that benign expressions stay in floats and bounds cover the error."""
+        for expression in ("0.1 + 0.2", "sin(0.5) + cos(0.5)*exp(0.1)/sqrt(3)",
+                           "ln(10) * 2.5", "atan(3)^2 - 7 // 2"):
+            self.assertTrue(accurate(self.bounded(expression), 12), expression)
+        value, error = self.bounded("0.1 + 0.2")
+        self.assertLessEqual(abs(Decimal(value) - Decimal("0.3")), error)
+        self.assertEqual(self.bounded("2^70 + 3"), (2 ** 70 + 3, 0.0))
+    
+    def test_escalation(self):
+        """Test that floats are not trusted where rounding decides the result."""
+        for expression in ("(1 + 10^-17) - 1", "1 + 10^-20 > 1", "floor(1 - 10^-30)",
+                           "if(0.1 + 0.2 == 0.3, 1, 2)", "exp(1000)"):
+            self.assertFalse(accurate(self.bounded(expression), 10), expression)
+        self.assertFalse(accurate(self.bounded("0.1 + 0.2"), 20))
+        
+        evaluate = self.calc.evaluate_precise
+        self.assertEqual(evaluate("(1 + 10^-17) - 1"), Decimal("1E-17"))
+        self.assertIs(evaluate("1 + 10^-20 > 1"), True)
+        self.assertEqual(evaluate("floor(1 - 10^-30)"), 0)
+        self.assertEqual(evaluate("if(0.1 + 0.2 == 0.3, 1, 2)"), 1)
+        self.assertEqual(evaluate("exp(1000)", 5), Decimal("1.9701E+434"))
+    
+    def test_digits(self):
+        """Test results to more digits than a float holds."""
+        evaluate = self.calc.evaluate_precise
+        self.assertEqual(evaluate("sqrt(2)", 30), Decimal("1.41421356237309504880168872421"))
+        self.assertEqual(str(evaluate("pi", 40)), "3.141592653589793238462643383279502884197")
+        self.assertEqual(evaluate("1/3", 20), Decimal("0.33333333333333333333"))
+        self.assertEqual(evaluate("sin(1)^2 + cos(1)^2", 40), 1)
+        self.assertEqual(evaluate("ln(8, 2)", 20), 3)
+        self.assertEqual(evaluate("asin(1) * 2", 30), evaluate("pi", 30))
+        self.assertEqual(evaluate("sin(pi)", 20), 0)
+        self.assertEqual(evaluate("sinh(10^-20)", 20), Decimal("1E-20"))
+        self.assertEqual(evaluate("tanh(0.5)", 20), Decimal("0.46211715726000975850"))
+        self.assertEqual(evaluate("x = 0.1; x*3", 20), Decimal("0.3"))
+    
+    def test_exact_integers(self):
+        """Test that integer results stay exact ints."""
+        self.assertEqual(self.calc.evaluate_precise("2^100 + 1", 10), 2 ** 100 + 1)
+        self.assertEqual(self.calc.evaluate_precise("factorial(25) // 7", 10),
+                         15511210043330985984000000 // 7)
+        self.assertEqual(self.calc.evaluate_precise("-7.5 // 2", 10), -4)
+        self.assertEqual(self.calc.evaluate_precise("-7 % 3", 10), 2)
+    
+    def test_errors(self):
+        """Test that domain errors are reported as by floats."""
+        with self.assertRaises(ValueError):
+            self.calc.evaluate_precise("sqrt(-1)", 30)
+        with self.assertRaises(ZeroDivisionError):
+            self.calc.evaluate_precise("1 / (0.1 + 0.2 - 0.3)", 30)
+        with self.assertRaises(ValueError):
+            self.calc.evaluate_precise("1", 0)
+    
+    def test_precision_option(self):
+        """Test the precision option of the calculator."""
+        calc = Calculator(precision=25)
+        self.assertEqual(calc.calculate("1/7"), Decimal("0.1428571428571428571428571"))
+        self.assertEqual(calc.calculate("2^70"), 2 ** 70)
+        self.assertEqual(calc.calculate("sqrt(-1)"),
+                         "Error: Invalid mathematical operation - math domain error")
+        self.assertEqual(Calculator.format_result(calc.calculate("1/7"), 4), "0.1429")
+        with self.assertRaises(ValueError):
+            Calculator(budget=Budget(bits=64), precision=25)
+    
+    def test_context_untouched(self):
+        """Test that the global decimal context is left as it was."""
+        context = decimal.getcontext()
+        precision, rounding = context.prec, context.rounding
+        self.calc.evaluate_precise("sqrt(2) + pi", 60)
+        self.assertEqual((context.prec, context.rounding), (precision, rounding))
+        self.assertEqual(len(str(decimal_pi())), precision + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+"""Unit tests for exact rational arithmetic."""
+
+import unittest
+import sys
+from fractions import Fraction
+from pathlib import Path
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.budget import Budget
+from src.calculator import Calculator
+from src.rational import rational_literal
+
+
+class TestRational(unittest.TestCase):
+    """Test cases for Calculator.evaluate_exact() and the exact option."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.calc = Calculator()
+    
+    def test_literals(self):
+        """Test that literals with a decimal point are read exactly."""
+        self.assertEqual(rational_literal("0.1"), Fraction(1, 10))
+        self.assertIs(type(rational_literal("2.0")), int)
+    
+    def test_exact_arithmetic(self):
+        """Test that + - * / ^ keep results exact."""
+        evaluate = self.calc.evaluate_exact
+        self.assertEqual(evaluate("1/3*3"), 1)
+        self.assertIs(evaluate("0.1 + 0.2 == 0.3"), True)
+        self.assertEqual(evaluate("(2/3)^2 - 1/9"), Fraction(1, 3))
+        self.assertEqual(evaluate("2^-2 + 0.5^-3"), Fraction(33, 4))
+        self.assertEqual(evaluate("-7/2 % 2"), Fraction(1, 2))
+        self.assertEqual(evaluate("x = 1/3; x + x + x"), 1)
+        self.assertEqual(evaluate("1.1^2"), Fraction(121, 100))
+    
+    def test_integers_stay_native(self):
+        """Test that integer results are ints rather than Fractions."""
+        for expression in ("6/3", "2^100 / 2^99", "1/3*3", "7 // 2", "floor(7/2)",
+                           "factorial(5.0)", "round(5/2)"):
+            self.assertIs(type(self.calc.evaluate_exact(expression)), int, expression)
+        self.assertEqual(self.calc.evaluate_exact("2^100 + 1"), 2 ** 100 + 1)
+    
+    def test_functions(self):
+        """Test that only functions without an exact result give floats."""
+        self.assertEqual(self.calc.evaluate_exact("sqrt(9/4)"), Fraction(3, 2))
+        self.assertIsInstance(self.calc.evaluate_exact("sqrt(2)"), float)
+        self.assertAlmostEqual(self.calc.evaluate_exact("sin(1/2) + 1/3"), 0.8127588719)
+        self.assertIsInstance(self.calc.evaluate_exact("1/3 + pi"), float)
+        with self.assertRaises(ValueError):
+            self.calc.evaluate_exact("factorial(1/2)")
+    
+    def test_exact_option(self):
+        """Test the exact option of the calculator."""
+        calc = Calculator(exact=True)
+        self.assertEqual(calc.calculate("1/3"), Fraction(1, 3))
+        self.assertEqual(Calculator.format_result(calc.calculate("1/3 + 1/6")), "1/2")
+        self.assertEqual(calc.calculate("1/(0.1 + 0.2 - 0.3)"), "Error: Division by zero.")
+        with self.assertRaises(ValueError):
+            Calculator(budget=Budget(bits=64), exact=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""Unit tests for the function registry."""
+
+import itertools
+import math
+import unittest
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.budget import Budget
+from src.calculator import Calculator
+from src.registry import FunctionRegistry, FunctionSpec, describe, infer_arity
+from src.vectorized import HAS_NUMPY, numpy_functions
+
+if HAS_NUMPY:
+    import numpy as np
+
+
+class TestFunctionRegistry(unittest.TestCase):
+    """Test cases for FunctionRegistry."""
+    
+    def test_behaves_as_a_dict_of_functions(self):
+        """Test that the registry reads and writes like name -> callable."""
+        registry = FunctionRegistry({'sqrt': FunctionSpec(math.sqrt, cost=2)})
+        registry['hypot'] = math.hypot
+        self.assertIs(registry['sqrt'], math.sqrt)
+        self.assertEqual(sorted(registry), ['hypot', 'sqrt'])
+        self.assertEqual({**registry}, {'sqrt': math.sqrt, 'hypot': math.hypot})
+        self.assertEqual(registry.spec('sqrt').cost, 2)
+        self.assertIsNone(registry.spec('hypot').arity)
+    
+    def test_register_decorator(self):
+        """Test registering a function with a decorator."""
+        registry = FunctionRegistry()
+        
+        @registry.register('double', cost=2)
+        def double(x):
+            return 2 * x
+        
+        self.assertEqual(registry.spec('double'), FunctionSpec(double, 1, True, None, 2))
+    
+    def test_infer_arity(self):
+        """Test arities inferred from signatures."""
+        self.assertEqual(infer_arity(lambda: 0), 0)
+        self.assertEqual(infer_arity(lambda a, b: 0), 2)
+        self.assertIsNone(infer_arity(lambda a, b=1: 0))
+        self.assertIsNone(infer_arity(lambda *args: 0))
+    
+    def test_describe_user_function(self):
+        """Test the metadata of user functions."""
+        calc = Calculator()
+        calc.define("hyp(a, b) = sqrt(a^2 + b^2)")
+        spec = describe(calc.functions, 'hyp')
+        self.assertEqual((spec.arity, spec.pure), (2, True))
+        self.assertEqual(describe(calc.functions, 'sin').cost, 4)
+
+
+class TestRegistryMetadata(unittest.TestCase):
+    """Test cases for the use of function metadata by the compilers."""
+    
+    def setUp(self):
+        """Register an impure and a vectorized function."""
+        counter = itertools.count()
+        self.double = lambda x: 2 * x
+        Calculator.FUNCTIONS.register('tick', lambda: next(counter), pure=False)
+        Calculator.FUNCTIONS.register('double', lambda x: 2 * x, vectorized=self.double)
+        self.addCleanup(Calculator.FUNCTIONS.pop, 'tick')
+        self.addCleanup(Calculator.FUNCTIONS.pop, 'double')
+        self.calc = Calculator()
+    
+    def test_arity_is_checked(self):
+        """Test that calls with the wrong number of arguments are rejected."""
+        self.assertEqual(self.calc.calculate("sin(1, 2)"),
+                         "Error: Function 'sin' expects 1 argument(s), got 2 at position 0.")
+        self.assertIn("expects 1 argument(s), got 0", self.calc.calculate("sqrt()"))
+        self.assertEqual(self.calc.calculate("ln(8, 2)"), 3.0)
+    
+    def test_impure_calls_are_not_folded_or_shared(self):
+        """Test that each impure call is evaluated on its own."""
+        self.assertEqual(str(self.calc.parse("tick() * 2")), "(tick() * 2)")
+        self.assertEqual(self.calc.compile("tick() + tick()").shared, 0)
+        first = self.calc.calculate("tick() + tick()")
+        self.assertEqual(self.calc.calculate("tick() + tick()"), first + 4)
+        self.assertRaises(ValueError, self.calc.memoize, 'tick')
+    
+    def test_impure_results_are_not_cached(self):
+        """Test that templates, batches and budgets never reuse impure results."""
+        results = [self.calc.calculate(f"tick() + {n}") for n in (3, 4, 4, 4)]
+        self.assertEqual(len(set(results)), len(results))
+        first, second = self.calc.calculate_batch(["tick() * 1", "tick() * 1"])
+        self.assertEqual(second, first + 1)
+        calc = Calculator(budget=Budget(time=5.0))
+        results = [calc.calculate("tick() * 1") for _ in range(3)]
+        self.assertEqual(len(set(results)), len(results))
+    
+    @unittest.skipUnless(HAS_NUMPY, "NumPy is not installed")
+    def test_declared_vectorized_counterpart(self):
+        """Test that the vectorized backend uses the declared counterpart."""
+        self.assertIs(numpy_functions()['double'], self.double)
+        function = self.calc.compile("double(x) + sin(x)")
+        x = np.linspace(0, 1, 5)
+        np.testing.assert_allclose(function.evaluate_array(x=x), 2 * x + np.sin(x))
+
+
+if __name__ == "__main__":
+    unittest.main()
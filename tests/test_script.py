@@ -0,0 +1,100 @@
+"""Unit tests for multi-statement scripts."""
+
+import unittest
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.bytecode import Program
+from src.calculator import Calculator
+from src.errors import ExpressionSyntaxError
+from src.nodes import Local, Number, Script
+from src.vectorized import HAS_NUMPY, BlockedKernel
+
+if HAS_NUMPY:
+    import numpy as np
+
+
+class TestScript(unittest.TestCase):
+    """Test cases for parsing and evaluating scripts."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.calc = Calculator()
+    
+    def test_constant_script_folds(self):
+        """Test that a script of constants is folded while parsing."""
+        script = self.calc.parse("a = 3; b = a*2 + sin(a); b^2")
+        self.assertIsInstance(script, Script)
+        self.assertTrue(script.is_constant)
+        self.assertAlmostEqual(self.calc.calculate("a = 3; b = a*2 + sin(a); b^2"),
+                               (6 + 0.1411200080598672) ** 2)
+    
+    def test_names_resolve_to_slots(self):
+        """Test that script names are read from frame slots."""
+        script = self.calc.parse("a = x; a = a + 1; a*y")
+        self.assertEqual(script.names, ('x', 'a', 'y'))
+        self.assertEqual(script.free, (('x', 0), ('y', 2)))
+        self.assertIsInstance(script.statements[1][1].left, Local)
+        self.assertEqual(script.evaluate({'x': 2, 'y': 3}), 9)
+        self.assertEqual(script.execute({'x': 2, 'y': 3}), [2, 3, 9])
+    
+    def test_reassigned_constant_is_not_propagated(self):
+        """Test that a name stops being constant once reassigned from a variable."""
+        script = self.calc.parse("a = 2; a = a * x; a + 1")
+        self.assertIsInstance(script.statements[1][1].left, Number)
+        self.assertIsInstance(script.statements[2][1].left, Local)
+        self.assertEqual(script.evaluate({'x': 5}), 11)
+    
+    def test_errors(self):
+        """Test error reporting for invalid scripts."""
+        self.assertEqual(self.calc.calculate("a = 1; sin = 2"),
+                         "Error: Cannot assign to function 'sin' at position 7.")
+        self.assertEqual(self.calc.calculate("if = 2; if + 1"),
+                         "Error: Cannot assign to function 'if' at position 0.")
+        self.assertEqual(self.calc.calculate("x = 1; piecewise = x"),
+                         "Error: Cannot assign to function 'piecewise' at position 7.")
+        self.assertEqual(self.calc.calculate(";;"), "Error: Empty script at position 2.")
+        self.assertEqual(self.calc.calculate("1 = 2"), "Error: Unexpected '=' at position 2.")
+        self.assertEqual(self.calc.calculate("a = b; a"),
+                         "Error: NameError - name 'b' is not defined")
+        with self.assertRaises(ExpressionSyntaxError):
+            self.calc.parse("a = = 1")
+    
+    def test_compiled_script(self):
+        """Test that scripts compile to one function returning the last or all values."""
+        compiled = self.calc.compile("a = x + 1; b = a^2; b - a")
+        self.assertEqual(compiled.variables, ('x',))
+        self.assertEqual(compiled(x=2), 6)
+        self.assertEqual(compiled.evaluate_all({'x': 2}), [3, 9, 6])
+        self.assertEqual(compiled.evaluate_many([{'x': 1}, {'x': 2}]), [2, 6])
+        self.assertEqual(self.calc.compile("x + 1").evaluate_all({'x': 1}), [2])
+    
+    def test_bytecode(self):
+        """Test that scripts lower to bytecode and survive serialization."""
+        program = self.calc.lower("a = x; b = a^2; a = a + b; a * y")
+        self.assertEqual(program.variables, ('x', 'y'))
+        self.assertIn('STORE', program.disassemble())
+        restored = Program.from_bytes(program.to_bytes())
+        self.assertEqual(program.run({'x': 3, 'y': 2}), 24)
+        self.assertEqual(restored.run({'x': 3, 'y': 2}), 24)
+    
+    @unittest.skipUnless(HAS_NUMPY, "NumPy is not installed")
+    def test_vectorized(self):
+        """Test that scripts evaluate over arrays, including the blocked kernel."""
+        compiled = self.calc.compile("a = sin(x); b = a*a; a = a + b; a * y")
+        x = np.linspace(0, 3, 2501)
+        y = np.linspace(1, 2, 2501)
+        expected = [compiled(x=a, y=b) for a, b in zip(x, y)]
+        np.testing.assert_allclose(compiled.evaluate_array(x=x, y=y), expected)
+        kernel = BlockedKernel(compiled.tree, block_size=1000)
+        self.assertEqual(kernel.variables, ('x', 'y'))
+        np.testing.assert_allclose(kernel([x, y]), expected)
+        np.testing.assert_allclose(compiled.evaluate_blocked({'x': x, 'y': y}, block_size=1000),
+                                   expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+"""Unit tests for vectorized evaluation of compiled expressions."""
+
+import unittest
+import math
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+# Add the project root to the path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src import vectorized
+from src.calculator import Calculator
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Functions of integers, which the float sweep does not apply to
+INTEGER_FUNCTIONS = ('factorial', 'factorial_mod', 'powmod', 'binom', 'gcd', 'lcm')
+
+
+@unittest.skipUnless(vectorized.HAS_NUMPY, "NumPy is not installed")
+class TestNumpyBackend(unittest.TestCase):
+    """Test cases for evaluating compiled expressions over NumPy arrays."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.calc = Calculator()
+    
+    def test_matches_scalar_path(self):
+        """Test that every function agrees with its scalar implementation."""
+        x = np.linspace(0.1, 0.9, 9)
+        for name in Calculator.FUNCTIONS:
+            if name in INTEGER_FUNCTIONS:
+                continue
+            compiled = self.calc.compile(f"{name}(x)")
+            expected = [Calculator.FUNCTIONS[name](value) for value in x]
+            np.testing.assert_allclose(compiled.evaluate_array(x=x), expected, err_msg=name)
+    
+    def test_factorial(self):
+        """Test the vectorized factorial, with inf above 170 and NaN outside its domain."""
+        result = self.calc.compile("factorial(n)").evaluate_array(n=[0, 5, -1, 2.5])
+        np.testing.assert_allclose(result[:2], [1, 120])
+        self.assertTrue(np.isnan(result[2:]).all())
+        large = self.calc.compile("factorial(n)").evaluate_array(n=[170., 171., 1000.])
+        self.assertEqual(large[0], math.factorial(170))
+        self.assertTrue(np.isposinf(large[1:]).all())
+    
+    def test_integer_functions(self):
+        """Test the integer functions, which have no ufunc, over arrays."""
+        compiled = self.calc.compile("powmod(n, 3, 7) + gcd(n, 4) + binom(n, 2)")
+        np.testing.assert_allclose(compiled.evaluate_array(n=[1, 2, 3, 4]), [2, 4, 10, 11])
+    
+    def test_scalar_bindings_broadcast(self):
+        """Test mixing arrays and scalars, and expressions ignoring their variables."""
+        energy = self.calc.compile("0.5 * m * v^2")
+        np.testing.assert_allclose(energy.evaluate_array({'m': 2}, v=[1, 2, 3]), [1, 4, 9])
+        self.assertEqual(self.calc.compile("x * 0 + 1").evaluate_array(x=[4, 5]).shape, (2,))
+    
+    def test_custom_functions_are_vectorized(self):
+        """Test that functions without a ufunc are wrapped transparently."""
+        class CustomCalculator(Calculator):
+            FUNCTIONS = {**Calculator.FUNCTIONS, 'log': math.log}
+        
+        compiled = CustomCalculator().compile("log(x)")
+        np.testing.assert_allclose(compiled.evaluate_array(x=[1, math.e]), [0, 1])
+
+
+@unittest.skipUnless(vectorized.HAS_NUMPY, "NumPy is not installed")
+class TestBlockedKernel(unittest.TestCase):
+    """Test cases for memory-bounded blocked evaluation."""
+    
+    EXPRESSION = "sqrt(x^2 + y^2) - sin(x) * cos(y) / (1 + x) + round(y)"
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.compiled = Calculator().compile(self.EXPRESSION)
+        rng = np.random.default_rng(0)
+        self.x = rng.random(1000)
+        self.y = rng.random(1000)
+    
+    def test_matches_whole_array_evaluation(self):
+        """Test that block boundaries do not change the results."""
+        expected = vectorized.vectorize(self.compiled.tree)(self.x, self.y)
+        for block_size in (1, 7, 1000, 4096):
+            result = self.compiled.evaluate_blocked({'x': self.x, 'y': self.y},
+                                                    block_size=block_size)
+            np.testing.assert_allclose(result, expected, err_msg=str(block_size))
+    
+    def test_registers_are_reused(self):
+        """Test that scratch buffers are shared between instructions."""
+        kernel = vectorized.BlockedKernel(self.compiled.tree, block_size=16)
+        self.assertLess(kernel.registers, len(kernel.instructions))
+        self.assertLessEqual(kernel.registers, 3)
+    
+    def test_memmap_input_and_output(self):
+        """Test streaming from and to memory-mapped files."""
+        with tempfile.TemporaryDirectory() as directory:
+            x = np.memmap(Path(directory) / "x.f64", dtype=float, mode="w+", shape=(1000,))
+            x[:] = self.x
+            out = np.memmap(Path(directory) / "out.f64", dtype=float, mode="w+", shape=(1000,))
+            result = self.compiled.evaluate_blocked({'x': x, 'y': 0.5}, out=out, block_size=64)
+            self.assertIs(result, out)
+            expected = self.compiled.evaluate_array(x=self.x, y=0.5)
+            np.testing.assert_allclose(np.asarray(out), expected)
+            del x, out, result
+    
+    def test_leaf_expressions(self):
+        """Test expressions that are a single variable or constant."""
+        np.testing.assert_array_equal(
+            Calculator().compile("x").evaluate_blocked({'x': self.x}, block_size=64), self.x)
+        np.testing.assert_array_equal(
+            Calculator().compile("x * 0 + 2").evaluate_blocked({'x': self.x}, block_size=64),
+            np.full(1000, 2.0))
+    
+    def test_deep_expression(self):
+        """Test an expression nested beyond the recursion limit, in and out of blocks."""
+        terms = 5 * sys.getrecursionlimit()
+        compiled = Calculator().compile("+".join(["x"] * terms))
+        np.testing.assert_allclose(compiled.evaluate_array(x=self.x), terms * self.x)
+        np.testing.assert_allclose(compiled.evaluate_blocked({'x': self.x}, block_size=64),
+                                   terms * self.x)
+    
+    def test_comparisons(self):
+        """Test comparisons over arrays longer than one default block."""
+        x = np.arange(10000.)
+        for expression, expected in (("x > 5", x > 5), ("x <= 5", x <= 5),
+                                     ("x < 5", x < 5), ("x >= 5", x >= 5),
+                                     ("x == 5", x == 5), ("x != 5", x != 5)):
+            result = Calculator().compile(expression).evaluate_array(x=x)
+            np.testing.assert_array_equal(result, expected.astype(float), err_msg=expression)
+
+
+class TestScalarFallback(unittest.TestCase):
+    """Test cases for evaluate_array() without NumPy."""
+    
+    def test_falls_back_to_scalar_path(self):
+        """Test that evaluate_array() works row by row without NumPy."""
+        compiled = Calculator().compile("a * b + 1")
+        with mock.patch.object(vectorized, 'HAS_NUMPY', False), \
+                mock.patch('src.compiled.HAS_NUMPY', False):
+            self.assertEqual(compiled.evaluate_array(a=[1, 2, 3], b=2), [3, 5, 7])
+    
+    def test_unbound_variable(self):
+        """Test that missing columns raise NameError."""
+        with self.assertRaises(NameError):
+            Calculator().compile("a + b").evaluate_array(a=[1])
+
+
+if __name__ == "__main__":
+    unittest.main()